@@ -1,8 +1,13 @@
-from fastapi import FastAPI, HTTPException, BackgroundTasks, Request
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, PlainTextResponse, JSONResponse
 from pydantic import BaseModel, HttpUrl
 import uuid
 import os
+import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
 from dotenv import load_dotenv
 from typing import Optional
 
@@ -11,11 +16,23 @@ load_dotenv()
 
 # Import modules
 from modules.youtube import download_youtube_audio, extract_batch_info, get_video_list_preview, get_all_videos_from_source
-from modules.diarization import perform_diarization
-from modules.transcription import transcribe_segments
-from modules.assembler import assemble_transcript
+from modules.diarization import (
+    perform_diarization, recluster_speakers, features_cache_key, clustering_threshold, speaker_label,
+    DIARIZATION_ENGINE, DIARIZATION_ENGINES
+)
+from modules.transcription import transcribe_segments, transcribe_full, resolve_precision, available_models, TRANSCRIPTION_ENGINE, WHISPER_MODEL, WHISPER_PRECISION, WHISPER_PRECISIONS
+from modules.assembler import assemble_transcript, reassign_speakers, format_plaintext
 from modules.enhanced_export import EnhancedExport
-from utils.validators import is_valid_youtube_url, get_youtube_url_type
+from modules.model_registry import get_resident_models
+from modules import result_cache, metrics
+from modules.scheduler import scheduler, AdmissionError
+from modules.store import create_store, JOB_TTL_HOURS
+from modules.events import events, format_sse
+from modules.tracing import Tracer, summarize_spans, chrome_trace
+from modules.audio_store import ensure_pcm
+from modules.workspace import workspaces
+from modules.vad import detect_speech_in_file, split_segments, VAD_ENABLED
+from utils.validators import is_valid_youtube_url, get_youtube_url_type, extract_video_id
 
 # Create app instance
 app = FastAPI(title="TubeScript API", description="YouTube Audio Diarization and Transcription API")
@@ -29,15 +46,113 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Job storage (in-memory for demonstration, use database in production)
-job_store = {}
-batch_store = {}
+# Model loading strategy: "eager" warms up Whisper and pyannote at startup (slower
+# cold start, fast first request), "lazy" loads them on the first job that needs them
+MODEL_LOADING = os.getenv("MODEL_LOADING", "lazy").lower()
+
+@app.on_event("startup")
+async def warm_up():
+    if MODEL_LOADING == "eager":
+        from preload_models import warm_up_models
+        print("Warming up models (MODEL_LOADING=eager)...")
+        await asyncio.get_event_loop().run_in_executor(None, warm_up_models)
+
+# Videos of one batch processed at once, unless the request sets its own concurrency.
+# All batches together are capped by MAX_CONCURRENT_VIDEOS (see modules/scheduler.py).
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "3"))
+
+# Job and batch storage (in-memory or SQLite, see JOB_STORE)
+store = create_store()
+
+# How often expired jobs and batches are purged (seconds)
+PURGE_INTERVAL = 600
+
+async def purge_expired_jobs():
+    """Periodically drop finished jobs and batches older than JOB_TTL_HOURS"""
+    while True:
+        try:
+            purged = store.purge_expired(JOB_TTL_HOURS * 3600)
+            if purged:
+                print(f"Purged {purged} expired jobs and batches")
+        except Exception as e:
+            print(f"Error purging expired jobs: {str(e)}")
+        await asyncio.sleep(PURGE_INTERVAL)
+
+@app.on_event("startup")
+async def start_purging():
+    if JOB_TTL_HOURS > 0:
+        asyncio.get_event_loop().create_task(purge_expired_jobs())
+    # Workspaces of jobs that never finished (e.g. the server was killed)
+    removed = workspaces.remove_stale()
+    if removed:
+        print(f"Removed {removed} stale job workspaces")
+
+TERMINAL_JOB_STATUSES = ("completed", "failed")
+TERMINAL_BATCH_STATUSES = ("completed", "partial", "failed")
+
+# Seconds between keepalive resyncs on an idle event stream
+EVENT_KEEPALIVE_INTERVAL = 15
+
+def describe_job(job: dict) -> dict:
+    """Status fields of a job as returned by /api/status and pushed to event streams"""
+    return {
+        "job_id": job["job_id"],
+        "status": job["status"],
+        "progress": job["progress"],
+        "message": job["message"],
+        "stages": job.get("stages"),
+        "vad": job.get("vad"),
+        "queue_position": scheduler.queue_position(job["job_id"])
+    }
+
+def describe_batch(batch: dict) -> dict:
+    """Status fields of a batch as returned by /api/batch-status and pushed to event streams"""
+    return {
+        "batch_id": batch["batch_id"],
+        "status": batch["status"],
+        "progress": batch["progress"],
+        "message": batch["message"],
+        "total_videos": batch["total_videos"],
+        "completed": len(batch["completed_jobs"]),
+        "failed": len(batch["failed_jobs"]),
+        "videos": batch["videos"]
+    }
+
+def update_job(job_id: str, **fields):
+    """Update a job in the store and push its new status to event subscribers"""
+    store.update_job(job_id, **fields)
+    job = store.get_job(job_id)
+    if job is not None:
+        events.publish_job(job_id, "status", describe_job(job))
+
+def update_batch(batch_id: str, **fields):
+    """Update a batch in the store and push its new status to event subscribers"""
+    store.update_batch(batch_id, **fields)
+    batch = store.get_batch(batch_id)
+    if batch is not None:
+        events.publish_batch(batch_id, "batch", describe_batch(batch))
+
+# Pipeline modes:
+#   per_segment - transcribe each diarization turn separately (default)
+#   single_pass - transcribe the whole file once with word timestamps, then
+#                 assign words to speakers from the diarization turns
+#   concurrent  - like single_pass, but the full-file transcription runs in
+#                 parallel with diarization instead of after it
+PIPELINE_MODES = ["per_segment", "single_pass", "concurrent"]
 
 # Request models
 class YouTubeRequest(BaseModel):
     url: HttpUrl
     diarization_enabled: bool = True
-    diarization_sensitivity: float = 0.5
+    diarization_sensitivity: float = 0.5  # 0-1, higher finds more speakers
+    min_speakers: Optional[int] = None  # Bounds on the number of speakers diarization finds
+    max_speakers: Optional[int] = None
+    diarization_engine: Optional[str] = None  # pyannote, lightweight or fake (default DIARIZATION_ENGINE)
+    pipeline_mode: str = "per_segment"
+    whisper_model: Optional[str] = None  # tiny, base, small, medium, large... (default WHISPER_MODEL)
+    whisper_precision: Optional[str] = None  # auto, fp32, int8 or bf16 (default WHISPER_PRECISION)
+    vad_enabled: Optional[bool] = None  # Skip silence and music before Whisper (default VAD_ENABLED)
+    priority: int = 0  # Higher runs first when workers are busy
 
 class BatchPreviewRequest(BaseModel):
     url: HttpUrl
@@ -48,7 +163,16 @@ class BatchProcessRequest(BaseModel):
     limit: Optional[int] = None
     selected_videos: Optional[list[str]] = None  # List of video IDs to process
     diarization_enabled: bool = True
-    diarization_sensitivity: float = 0.5
+    diarization_sensitivity: float = 0.5  # 0-1, higher finds more speakers
+    min_speakers: Optional[int] = None  # Bounds on the number of speakers diarization finds
+    max_speakers: Optional[int] = None
+    diarization_engine: Optional[str] = None  # pyannote, lightweight or fake (default DIARIZATION_ENGINE)
+    pipeline_mode: str = "per_segment"
+    whisper_model: Optional[str] = None  # tiny, base, small, medium, large... (default WHISPER_MODEL)
+    whisper_precision: Optional[str] = None  # auto, fp32, int8 or bf16 (default WHISPER_PRECISION)
+    vad_enabled: Optional[bool] = None  # Skip silence and music before Whisper (default VAD_ENABLED)
+    priority: int = 0  # Higher runs first when workers are busy
+    concurrency: Optional[int] = None  # Videos processed at once (default BATCH_CONCURRENCY)
 
 class VideoListRequest(BaseModel):
     url: HttpUrl
@@ -62,19 +186,72 @@ class MergeSpeakersRequest(BaseModel):
     speakers_to_merge: list[str]
     new_name: str
 
+class ReclusterRequest(BaseModel):
+    num_speakers: Optional[int] = None  # Exact number of speakers to split into
+    threshold: Optional[float] = None  # Cosine distance threshold (default from the job's sensitivity and engine)
+
 # Status response model
 class JobStatus(BaseModel):
     job_id: str
     status: str
     progress: float = 0.0
     message: str = ""
+    stages: Optional[dict] = None
+    vad: Optional[dict] = None  # Speech kept and audio skipped by voice activity detection
+    queue_position: Optional[dict] = None
 
 @app.get("/")
 async def read_root():
     return {"message": "TubeScript API is running"}
 
+@app.get("/api/models")
+async def get_models():
+    """Report the models resident in this process and the memory they use"""
+    return get_resident_models()
+
+@app.get("/api/cache")
+async def get_cache():
+    """Report result cache usage and hit/miss counts per stage"""
+    return result_cache.get_cache_stats()
+
+@app.get("/api/scheduler")
+async def get_scheduler():
+    """Report worker pool usage, queue lengths and memory headroom"""
+    return scheduler.stats()
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Stage latencies, realtime factors, queue waits and memory in Prometheus text format"""
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+@app.get("/api/workspace")
+async def get_workspace():
+    """Report disk used by job downloads against the workspace quota"""
+    return workspaces.stats()
+
+def validate_diarization_options(request):
+    """Reject out-of-range sensitivity and speaker count hints and unknown engines"""
+    if not 0.0 <= request.diarization_sensitivity <= 1.0:
+        raise HTTPException(status_code=400, detail="diarization_sensitivity must be between 0 and 1")
+    for field in ("min_speakers", "max_speakers"):
+        if getattr(request, field) is not None and getattr(request, field) < 1:
+            raise HTTPException(status_code=400, detail=f"{field} must be at least 1")
+    if request.min_speakers and request.max_speakers and request.min_speakers > request.max_speakers:
+        raise HTTPException(status_code=400, detail="min_speakers cannot be larger than max_speakers")
+    if request.diarization_engine is not None and request.diarization_engine not in DIARIZATION_ENGINES:
+        raise HTTPException(status_code=400, detail=f"diarization_engine must be one of: {', '.join(DIARIZATION_ENGINES)}")
+
+def validate_whisper_options(request):
+    """Reject Whisper models and precisions that don't exist"""
+    if request.whisper_model is not None:
+        models = available_models()
+        if models and request.whisper_model not in models:
+            raise HTTPException(status_code=400, detail=f"whisper_model must be one of: {', '.join(models)}")
+    if request.whisper_precision is not None and request.whisper_precision not in WHISPER_PRECISIONS:
+        raise HTTPException(status_code=400, detail=f"whisper_precision must be one of: {', '.join(WHISPER_PRECISIONS)}")
+
 @app.post("/api/process", response_model=JobStatus)
-async def process_youtube(request: YouTubeRequest, background_tasks: BackgroundTasks):
+async def process_youtube(request: YouTubeRequest):
     # Validate URL
     if not is_valid_youtube_url(str(request.url)):
         raise HTTPException(status_code=400, detail="Invalid YouTube URL")
@@ -84,28 +261,59 @@ async def process_youtube(request: YouTubeRequest, background_tasks: BackgroundT
     if url_type != 'video':
         raise HTTPException(status_code=400, detail="Use batch processing endpoint for playlists and channels")
     
+    if request.pipeline_mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=400, detail=f"pipeline_mode must be one of: {', '.join(PIPELINE_MODES)}")
+    
+    validate_diarization_options(request)
+    validate_whisper_options(request)
+    
+    vad_enabled = VAD_ENABLED if request.vad_enabled is None else request.vad_enabled
+    whisper_model = request.whisper_model or WHISPER_MODEL
+    whisper_precision = request.whisper_precision or WHISPER_PRECISION
+    diarization_engine = request.diarization_engine or DIARIZATION_ENGINE
+    
     # Generate a unique job ID
     job_id = str(uuid.uuid4())
     
     # Create job entry
-    job_store[job_id] = {
+    store.create_job(job_id, {
         "status": "queued",
         "progress": 0.0,
         "message": "Job queued for processing",
         "result": None,
         "original_speakers": {},
+        "video_id": extract_video_id(str(request.url)),
         "diarization_enabled": request.diarization_enabled,
-        "diarization_sensitivity": request.diarization_sensitivity
-    }
+        "diarization_sensitivity": request.diarization_sensitivity,
+        "min_speakers": request.min_speakers,
+        "max_speakers": request.max_speakers,
+        "diarization_engine": diarization_engine,
+        "pipeline_mode": request.pipeline_mode,
+        "whisper_model": whisper_model,
+        "whisper_precision": whisper_precision,
+        "vad_enabled": vad_enabled,
+        "priority": request.priority
+    })
     
-    # Add task to background queue
-    background_tasks.add_task(
-        process_video, 
-        job_id=job_id, 
-        youtube_url=str(request.url),
-        diarization_enabled=request.diarization_enabled,
-        diarization_sensitivity=request.diarization_sensitivity
-    )
+    # Hand the job to the scheduler (rejected when the host is out of memory headroom)
+    try:
+        scheduler.submit(job_id, process_video(
+            job_id=job_id,
+            youtube_url=str(request.url),
+            diarization_enabled=request.diarization_enabled,
+            diarization_sensitivity=request.diarization_sensitivity,
+            min_speakers=request.min_speakers,
+            max_speakers=request.max_speakers,
+            diarization_engine=diarization_engine,
+            pipeline_mode=request.pipeline_mode,
+            priority=request.priority,
+            vad_enabled=vad_enabled,
+            whisper_model=whisper_model,
+            whisper_precision=whisper_precision
+        ))
+    except AdmissionError as e:
+        store.delete_job(job_id)
+        raise HTTPException(status_code=503, detail=str(e))
     
     return JobStatus(
         job_id=job_id,
@@ -156,7 +364,7 @@ async def get_video_list(request: VideoListRequest):
         raise HTTPException(status_code=500, detail=f"Failed to extract video list: {str(e)}")
 
 @app.post("/api/batch-process")
-async def process_batch(request: BatchProcessRequest, background_tasks: BackgroundTasks):
+async def process_batch(request: BatchProcessRequest):
     """Start batch processing of playlist or channel"""
     # Validate URL
     if not is_valid_youtube_url(str(request.url)):
@@ -167,11 +375,22 @@ async def process_batch(request: BatchProcessRequest, background_tasks: Backgrou
     if url_type not in ['playlist', 'channel']:
         raise HTTPException(status_code=400, detail="URL must be a playlist or channel")
     
+    if request.pipeline_mode not in PIPELINE_MODES:
+        raise HTTPException(status_code=400, detail=f"pipeline_mode must be one of: {', '.join(PIPELINE_MODES)}")
+    
+    validate_diarization_options(request)
+    validate_whisper_options(request)
+    
+    vad_enabled = VAD_ENABLED if request.vad_enabled is None else request.vad_enabled
+    whisper_model = request.whisper_model or WHISPER_MODEL
+    whisper_precision = request.whisper_precision or WHISPER_PRECISION
+    diarization_engine = request.diarization_engine or DIARIZATION_ENGINE
+    
     # Generate a unique batch ID
     batch_id = str(uuid.uuid4())
     
     # Create batch entry
-    batch_store[batch_id] = {
+    store.create_batch(batch_id, {
         "status": "queued",
         "progress": 0.0,
         "message": "Batch job queued for processing",
@@ -180,22 +399,42 @@ async def process_batch(request: BatchProcessRequest, background_tasks: Backgrou
         "limit": request.limit,
         "diarization_enabled": request.diarization_enabled,
         "diarization_sensitivity": request.diarization_sensitivity,
+        "min_speakers": request.min_speakers,
+        "max_speakers": request.max_speakers,
+        "diarization_engine": diarization_engine,
+        "pipeline_mode": request.pipeline_mode,
+        "whisper_model": whisper_model,
+        "whisper_precision": whisper_precision,
+        "vad_enabled": vad_enabled,
+        "priority": request.priority,
         "videos": [],
         "completed_jobs": [],
         "failed_jobs": [],
         "total_videos": 0
-    }
+    })
     
-    # Add batch task to background queue
-    background_tasks.add_task(
-        process_batch_videos,
-        batch_id=batch_id,
-        url=str(request.url),
-        limit=request.limit,
-        selected_videos=request.selected_videos,
-        diarization_enabled=request.diarization_enabled,
-        diarization_sensitivity=request.diarization_sensitivity
-    )
+    # Hand the batch to the scheduler; its videos queue for workers like single jobs
+    try:
+        scheduler.submit(batch_id, process_batch_videos(
+            batch_id=batch_id,
+            url=str(request.url),
+            limit=request.limit,
+            selected_videos=request.selected_videos,
+            diarization_enabled=request.diarization_enabled,
+            diarization_sensitivity=request.diarization_sensitivity,
+            min_speakers=request.min_speakers,
+            max_speakers=request.max_speakers,
+            diarization_engine=diarization_engine,
+            pipeline_mode=request.pipeline_mode,
+            priority=request.priority,
+            concurrency=request.concurrency,
+            vad_enabled=vad_enabled,
+            whisper_model=whisper_model,
+            whisper_precision=whisper_precision
+        ))
+    except AdmissionError as e:
+        store.delete_batch(batch_id)
+        raise HTTPException(status_code=503, detail=str(e))
     
     return {
         "batch_id": batch_id,
@@ -207,43 +446,32 @@ async def process_batch(request: BatchProcessRequest, background_tasks: Backgrou
 @app.get("/api/batch-status/{batch_id}")
 async def get_batch_status(batch_id: str):
     """Get status of batch processing job"""
-    if batch_id not in batch_store:
+    batch = store.get_batch(batch_id)
+    if batch is None:
         raise HTTPException(status_code=404, detail="Batch job not found")
     
-    batch = batch_store[batch_id]
-    
-    return {
-        "batch_id": batch_id,
-        "status": batch["status"],
-        "progress": batch["progress"],
-        "message": batch["message"],
-        "total_videos": batch["total_videos"],
-        "completed": len(batch["completed_jobs"]),
-        "failed": len(batch["failed_jobs"]),
-        "videos": batch["videos"]
-    }
+    return describe_batch(batch)
 
 @app.get("/api/batch-results/{batch_id}")
 async def get_batch_results(batch_id: str):
     """Get completed results from batch processing"""
-    if batch_id not in batch_store:
+    batch = store.get_batch(batch_id)
+    if batch is None:
         raise HTTPException(status_code=404, detail="Batch job not found")
     
-    batch = batch_store[batch_id]
-    
     if batch["status"] not in ["completed", "partial"]:
         raise HTTPException(status_code=400, detail="Batch processing not complete")
     
     # Return completed job results
     results = []
     for job_id in batch["completed_jobs"]:
-        if job_id in job_store:
-            job = job_store[job_id]
+        result = store.get_result(job_id)
+        if result is not None:
             results.append({
                 "job_id": job_id,
-                "video_title": job["result"]["metadata"]["title"],
-                "video_url": job["result"]["metadata"]["url"],
-                "transcript": job["result"]
+                "video_title": result["metadata"]["title"],
+                "video_url": result["metadata"]["url"],
+                "transcript": result
             })
     
     return {
@@ -257,42 +485,214 @@ async def get_batch_results(batch_id: str):
 
 @app.get("/api/status/{job_id}", response_model=JobStatus)
 async def get_job_status(job_id: str):
-    if job_id not in job_store:
+    job = store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = job_store[job_id]
-    
-    return JobStatus(
-        job_id=job_id,
-        status=job["status"],
-        progress=job["progress"],
-        message=job["message"]
+    return JobStatus(**describe_job(job))
+
+async def event_stream(request: Request, topics: list, snapshot, is_final):
+    """Server-Sent Events for `topics` until an event satisfies `is_final`.
+
+    snapshot() returns the current state as a list of (event_type, data). It is
+    sent first, and again whenever the stream has been idle for
+    EVENT_KEEPALIVE_INTERVAL, which doubles as a keepalive and picks up jobs
+    running in another worker process (whose events this process never sees).
+    """
+    queue = events.subscribe(*topics)
+    try:
+        messages = snapshot()
+        while True:
+            for event_type, data in messages:
+                yield format_sse(event_type, data)
+            if any(is_final(event_type, data) for event_type, data in messages):
+                break
+            if await request.is_disconnected():
+                break
+            try:
+                messages = [await asyncio.wait_for(queue.get(), EVENT_KEEPALIVE_INTERVAL)]
+            except asyncio.TimeoutError:
+                messages = snapshot()
+    finally:
+        events.unsubscribe(queue, *topics)
+
+def sse_response(stream) -> StreamingResponse:
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
     )
 
+@app.get("/api/events/{job_id}")
+async def stream_job_events(job_id: str, request: Request):
+    """Push a job's progress as Server-Sent Events instead of polling /api/status.
+
+    Events: "status" (same fields as /api/status) and "segment" (a transcribed
+    segment as soon as it is ready). The stream ends once the job completes or fails.
+    """
+    if store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    def snapshot():
+        job = store.get_job(job_id)
+        return [("status", describe_job(job))] if job else []
+
+    def is_final(event_type, data):
+        return event_type == "status" and data["status"] in TERMINAL_JOB_STATUSES
+
+    return sse_response(event_stream(request, [f"job:{job_id}"], snapshot, is_final))
+
+@app.get("/api/batch-events/{batch_id}")
+async def stream_batch_events(batch_id: str, request: Request):
+    """Push a batch's progress, and that of every job in it, over one event stream.
+
+    Events: "batch" (same fields as /api/batch-status) plus the "status" and
+    "segment" events of each job, tagged with their job_id.
+    """
+    if store.get_batch(batch_id) is None:
+        raise HTTPException(status_code=404, detail="Batch job not found")
+
+    def snapshot():
+        batch = store.get_batch(batch_id)
+        if batch is None:
+            return []
+        jobs = store.find_jobs(batch_id=batch_id)
+        return [("batch", describe_batch(batch))] + [("status", describe_job(job)) for job in jobs]
+
+    def is_final(event_type, data):
+        return event_type == "batch" and data["status"] in TERMINAL_BATCH_STATUSES
+
+    return sse_response(event_stream(request, [f"batch:{batch_id}"], snapshot, is_final))
+
+@app.get("/api/jobs")
+async def list_jobs(video_id: Optional[str] = None, batch_id: Optional[str] = None):
+    """List jobs for a video and/or batch, e.g. to find an earlier transcript of the same video"""
+    if video_id is None and batch_id is None:
+        raise HTTPException(status_code=400, detail="Provide a video_id or batch_id")
+
+    jobs = store.find_jobs(batch_id=batch_id, video_id=video_id)
+    return {
+        "jobs": [
+            {
+                "job_id": job["job_id"],
+                "status": job["status"],
+                "progress": job["progress"],
+                "message": job["message"],
+                "video_id": job.get("video_id"),
+                "batch_id": job.get("batch_id"),
+                "created_at": job.get("created_at"),
+                "updated_at": job.get("updated_at")
+            }
+            for job in sorted(jobs, key=lambda job: job.get("created_at", 0), reverse=True)
+        ]
+    }
+
+@app.get("/api/jobs/{job_id}/trace")
+async def get_job_trace(job_id: str, format: str = "json"):
+    """Timeline of a job: spans for queue waits, download, each diarization chunk,
+    each transcribed segment and assembly.
+
+    `format=chrome` returns the spans as a Chrome trace-event file to open in
+    chrome://tracing or Perfetto.
+    """
+    job = store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    spans = store.get_spans(job_id)
+    if format == "chrome":
+        return JSONResponse(
+            chrome_trace(spans, job_id),
+            headers={"Content-Disposition": f'attachment; filename="trace_{job_id}.json"'}
+        )
+    if format != "json":
+        raise HTTPException(status_code=400, detail="format must be json or chrome")
+
+    return {
+        "job_id": job_id,
+        "status": job["status"],
+        "video_id": job.get("video_id"),
+        "batch_id": job.get("batch_id"),
+        "summary": summarize_spans(spans),
+        "spans": spans
+    }
+
 @app.get("/api/transcript/{job_id}")
-async def get_transcript(job_id: str):
-    if job_id not in job_store:
+async def get_transcript(job_id: str, since: Optional[int] = None):
+    """Get the final transcript, or with `since` the segments transcribed so far.
+
+    With `since=N` the response holds the partial segments from cursor N on,
+    the `next` cursor to pass on the following call, and `complete` once the
+    job has finished (fetch the final transcript without `since` then; the
+    partial segments are dropped once the final transcript is stored).
+    """
+    job = store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = job_store[job_id]
+    if since is not None:
+        # Read the status before the segments so a "complete" response never misses any
+        segments = store.get_partials(job_id, max(since, 0))
+        return {
+            "job_id": job_id,
+            "status": job["status"],
+            "segments": segments,
+            "next": max(since, 0) + len(segments),
+            "complete": job["status"] in TERMINAL_JOB_STATUSES
+        }
     
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Transcript not ready yet")
     
-    return job["result"]
+    return store.get_result(job_id)
+
+@app.get("/api/transcript/{job_id}/stream")
+async def stream_transcript(job_id: str, request: Request, since: int = 0):
+    """Stream partial segments as newline-delimited JSON while the job runs.
+
+    Each line is {"seq": n, "segment": {...}}; the last line is
+    {"complete": true, "status": ..., "next": n} once the job has finished.
+    """
+    if store.get_job(job_id) is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    async def lines():
+        # Job events only wake the stream up; the store is the source of truth
+        queue = events.subscribe(f"job:{job_id}")
+        try:
+            cursor = max(since, 0)
+            while True:
+                job = store.get_job(job_id)
+                if job is None:
+                    break
+                for segment in store.get_partials(job_id, cursor):
+                    yield json.dumps({"seq": cursor, "segment": segment}) + "\n"
+                    cursor += 1
+                if job["status"] in TERMINAL_JOB_STATUSES:
+                    yield json.dumps({"complete": True, "status": job["status"], "next": cursor}) + "\n"
+                    break
+                if await request.is_disconnected():
+                    break
+                try:
+                    await asyncio.wait_for(queue.get(), EVENT_KEEPALIVE_INTERVAL)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            events.unsubscribe(queue, f"job:{job_id}")
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson", headers={"Cache-Control": "no-cache"})
 
 @app.post("/api/rename/{job_id}")
 async def rename_speakers(job_id: str, request: RenameRequest):
-    if job_id not in job_store:
+    job = store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = job_store[job_id]
-    
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Transcript not ready yet")
     
     # Apply speaker renaming
-    transcript = job["result"]
+    transcript = store.get_result(job_id)
     segments = transcript["segments"]
     
     # Count renamed speakers for debugging
@@ -308,7 +708,7 @@ async def rename_speakers(job_id: str, request: RenameRequest):
             renamed_count += 1
     
     # Update job store
-    job_store[job_id]["result"] = transcript
+    store.set_result(job_id, transcript)
     
     print(f"[JOB {job_id}] Renamed {renamed_count} segments successfully")
     
@@ -321,11 +721,10 @@ async def rename_speakers(job_id: str, request: RenameRequest):
 
 @app.post("/api/merge/{job_id}")
 async def merge_speakers(job_id: str, request: MergeSpeakersRequest):
-    if job_id not in job_store:
+    job = store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = job_store[job_id]
-    
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Transcript not ready yet")
     
@@ -334,7 +733,7 @@ async def merge_speakers(job_id: str, request: MergeSpeakersRequest):
         raise HTTPException(status_code=400, detail="At least two speakers must be provided for merging")
     
     # Apply speaker merging
-    transcript = job["result"]
+    transcript = store.get_result(job_id)
     segments = transcript["segments"]
     
     # Track which speakers were merged for metadata update
@@ -368,7 +767,7 @@ async def merge_speakers(job_id: str, request: MergeSpeakersRequest):
     print(f"[JOB {job_id}] New speaker count: {metadata['num_speakers']}")
     
     # Update job store
-    job_store[job_id]["result"] = transcript
+    store.set_result(job_id, transcript)
     
     return {
         "message": "Speakers merged successfully", 
@@ -379,6 +778,65 @@ async def merge_speakers(job_id: str, request: MergeSpeakersRequest):
         "unique_speakers": list(unique_speakers)
     }
 
+@app.post("/api/recluster/{job_id}")
+async def recluster_job(job_id: str, request: ReclusterRequest):
+    """Reassign speakers from the job's cached speaker embeddings with new clustering settings.
+
+    Nothing is downloaded, diarized from audio or transcribed again. Speaker
+    names given with /api/rename or /api/merge are replaced by the new labels.
+    """
+    job = store.get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    if job["status"] != "completed":
+        raise HTTPException(status_code=400, detail="Transcript not ready yet")
+    
+    if not job.get("diarization_enabled", True):
+        raise HTTPException(status_code=400, detail="Speaker diarization was disabled for this job")
+    
+    if request.num_speakers is None and request.threshold is None:
+        raise HTTPException(status_code=400, detail="Provide num_speakers or threshold")
+    if request.num_speakers is not None and request.num_speakers < 1:
+        raise HTTPException(status_code=400, detail="num_speakers must be at least 1")
+    if request.threshold is not None and not 0.0 < request.threshold < 2.0:
+        raise HTTPException(status_code=400, detail="threshold must be between 0 and 2")
+    
+    video_id = job.get("video_id")
+    diarization_engine = job.get("diarization_engine") or DIARIZATION_ENGINE
+    threshold = request.threshold
+    if threshold is None:
+        threshold = clustering_threshold(job.get("diarization_sensitivity", 0.5), diarization_engine)
+    min_speakers = request.num_speakers or job.get("min_speakers")
+    max_speakers = request.num_speakers or job.get("max_speakers")
+    
+    print(f"[JOB {job_id}] Re-clustering speakers (threshold {threshold:.3f}, num_speakers {request.num_speakers})")
+    diarization_segments = await recluster_speakers(
+        features_cache_key(video_id, diarization_engine), threshold, min_speakers, max_speakers, diarization_engine
+    ) if video_id else None
+    if diarization_segments is None:
+        raise HTTPException(status_code=409, detail="Speaker embeddings for this job are no longer cached; process the video again")
+    
+    transcript = store.get_result(job_id)
+    segments = reassign_speakers(transcript["segments"], diarization_segments)
+    speakers = sorted({segment["speaker"] for segment in segments})
+    transcript["segments"] = segments
+    transcript["metadata"]["num_speakers"] = len(speakers)
+    transcript["plaintext"] = format_plaintext(transcript["metadata"], segments)
+    
+    store.set_result(job_id, transcript)
+    update_job(job_id, original_speakers={speaker: speaker for speaker in speakers})
+    
+    print(f"[JOB {job_id}] Re-clustered into {len(speakers)} speakers across {len(segments)} segments")
+    
+    return {
+        "message": "Speakers re-clustered successfully",
+        "threshold": threshold,
+        "num_speakers": len(speakers),
+        "speakers": speakers,
+        "segments": len(segments)
+    }
+
 @app.get("/api/export/{job_id}")
 async def export_transcript(job_id: str, format: str = "txt", options: Optional[str] = None):
     from fastapi.responses import PlainTextResponse, Response
@@ -388,16 +846,15 @@ async def export_transcript(job_id: str, format: str = "txt", options: Optional[
     from modules.assembler import format_timestamp
     from datetime import timedelta
     
-    if job_id not in job_store:
+    job = store.get_job(job_id)
+    if job is None:
         raise HTTPException(status_code=404, detail="Job not found")
     
-    job = job_store[job_id]
-    
     if job["status"] != "completed":
         raise HTTPException(status_code=400, detail="Transcript not ready yet")
     
     # Get the most up-to-date transcript with any renamed speakers
-    transcript = job["result"]
+    transcript = store.get_result(job_id)
     
     # Handle enhanced export options
     if options:
@@ -524,17 +981,13 @@ async def export_transcript(job_id: str, format: str = "txt", options: Optional[
     else:
         return {"message": f"Export in {format} format not implemented yet"}
 
-async def process_batch_videos(batch_id: str, url: str, limit: Optional[int], selected_videos: Optional[list[str]], diarization_enabled: bool, diarization_sensitivity: float):
+async def process_batch_videos(batch_id: str, url: str, limit: Optional[int], selected_videos: Optional[list[str]], diarization_enabled: bool, diarization_sensitivity: float, pipeline_mode: str = "per_segment", priority: int = 0, concurrency: Optional[int] = None, vad_enabled: bool = False, min_speakers: Optional[int] = None, max_speakers: Optional[int] = None, whisper_model: Optional[str] = None, whisper_precision: Optional[str] = None, diarization_engine: Optional[str] = None):
     """Background task to process multiple videos from playlist/channel"""
-    batch = batch_store[batch_id]
-    
     try:
         print(f"\n[BATCH {batch_id}] Starting batch processing of URL: {url}")
         
         # Step 1: Extract video list
-        batch["status"] = "extracting"
-        batch["message"] = "Extracting video list..."
-        batch["progress"] = 0.1
+        update_batch(batch_id, status="extracting", message="Extracting video list...", progress=0.1)
         
         batch_info = await extract_batch_info(url, limit)
         all_videos = batch_info["videos"]
@@ -547,155 +1000,443 @@ async def process_batch_videos(batch_id: str, url: str, limit: Optional[int], se
             videos = all_videos
             print(f"[BATCH {batch_id}] Processing all {len(videos)} videos")
         
-        batch["videos"] = videos
-        batch["total_videos"] = len(videos)
+        update_batch(batch_id, videos=videos, total_videos=len(videos))
         
         if len(videos) == 0:
-            batch["status"] = "completed"
-            batch["message"] = "No videos found to process"
+            update_batch(batch_id, status="completed", message="No videos found to process")
             return
         
         print(f"[BATCH {batch_id}] Starting processing of {len(videos)} videos")
         
-        # Step 2: Process each video
-        batch["status"] = "processing"
-        batch["message"] = f"Processing videos (0/{len(videos)})"
+        # Step 2: Process videos, `concurrency` at a time. Stages are bounded by the
+        # scheduler's worker pools, so while one video transcribes the next can
+        # diarize and the one after that download.
+        concurrency = max(1, min(concurrency or BATCH_CONCURRENCY, len(videos)))
+        update_batch(
+            batch_id,
+            status="processing",
+            message=f"Processing videos (0/{len(videos)})",
+            concurrency=concurrency
+        )
+        print(f"[BATCH {batch_id}] Processing up to {concurrency} videos at a time")
         
-        for i, video in enumerate(videos):
-            try:
-                print(f"[BATCH {batch_id}] Processing video {i+1}/{len(videos)}: {video['title']}")
-                
-                # Create individual job for this video
-                job_id = str(uuid.uuid4())
-                job_store[job_id] = {
-                    "status": "queued",
-                    "progress": 0.0,
-                    "message": "Job queued for processing",
-                    "result": None,
-                    "original_speakers": {},
-                    "diarization_enabled": diarization_enabled,
-                    "diarization_sensitivity": diarization_sensitivity,
-                    "batch_id": batch_id,
-                    "video_info": video
-                }
-                
-                # Process this video
-                await process_video(job_id, video["url"], diarization_enabled, diarization_sensitivity)
-                
-                # Check if processing succeeded
-                if job_store[job_id]["status"] == "completed":
-                    batch["completed_jobs"].append(job_id)
-                    print(f"[BATCH {batch_id}] Video {i+1}/{len(videos)} completed successfully")
-                else:
-                    batch["failed_jobs"].append(job_id)
-                    print(f"[BATCH {batch_id}] Video {i+1}/{len(videos)} failed: {job_store[job_id]['message']}")
+        # Create individual jobs up front so every video reports its status
+        job_ids = []
+        for video in videos:
+            job_id = str(uuid.uuid4())
+            store.create_job(job_id, {
+                "status": "queued",
+                "progress": 0.0,
+                "message": "Job queued for processing",
+                "result": None,
+                "original_speakers": {},
+                "video_id": video["id"],
+                "diarization_enabled": diarization_enabled,
+                "diarization_sensitivity": diarization_sensitivity,
+                "min_speakers": min_speakers,
+                "max_speakers": max_speakers,
+                "diarization_engine": diarization_engine,
+                "pipeline_mode": pipeline_mode,
+                "whisper_model": whisper_model,
+                "whisper_precision": whisper_precision,
+                "vad_enabled": vad_enabled,
+                "priority": priority,
+                "batch_id": batch_id,
+                "video_info": video
+            })
+            events.link_job(job_id, batch_id)
+            job_ids.append(job_id)
+        
+        batch_slots = asyncio.Semaphore(concurrency)
+        completed_jobs = []
+        failed_jobs = []
+        
+        async def process_batch_video(i, video, job_id):
+            wait_start = time.time()
+            async with batch_slots:
+                try:
+                    # Share the global video workers fairly with other running batches
+                    async with scheduler.video_slot(batch_id, job_id, priority, wait_message(job_id, "batch")):
+                        Tracer(store, job_id).record("wait for batch worker", wait_start, time.time(), track="queue")
+                        print(f"[BATCH {batch_id}] Processing video {i+1}/{len(videos)}: {video['title']}")
+                        await process_video(job_id, video["url"], diarization_enabled, diarization_sensitivity, pipeline_mode, priority, vad_enabled, min_speakers, max_speakers, whisper_model, whisper_precision, diarization_engine)
+                    
+                    # Check if processing succeeded
+                    job = store.get_job(job_id)
+                    if job["status"] == "completed":
+                        completed_jobs.append(job_id)
+                        print(f"[BATCH {batch_id}] Video {i+1}/{len(videos)} completed successfully")
+                    else:
+                        failed_jobs.append(job_id)
+                        print(f"[BATCH {batch_id}] Video {i+1}/{len(videos)} failed: {job['message']}")
+                    
+                except Exception as e:
+                    print(f"[BATCH {batch_id}] Error processing video {i+1}: {str(e)}")
+                    failed_jobs.append(job_id)
                 
-            except Exception as e:
-                print(f"[BATCH {batch_id}] Error processing video {i+1}: {str(e)}")
-                batch["failed_jobs"].append(f"video_{i+1}")
-            
-            # Update batch progress
-            progress = 0.1 + (0.9 * (i + 1) / len(videos))
-            batch["progress"] = progress
-            batch["message"] = f"Processing videos ({i+1}/{len(videos)})"
+                # Update batch progress
+                finished = len(completed_jobs) + len(failed_jobs)
+                update_batch(
+                    batch_id,
+                    completed_jobs=completed_jobs,
+                    failed_jobs=failed_jobs,
+                    progress=0.1 + (0.9 * finished / len(videos)),
+                    message=f"Processing videos ({finished}/{len(videos)})"
+                )
+        
+        await asyncio.gather(*(
+            process_batch_video(i, video, job_id)
+            for i, (video, job_id) in enumerate(zip(videos, job_ids))
+        ))
+        for job_id in job_ids:
+            events.forget_job(job_id)
         
         # Update final status
-        completed_count = len(batch["completed_jobs"])
-        failed_count = len(batch["failed_jobs"])
+        completed_count = len(completed_jobs)
+        failed_count = len(failed_jobs)
         
         if completed_count == len(videos):
-            batch["status"] = "completed"
-            batch["message"] = f"All {completed_count} videos processed successfully"
+            status = "completed"
+            message = f"All {completed_count} videos processed successfully"
         elif completed_count > 0:
-            batch["status"] = "partial"
-            batch["message"] = f"{completed_count} videos completed, {failed_count} failed"
+            status = "partial"
+            message = f"{completed_count} videos completed, {failed_count} failed"
         else:
-            batch["status"] = "failed"
-            batch["message"] = f"All {failed_count} videos failed to process"
+            status = "failed"
+            message = f"All {failed_count} videos failed to process"
         
-        batch["progress"] = 1.0
+        update_batch(batch_id, status=status, message=message, progress=1.0)
         
         print(f"[BATCH {batch_id}] Batch processing completed: {completed_count} successful, {failed_count} failed")
         
     except Exception as e:
-        batch["status"] = "failed"
-        batch["message"] = f"Batch processing error: {str(e)}"
-        batch["progress"] = 0.0
+        update_batch(batch_id, status="failed", message=f"Batch processing error: {str(e)}", progress=0.0)
         print(f"[BATCH {batch_id}] Fatal error: {str(e)}")
 
-async def process_video(job_id: str, youtube_url: str, diarization_enabled: bool = True, diarization_sensitivity: float = 0.5):
-    """Background task to process a YouTube video"""
-    job = job_store[job_id]
-    
+def wait_message(job_id: str, resource: str):
+    """Callback for scheduler.slot() that reports the job's place in a worker queue"""
+    def on_wait(position):
+        update_job(job_id, message=f"Waiting for a {resource} worker (queue position {position})")
+    return on_wait
+
+@asynccontextmanager
+async def job_slot(pool: str, job_id: str, priority: int, resource: str):
+    """Hold a scheduler worker for a job, reporting its queue position and tracing the wait"""
+    wait_start = time.time()
+    async with scheduler.slot(pool, job_id, priority, wait_message(job_id, resource)):
+        Tracer(store, job_id).record(f"wait for {resource} worker", wait_start, time.time(), track="queue")
+        yield
+
+# Jobs currently fetching each video's audio: video_id -> [lock, number of jobs using it]
+_audio_locks = {}
+
+@asynccontextmanager
+async def video_audio_lock(video_id: Optional[str]):
+    """Let one job at a time fetch a video's audio, so later jobs reuse the cached download"""
+    if not video_id:
+        yield
+        return
+    entry = _audio_locks.setdefault(video_id, [asyncio.Lock(), 0])
+    entry[1] += 1
     try:
-        print(f"\n[JOB {job_id}] Starting processing of YouTube URL: {youtube_url}")
-        # Update status to processing
-        job["status"] = "processing"
-        job["message"] = "Downloading YouTube audio"
-        job["progress"] = 0.1
-        
-        # Step 1: Download YouTube audio
-        print(f"[JOB {job_id}] Downloading YouTube audio...")
-        audio_path, video_info = await download_youtube_audio(youtube_url)
-        print(f"[JOB {job_id}] YouTube audio downloaded to {audio_path}")
-        job["progress"] = 0.3
-        
-        # Step 2: Perform speaker diarization (if enabled)
-        if diarization_enabled:
-            job["message"] = "Performing speaker diarization"
-            print(f"[JOB {job_id}] Starting speaker diarization with sensitivity {diarization_sensitivity}...")
-            diarization_result = await perform_diarization(audio_path, sensitivity=diarization_sensitivity)
-            print(f"[JOB {job_id}] Speaker diarization completed. Found {len(diarization_result)} segments")
-        else:
-            job["message"] = "Skipping speaker diarization"
+        async with entry[0]:
+            yield
+    finally:
+        entry[1] -= 1
+        if entry[1] == 0:
+            del _audio_locks[video_id]
+
+async def run_model_stages(job_id: str, audio_path: str, video_info: dict, video_id: Optional[str],
+                           diarization_enabled: bool, diarization_sensitivity: float, pipeline_mode: str,
+                           priority: int = 0, vad_enabled: bool = False,
+                           min_speakers: Optional[int] = None, max_speakers: Optional[int] = None,
+                           whisper_model: Optional[str] = None, whisper_precision: Optional[str] = None,
+                           diarization_engine: Optional[str] = None):
+    """Run speaker diarization and Whisper transcription for a job.
+
+    Returns (transcription_result, words, vad_stats): the transcribed segments,
+    or the diarization turns plus single-pass words to be aligned at assembly,
+    and how much audio voice activity detection skipped (None if disabled).
+    """
+    tracer = Tracer(store, job_id)
+
+    # Steps 2 and 3 are tracked per stage so they can run concurrently
+    stages = {
+        "diarization": {"status": "pending", "progress": 0.0},
+        "transcription": {"status": "pending", "progress": 0.0}
+    }
+    update_job(job_id, stages=stages)
+    
+    def update_stage(stage, status, progress, **fields):
+        stages[stage] = {"status": status, "progress": progress}
+        # Diarization and transcription together cover 0.3 -> 0.8 of overall progress
+        stage_progress = sum(entry["progress"] for entry in stages.values()) / len(stages)
+        update_job(job_id, stages=stages, progress=0.3 + 0.5 * stage_progress, **fields)
+    
+    # Find speech up front so silence and music are never sent to Whisper
+    speech_regions = None
+    vad_stats = None
+    if vad_enabled:
+        speech_regions, vad_stats = await asyncio.get_event_loop().run_in_executor(None, detect_speech_in_file, audio_path)
+        print(f"[JOB {job_id}] Voice activity detection kept {vad_stats['speech_seconds']:.0f}s of speech "
+              f"in {vad_stats['regions']} regions, skipping {vad_stats['skipped_seconds']:.0f}s")
+        update_job(job_id, vad=vad_stats)
+    
+    # Step 2: Perform speaker diarization (if enabled)
+    async def run_diarization_stage():
+        if not diarization_enabled:
             print(f"[JOB {job_id}] Skipping speaker diarization (disabled)")
+            update_stage("diarization", "skipped", 1.0)
             # Create a single segment for the entire audio
-            diarization_result = [{
+            return [{
                 "start": 0.0,
                 "end": video_info.get("duration", 3600),  # Default to 1 hour if duration unknown
-                "speaker": "Speaker 1"
+                "speaker": speaker_label(0)
             }]
         
-        job["progress"] = 0.6
-        job["message"] = "Transcribing audio segments"
+        diarization_key = result_cache.make_key(
+            "diarization", video_id=video_id, engine=diarization_engine or DIARIZATION_ENGINE,
+            sensitivity=diarization_sensitivity, min_speakers=min_speakers, max_speakers=max_speakers
+        )
+        segments = result_cache.get_json("diarization", diarization_key) if video_id else None
+        if segments is not None:
+            print(f"[JOB {job_id}] Using cached speaker diarization ({len(segments)} segments)")
+            update_stage("diarization", "completed", 1.0)
+            return segments
+        
+        # Long files are diarized in chunks; report, trace and publish each one as it
+        # finishes. Chunks run one after another, so a chunk's span starts when the
+        # previous one ended (the first also covers loading the model).
+        chunk_clock = [time.time()]
+        def on_chunk(chunk_segments, chunks_done, total_chunks):
+            now = time.time()
+            tracer.record(
+                f"diarization chunk {chunks_done}/{total_chunks}", chunk_clock[0], now, track="diarization",
+                chunk=chunks_done, total=total_chunks, segments=len(chunk_segments),
+                speakers=len({segment["speaker"] for segment in chunk_segments}),
+                audio_start=chunk_segments[0]["start"] if chunk_segments else None,
+                audio_end=max((segment["end"] for segment in chunk_segments), default=None)
+            )
+            chunk_clock[0] = now
+            update_stage(
+                "diarization", "running", chunks_done / total_chunks,
+                message=f"Performing speaker diarization (chunk {chunks_done}/{total_chunks})"
+            )
+            events.publish_job(job_id, "diarization", {"chunk": chunks_done, "total": total_chunks, "segments": chunk_segments})
         
-        # Step 3: Transcribe segments with Whisper
-        total_segments = len(diarization_result)
+        async with job_slot("diarize", job_id, priority, "diarization"):
+            update_stage("diarization", "running", 0.0)
+            print(f"[JOB {job_id}] Starting speaker diarization ({diarization_engine or DIARIZATION_ENGINE} engine) with sensitivity {diarization_sensitivity}...")
+            chunk_clock[0] = time.time()
+            with tracer.span("diarize", track="diarization", engine=diarization_engine or DIARIZATION_ENGINE) as span:
+                # Speaker embeddings are cached per video, so other settings only re-cluster
+                segments = await perform_diarization(
+                    audio_path, sensitivity=diarization_sensitivity,
+                    min_speakers=min_speakers, max_speakers=max_speakers,
+                    features_key=features_cache_key(video_id, diarization_engine) if video_id else None,
+                    chunk_callback=on_chunk,
+                    engine=diarization_engine
+                )
+                span["segments"] = len(segments)
+        print(f"[JOB {job_id}] Speaker diarization completed. Found {len(segments)} segments")
+        update_stage("diarization", "completed", 1.0)
+        if video_id:
+            result_cache.put_json("diarization", diarization_key, segments)
+        return segments
+    
+    # Step 3a: Transcribe the whole file in one Whisper pass
+    async def run_full_transcription_stage():
+        try:
+            async with job_slot("transcribe", job_id, priority, "transcription"):
+                update_stage("transcription", "running", 0.0)
+                print(f"[JOB {job_id}] Transcribing full audio in a single pass...")
+                with tracer.span("transcribe", track="transcription", mode="single_pass") as span:
+                    full_words = await transcribe_full(
+                        audio_path, speech_regions=speech_regions, model_name=whisper_model, precision=whisper_precision
+                    )
+                    span["words"] = len(full_words)
+        except Exception as e:
+            # Fall back to transcribing each diarization turn separately
+            print(f"[JOB {job_id}] Single-pass transcription failed ({str(e)}), falling back to per-segment")
+            update_stage("transcription", "pending", 0.0)
+            return None
+        update_stage("transcription", "completed", 1.0)
+        return full_words
+    
+    words = None
+    if pipeline_mode == "concurrent":
+        # Run diarization and full-file transcription side by side, then merge by timestamp
+        update_job(job_id, message="Performing speaker diarization and transcription in parallel")
+        diarization_result, words = await asyncio.gather(
+            run_diarization_stage(),
+            run_full_transcription_stage()
+        )
+    else:
+        update_job(job_id, message="Performing speaker diarization" if diarization_enabled else "Skipping speaker diarization")
+        diarization_result = await run_diarization_stage()
+        if pipeline_mode == "single_pass":
+            update_job(job_id, message="Transcribing full audio")
+            words = await run_full_transcription_stage()
+    
+    # Step 3b: Transcribe each diarization turn with Whisper
+    if words is None:
+        # Only the speech within each turn is transcribed
+        segments_to_transcribe = diarization_result
+        if speech_regions is not None:
+            segments_to_transcribe = split_segments(diarization_result, speech_regions)
+        total_segments = len(segments_to_transcribe)
         
         # Create a callback to update progress during transcription
         def update_progress(current_segment):
-            progress = 0.6 + (0.2 * (current_segment / total_segments))
-            job["progress"] = progress
-            job["message"] = f"Transcribing audio segments ({current_segment}/{total_segments})"
+            update_stage(
+                "transcription", "running", current_segment / total_segments,
+                message=f"Transcribing audio segments ({current_segment}/{total_segments})"
+            )
+        
+        # Expose each segment as soon as it is transcribed, through the partial
+        # transcript endpoints and to event subscribers
+        def publish_segment(index, segment):
+            if not segment["text"].strip():
+                return
+            seq = store.append_partial(job_id, segment)
+            events.publish_job(job_id, "segment", {"seq": seq, "index": index, "total": total_segments, "segment": segment})
+        
+        async with job_slot("transcribe", job_id, priority, "transcription"):
+            update_stage("transcription", "running", 0.0, message="Transcribing audio segments")
+            with tracer.span("transcribe", track="transcription", mode="per_segment", segments=total_segments):
+                transcription_result = await transcribe_segments(
+                    audio_path, segments_to_transcribe, update_progress, segment_callback=publish_segment,
+                    model_name=whisper_model, precision=whisper_precision,
+                    span_callback=lambda *args, **attributes: tracer.record(*args, track="transcription", **attributes)
+                )
+        update_stage("transcription", "completed", 1.0)
+    else:
+        # Speakers are assigned to the words from the diarization turns at assembly
+        transcription_result = diarization_result
+    
+    return transcription_result, words, vad_stats
+
+async def process_video(job_id: str, youtube_url: str, diarization_enabled: bool = True, diarization_sensitivity: float = 0.5, pipeline_mode: str = "per_segment", priority: int = 0, vad_enabled: bool = False, min_speakers: Optional[int] = None, max_speakers: Optional[int] = None, whisper_model: Optional[str] = None, whisper_precision: Optional[str] = None, diarization_engine: Optional[str] = None):
+    """Background task to process a YouTube video"""
+    # Results are cached per stage, keyed by the video and the options each stage depends on
+    video_id = extract_video_id(youtube_url)
+    audio_pinned = False
+    tracer = Tracer(store, job_id)
+    
+    try:
+        print(f"\n[JOB {job_id}] Starting processing of YouTube URL: {youtube_url}")
+        # Update status to processing
+        update_job(
+            job_id,
+            video_id=video_id,
+            status="processing",
+            message="Downloading YouTube audio",
+            progress=0.1
+        )
         
-        transcription_result = await transcribe_segments(audio_path, diarization_result, update_progress)
-        job["progress"] = 0.8
-        job["message"] = "Assembling final transcript"
+        transcription_key = result_cache.make_key(
+            "transcription",
+            video_id=video_id,
+            diarization_enabled=diarization_enabled,
+            sensitivity=diarization_sensitivity if diarization_enabled else None,
+            min_speakers=min_speakers if diarization_enabled else None,
+            max_speakers=max_speakers if diarization_enabled else None,
+            diarization_engine=(diarization_engine or DIARIZATION_ENGINE) if diarization_enabled else None,
+            engine=TRANSCRIPTION_ENGINE,
+            model=whisper_model or WHISPER_MODEL,
+            precision=resolve_precision(whisper_precision),
+            pipeline_mode=pipeline_mode,
+            vad_enabled=vad_enabled
+        )
+        cached_transcription = result_cache.get_json("transcription", transcription_key) if video_id else None
+        if cached_transcription:
+            print(f"[JOB {job_id}] Using cached transcription for video {video_id}")
+            video_info = dict(cached_transcription["video_info"], url=youtube_url)
+            transcription_result = cached_transcription["segments"]
+            words = cached_transcription["words"]
+            vad_stats = cached_transcription.get("vad")
+        else:
+            # Step 1: Download YouTube audio (or reuse a cached download)
+            # Jobs for the same video wait here while one of them downloads it
+            async with video_audio_lock(video_id):
+                cached_audio = result_cache.get_audio(video_id) if video_id else None
+                if cached_audio:
+                    audio_path, video_info = cached_audio
+                    audio_pinned = True
+                    video_info = dict(video_info, url=youtube_url)
+                    print(f"[JOB {job_id}] Using cached audio at {audio_path}")
+                else:
+                    async with job_slot("download", job_id, priority, "download"):
+                        # Hold back new downloads while job workspaces are over their disk quota
+                        with tracer.span("wait for disk space", track="queue"):
+                            await workspaces.wait_for_space(
+                                lambda used_mb: update_job(job_id, message=f"Waiting for disk space ({used_mb:.0f} MB of downloads in use)")
+                            )
+                        update_job(job_id, message="Downloading YouTube audio")
+                        print(f"[JOB {job_id}] Downloading YouTube audio...")
+                        with tracer.span("download") as span:
+                            audio_path, video_info = await download_youtube_audio(youtube_url, workspaces.create(job_id))
+                            span["audio_seconds"] = video_info.get("duration")
+                        print(f"[JOB {job_id}] YouTube audio downloaded to {audio_path}")
+                    # Decode once into the memory-mappable PCM file both model stages read
+                    with tracer.span("convert"):
+                        audio_path = await asyncio.get_event_loop().run_in_executor(None, ensure_pcm, audio_path)
+                    # Moving the audio into the cache retains it beyond the job's workspace
+                    if video_id:
+                        audio_path = result_cache.put_audio(video_id, audio_path, video_info)
+                        audio_pinned = True
+            update_job(job_id, progress=0.3)
+            
+            transcription_result, words, vad_stats = await run_model_stages(
+                job_id, audio_path, video_info, video_id,
+                diarization_enabled, diarization_sensitivity, pipeline_mode, priority, vad_enabled,
+                min_speakers, max_speakers, whisper_model, whisper_precision, diarization_engine
+            )
+            if video_id:
+                result_cache.put_json("transcription", transcription_key, {
+                    "video_info": video_info,
+                    "segments": transcription_result,
+                    "words": words,
+                    "vad": vad_stats
+                })
+        
+        update_job(job_id, progress=0.8, message="Assembling final transcript")
         
         # Step 4: Assemble final transcript
         print(f"[JOB {job_id}] Assembling final transcript...")
-        final_transcript = await assemble_transcript(transcription_result, video_info)
+        with tracer.span("assemble", cached=cached_transcription is not None):
+            final_transcript = await assemble_transcript(transcription_result, video_info, words=words)
+        if vad_stats:
+            final_transcript["metadata"]["vad"] = vad_stats
         print(f"[JOB {job_id}] Final transcript assembled successfully")
-        job["progress"] = 1.0
         
         # Store original speaker mapping
         speakers = set()
         for segment in final_transcript["segments"]:
             speakers.add(segment["speaker"])
         
-        job["original_speakers"] = {speaker: speaker for speaker in speakers}
-        
         # Update job with completed result
-        job["status"] = "completed"
-        job["message"] = "Processing complete"
-        job["result"] = final_transcript
+        store.set_result(job_id, final_transcript)
+        update_job(
+            job_id,
+            original_speakers={speaker: speaker for speaker in speakers},
+            status="completed",
+            message="Processing complete",
+            progress=1.0
+        )
+        metrics.JOBS.inc(status="completed")
         
     except Exception as e:
         # Handle any exceptions
-        job["status"] = "failed"
-        job["message"] = f"Error: {str(e)}"
-        job["progress"] = 0.0
+        update_job(job_id, status="failed", message=f"Error: {str(e)}", progress=0.0)
+        metrics.JOBS.inc(status="failed")
         print(f"[JOB {job_id}] Processing failed: {str(e)}")
+    finally:
+        # Let the cached audio be evicted again
+        if audio_pinned:
+            result_cache.release_audio(video_id)
+        # Remove the job's downloads; anything worth keeping was moved into the cache
+        workspaces.cleanup(job_id)
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Benchmark speaker clustering on synthetic embedding matrices: time, peak
+memory and accuracy as the number of windows grows.
+
+Usage:
+    python benchmark_clustering.py [--sizes 1000,5000,10000,50000,100000]
+                                   [--speakers 4] [--dim 256] [--noise 0.9]
+                                   [--threshold 0.7] [--max-exact 4000] [--output results.json]
+
+Each matrix has --speakers random unit "voices"; every window is one of them
+plus Gaussian noise, with speakers taking turns the way they do in a
+recording. An hour of audio is about 4800 windows for the lightweight engine
+(1.5 s windows every 0.75 s).
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+import numpy as np
+
+from modules.clustering import agglomerative_cluster, MAX_EXACT_CLUSTERING
+
+def synthetic_embeddings(num_windows: int, num_speakers: int, dim: int, noise: float, seed: int = 0):
+    """Embeddings and true speaker of each window; turns last 5 to 40 windows"""
+    rng = np.random.default_rng(seed)
+    voices = rng.standard_normal((num_speakers, dim))
+    voices /= np.linalg.norm(voices, axis=1, keepdims=True)
+
+    speakers = np.empty(num_windows, dtype=int)
+    position = 0
+    while position < num_windows:
+        turn = int(rng.integers(5, 40))
+        speakers[position:position + turn] = rng.integers(num_speakers)
+        position += turn
+
+    embeddings = voices[speakers] + rng.standard_normal((num_windows, dim)) * noise / np.sqrt(dim)
+    return embeddings.astype(np.float32), speakers
+
+def accuracy(truth: np.ndarray, labels: np.ndarray) -> float:
+    """Share of windows whose cluster's majority speaker is their own speaker"""
+    correct = 0
+    for label in np.unique(labels):
+        correct += np.bincount(truth[labels == label]).max()
+    return correct / len(truth)
+
+def run_size(num_windows: int, args) -> dict:
+    embeddings, truth = synthetic_embeddings(num_windows, args.speakers, args.dim, args.noise)
+
+    tracemalloc.start()
+    start_time = time.time()
+    labels = agglomerative_cluster(embeddings, args.threshold, max_exact=args.max_exact)
+    elapsed = time.time() - start_time
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        "windows": num_windows,
+        "mode": "exact" if num_windows <= args.max_exact else "summarized",
+        "seconds": elapsed,
+        "peak_mb": peak / 1024**2,
+        "speakers": int(labels.max()) + 1,
+        "accuracy": accuracy(truth, labels),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark speaker clustering on synthetic embeddings")
+    parser.add_argument("--sizes", default="1000,5000,10000,50000,100000",
+                        help="Comma-separated numbers of windows to cluster")
+    parser.add_argument("--speakers", type=int, default=4, help="Speakers in each synthetic recording")
+    parser.add_argument("--dim", type=int, default=256, help="Embedding dimension (wespeaker: 256)")
+    parser.add_argument("--noise", type=float, default=0.9, help="Noise norm relative to the unit voice vectors")
+    parser.add_argument("--threshold", type=float, default=0.7, help="Clustering threshold (cosine distance)")
+    parser.add_argument("--max-exact", type=int, default=MAX_EXACT_CLUSTERING,
+                        help="Windows clustered exactly before switching to a k-means summary")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",") if size.strip()]
+
+    results = []
+    for num_windows in sizes:
+        print(f"\nClustering {num_windows} synthetic embeddings ({args.speakers} speakers, dim {args.dim})...")
+        results.append(run_size(num_windows, args))
+
+    print("\n===== CLUSTERING BENCHMARK =====")
+    print(f"{'windows':>8} | {'mode':>10} | {'seconds':>8} | {'peak MB':>8} | {'speakers':>8} | {'accuracy':>8}")
+    for result in results:
+        print(f"{result['windows']:>8} | {result['mode']:>10} | {result['seconds']:>8.2f} | "
+              f"{result['peak_mb']:>8.0f} | {result['speakers']:>8} | {result['accuracy']:>8.1%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"settings": vars(args), "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
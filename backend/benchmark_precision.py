@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Benchmark Whisper model sizes and precisions: realtime factor and word error
+rate on a fixed audio fixture with a reference transcript.
+
+Usage:
+    python benchmark_precision.py [audio.wav reference.txt] [--models tiny,base,small]
+                                  [--precisions fp32,int8,bf16] [--output results.json]
+
+Without arguments the committed fixture is used: fixtures/jfk.wav, 11 seconds
+of John F. Kennedy's 1961 inaugural address (public domain, 16 kHz mono), and
+its reference transcript fixtures/jfk.txt.
+
+Each model/precision pair transcribes the fixture in a single pass (the
+single_pass pipeline mode). Always use the same fixture so runs on different
+hosts are comparable. The reference is plain text; punctuation and case are
+ignored when scoring.
+"""
+
+import os
+import argparse
+import asyncio
+import json
+import re
+import time
+from dotenv import load_dotenv
+
+from modules.model_registry import release_model, evict_idle_models
+from modules.transcription import (
+    get_whisper_model, load_audio_array, transcribe_full, resolve_precision, SAMPLE_RATE
+)
+
+# Load environment variables
+load_dotenv()
+
+FIXTURE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+DEFAULT_AUDIO = os.path.join(FIXTURE_DIR, "jfk.wav")
+DEFAULT_REFERENCE = os.path.join(FIXTURE_DIR, "jfk.txt")
+
+def normalize_words(text: str) -> list:
+    """Lowercase words with punctuation removed"""
+    return re.sub(r"[^\w\s']", " ", text.lower()).split()
+
+def word_error_rate(reference: str, hypothesis: str) -> float:
+    """Word-level edit distance between the texts, divided by the reference length"""
+    ref = normalize_words(reference)
+    hyp = normalize_words(hypothesis)
+    if not ref:
+        return float(len(hyp) > 0)
+    previous = list(range(len(hyp) + 1))
+    for i, ref_word in enumerate(ref, 1):
+        current = [i] + [0] * len(hyp)
+        for j, hyp_word in enumerate(hyp, 1):
+            current[j] = min(
+                previous[j] + 1,  # deletion
+                current[j - 1] + 1,  # insertion
+                previous[j - 1] + (ref_word != hyp_word)  # substitution
+            )
+        previous = current
+    return previous[-1] / len(ref)
+
+def run_setting(audio_path: str, duration: float, reference: str, model_name: str, precision: str) -> dict:
+    # Load outside the timed section so the realtime factor only covers inference
+    load_start = time.time()
+    model, model_key = get_whisper_model(model_name, precision)
+    load_seconds = time.time() - load_start
+    try:
+        start_time = time.time()
+        words = asyncio.run(transcribe_full(audio_path, model_name=model_name, precision=precision))
+        elapsed = time.time() - start_time
+    finally:
+        release_model(*model_key)
+        # Free the model before loading the next one
+        evict_idle_models(timeout=1e-9)
+
+    hypothesis = "".join(word["word"] for word in words)
+    return {
+        "model": model_name,
+        "precision": model_key[3],
+        "load_seconds": load_seconds,
+        "seconds": elapsed,
+        "realtime_factor": duration / elapsed,
+        "wer": word_error_rate(reference, hypothesis),
+        "words": len(words),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Whisper realtime factor and WER per model size and precision")
+    parser.add_argument("audio", nargs="?", default=DEFAULT_AUDIO,
+                        help="Audio fixture to transcribe (default: fixtures/jfk.wav)")
+    parser.add_argument("reference", nargs="?", default=DEFAULT_REFERENCE,
+                        help="Text file with the reference transcript of the fixture (default: fixtures/jfk.txt)")
+    parser.add_argument("--models", default="tiny,base,small",
+                        help="Comma-separated Whisper model sizes to compare")
+    parser.add_argument("--precisions", default="fp32,int8,bf16",
+                        help="Comma-separated precisions to compare (auto, fp32, int8, bf16)")
+    parser.add_argument("--output", help="Also write the results to this JSON file")
+    args = parser.parse_args()
+
+    with open(args.reference) as f:
+        reference = f.read()
+    duration = len(load_audio_array(args.audio)) / SAMPLE_RATE
+
+    models = [name.strip() for name in args.models.split(",") if name.strip()]
+    precisions = [precision.strip() for precision in args.precisions.split(",") if precision.strip()]
+
+    results = []
+    for model_name in models:
+        tested = set()
+        for precision in precisions:
+            # On CUDA several settings resolve to fp16; run each effective one once
+            effective = resolve_precision(precision)
+            if effective in tested:
+                continue
+            tested.add(effective)
+            print(f"\nBenchmarking Whisper {model_name} ({effective}) on {duration:.1f}s of audio...")
+            results.append(run_setting(args.audio, duration, reference, model_name, precision))
+
+    print("\n===== WHISPER PRECISION BENCHMARK =====")
+    print(f"{'model':>10} | {'precision':>9} | {'load s':>7} | {'seconds':>8} | {'realtime':>8} | {'WER':>6}")
+    for result in results:
+        print(f"{result['model']:>10} | {result['precision']:>9} | {result['load_seconds']:>7.1f} | "
+              f"{result['seconds']:>8.2f} | {result['realtime_factor']:>7.2f}x | {result['wer']:>6.1%}")
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"audio": args.audio, "duration": duration, "results": results}, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Benchmark Whisper transcription throughput: the per-segment loop against
+batched multi-segment decoding.
+
+Usage:
+    python benchmark_transcription.py audio.wav [--segments segments.json]
+                                      [--segment-seconds 2.5] [--batch-sizes 1,8,16]
+
+Without --segments, the audio is cut into back-to-back segments of
+--segment-seconds, which mimics the short speaker turns diarization produces.
+"""
+
+import argparse
+import asyncio
+import json
+import time
+from dotenv import load_dotenv
+
+from modules.model_registry import release_model
+from modules.transcription import get_whisper_model, load_audio_array, transcribe_segments, SAMPLE_RATE
+
+# Load environment variables
+load_dotenv()
+
+def make_segments(duration: float, segment_seconds: float) -> list:
+    """Cut `duration` seconds into back-to-back segments"""
+    segments = []
+    start = 0.0
+    while start < duration:
+        end = min(duration, start + segment_seconds)
+        segments.append({"start": start, "end": end, "speaker": "Speaker 00"})
+        start = end
+    return segments
+
+async def run_benchmark(audio_path: str, segments: list, batch_sizes: list):
+    results = []
+    for batch_size in batch_sizes:
+        start_time = time.time()
+        transcribed = await transcribe_segments(audio_path, segments, batch_size=batch_size)
+        elapsed = time.time() - start_time
+        results.append({
+            "batch_size": batch_size,
+            "seconds": elapsed,
+            "segments_per_second": len(segments) / elapsed,
+            "words": sum(len(segment["text"].split()) for segment in transcribed),
+        })
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark per-segment vs batched Whisper transcription")
+    parser.add_argument("audio", help="Audio file to transcribe")
+    parser.add_argument("--segments", help="JSON file with a list of {start, end, speaker} segments")
+    parser.add_argument("--segment-seconds", type=float, default=2.5,
+                        help="Length of synthetic segments when --segments is not given")
+    parser.add_argument("--batch-sizes", default="1,8,16",
+                        help="Comma-separated batch sizes to compare (1 = per-segment loop)")
+    args = parser.parse_args()
+
+    audio = load_audio_array(args.audio)
+    duration = len(audio) / SAMPLE_RATE
+
+    if args.segments:
+        with open(args.segments) as f:
+            segments = json.load(f)
+    else:
+        segments = make_segments(duration, args.segment_seconds)
+
+    batch_sizes = [int(size) for size in args.batch_sizes.split(",")]
+
+    # Load the model up front so the first run doesn't pay the load cost
+    model, model_key = get_whisper_model()
+
+    try:
+        print(f"\nBenchmarking {len(segments)} segments from {duration:.1f}s of audio")
+        results = asyncio.run(run_benchmark(args.audio, segments, batch_sizes))
+    finally:
+        release_model(*model_key)
+
+    baseline = results[0]["segments_per_second"]
+    print("\n===== TRANSCRIPTION BENCHMARK =====")
+    print(f"{'batch size':>10} | {'seconds':>8} | {'segments/s':>10} | {'speedup':>7} | {'words':>6}")
+    for result in results:
+        print(f"{result['batch_size']:>10} | {result['seconds']:>8.2f} | {result['segments_per_second']:>10.2f} | "
+              f"{result['segments_per_second'] / baseline:>6.2f}x | {result['words']:>6}")
+
+if __name__ == "__main__":
+    main()
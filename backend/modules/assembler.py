@@ -1,6 +1,7 @@
 import os
 import asyncio
 from datetime import timedelta
+from modules.metrics import StageTimer
 
 def format_timestamp(seconds: float) -> str:
     """Format seconds to [HH:MM:SS.mmm] timestamp"""
@@ -9,8 +10,104 @@ def format_timestamp(seconds: float) -> str:
     minutes, seconds = divmod(remainder, 60)
     return f"{hours:02d}:{minutes:02d}:{seconds:02d}.{int(td.microseconds / 1000):03d}"
 
-async def assemble_transcript(segments: list, video_info: dict):
-    """Assemble the final transcript with metadata"""
+def assign_speakers_to_words(words: list, segments: list) -> list:
+    """Assign each word to the diarization speaker it overlaps the most.
+
+    Words that fall outside every diarization segment go to the nearest one.
+    Returns new word dicts with a "speaker" key; `segments` must be sorted by start.
+    """
+    if not segments:
+        # The label every diarization engine gives its first speaker (speaker_label(0))
+        return [dict(word, speaker="Speaker 00") for word in words]
+
+    assigned = []
+    first = 0  # First segment that can still overlap the current word
+    for word in sorted(words, key=lambda w: w["start"]):
+        # Segments ending before this word can't overlap it or any later word
+        while first < len(segments) - 1 and segments[first]["end"] <= word["start"]:
+            first += 1
+
+        best_speaker = None
+        best_overlap = 0.0
+        nearest_speaker = segments[first]["speaker"]
+        nearest_distance = float("inf")
+        j = max(0, first - 1)
+        while j < len(segments) and segments[j]["start"] < word["end"] + 1.0:
+            segment = segments[j]
+            overlap = min(word["end"], segment["end"]) - max(word["start"], segment["start"])
+            if overlap > best_overlap:
+                best_overlap = overlap
+                best_speaker = segment["speaker"]
+            distance = max(segment["start"] - word["end"], word["start"] - segment["end"], 0.0)
+            if distance < nearest_distance:
+                nearest_distance = distance
+                nearest_speaker = segment["speaker"]
+            j += 1
+
+        assigned.append(dict(word, speaker=best_speaker or nearest_speaker))
+
+    return assigned
+
+def group_words_into_turns(words: list) -> list:
+    """Group consecutive words spoken by the same speaker into transcript segments"""
+    turns = []
+    for word in words:
+        if turns and turns[-1]["speaker"] == word["speaker"]:
+            turn = turns[-1]
+            turn["end"] = max(turn["end"], word["end"])
+            turn["words"].append(word)
+        else:
+            turns.append({
+                "start": word["start"],
+                "end": word["end"],
+                "speaker": word["speaker"],
+                "words": [word],
+            })
+
+    for turn in turns:
+        # Whisper words carry their own leading spaces
+        turn["text"] = "".join(word["word"] for word in turn["words"]).strip()
+
+    return turns
+
+def reassign_speakers(segments: list, diarization_segments: list) -> list:
+    """Give transcript segments the speakers of a new diarization.
+
+    Segments with word timestamps are split and regrouped at the word level;
+    otherwise each segment as a whole goes to the speaker it overlaps the most.
+    """
+    diarization_segments = sorted(diarization_segments, key=lambda x: x["start"])
+    if segments and all(segment.get("words") for segment in segments):
+        words = [word for segment in segments for word in segment["words"]]
+        return group_words_into_turns(assign_speakers_to_words(words, diarization_segments))
+    return assign_speakers_to_words(segments, diarization_segments)
+
+def format_plaintext(metadata: dict, segments: list) -> str:
+    """Plaintext version of a transcript"""
+    plaintext = f"Title: {metadata['title']}\n"
+    plaintext += f"URL: {metadata['url']}\n"
+    plaintext += f"Duration: {metadata['duration']}\n"
+    plaintext += f"Speakers Detected: {metadata['num_speakers']}\n\n"
+    
+    for segment in segments:
+        start_str = format_timestamp(segment["start"])
+        end_str = format_timestamp(segment["end"])
+        plaintext += f"[{start_str} --> {end_str}] {segment['speaker']}: {segment['text']}\n\n"
+    
+    return plaintext
+
+async def assemble_transcript(segments: list, video_info: dict, words: list = None):
+    """Assemble the final transcript with metadata.
+
+    `segments` are transcribed speaker turns. When `words` from a single-pass
+    transcription are given instead, `segments` are the diarization turns: each
+    word is assigned a speaker from them and consecutive words are grouped into
+    the transcript segments.
+    """
+    timer = StageTimer("assemble", video_info.get("duration") or None)
+    if words is not None:
+        segments = group_words_into_turns(assign_speakers_to_words(words, segments))
+    
     # Format the duration as HH:MM:SS
     duration_str = format_timestamp(video_info.get("duration", 0))
     
@@ -34,16 +131,7 @@ async def assemble_transcript(segments: list, video_info: dict):
     }
     
     # For convenience, generate a plaintext version
-    plaintext = f"Title: {metadata['title']}\n"
-    plaintext += f"URL: {metadata['url']}\n"
-    plaintext += f"Duration: {metadata['duration']}\n"
-    plaintext += f"Speakers Detected: {metadata['num_speakers']}\n\n"
-    
-    for segment in segments:
-        start_str = format_timestamp(segment["start"])
-        end_str = format_timestamp(segment["end"])
-        plaintext += f"[{start_str} --> {end_str}] {segment['speaker']}: {segment['text']}\n\n"
-    
-    transcript["plaintext"] = plaintext
+    transcript["plaintext"] = format_plaintext(metadata, segments)
     
+    timer.finish()
     return transcript
@@ -0,0 +1,109 @@
+import os
+import struct
+import subprocess
+import numpy as np
+from modules.metrics import StageTimer
+
+# Canonical audio format shared by diarization and transcription: raw float32
+# samples, 16 kHz mono, behind a small fixed-size header so the file can be
+# opened with numpy.memmap instead of being decoded again by each stage.
+SAMPLE_RATE = 16000
+PCM_EXTENSION = ".pcm"
+
+_MAGIC = b"TSPCM001"
+_HEADER = struct.Struct("<8sIIQ")  # magic, sample rate, channels, number of samples
+HEADER_SIZE = 64  # header padded so the samples start on an aligned offset
+
+_READ_CHUNK = 1 << 20
+
+
+def is_pcm(path: str) -> bool:
+    """Whether `path` is in the canonical PCM format"""
+    try:
+        with open(path, "rb") as f:
+            return f.read(len(_MAGIC)) == _MAGIC
+    except OSError:
+        return False
+
+
+def _write_header(f, num_samples: int):
+    f.seek(0)
+    f.write(_HEADER.pack(_MAGIC, SAMPLE_RATE, 1, num_samples).ljust(HEADER_SIZE, b"\0"))
+
+
+def write_pcm_stream(stream, path: str) -> int:
+    """Copy raw little-endian float32 mono samples from a file object to a PCM file.
+
+    Returns the number of samples written.
+    """
+    with open(path, "wb") as f:
+        _write_header(f, 0)
+        num_bytes = 0
+        while True:
+            chunk = stream.read(_READ_CHUNK)
+            if not chunk:
+                break
+            f.write(chunk)
+            num_bytes += len(chunk)
+        num_samples = num_bytes // 4
+        # Drop a trailing partial sample, if any, then fill in the real length
+        f.truncate(HEADER_SIZE + num_samples * 4)
+        _write_header(f, num_samples)
+    return num_samples
+
+
+def decode_to_pcm(input_args: list, path: str) -> int:
+    """Decode with one ffmpeg process straight into a PCM file.
+
+    `input_args` are the ffmpeg arguments that select the input, e.g.
+    ["-i", "audio.wav"]. Returns the number of samples written.
+    """
+    command = ["ffmpeg", "-nostdin", "-loglevel", "error", *input_args,
+               "-vn", "-ac", "1", "-ar", str(SAMPLE_RATE), "-f", "f32le", "-"]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    try:
+        num_samples = write_pcm_stream(process.stdout, path)
+    finally:
+        process.stdout.close()
+        stderr = process.stderr.read()
+        process.stderr.close()
+        process.wait()
+    if process.returncode != 0:
+        raise RuntimeError(f"ffmpeg failed: {stderr.decode(errors='replace').strip()[-500:]}")
+    return num_samples
+
+
+def ensure_pcm(path: str) -> str:
+    """Return a PCM version of an audio file, converting (and replacing) it if needed"""
+    if is_pcm(path):
+        return path
+    pcm_path = os.path.splitext(path)[0] + PCM_EXTENSION
+    # Its own stage: on the pydub fallback path the audio was already timed as "convert"
+    with StageTimer("pcm") as timer:
+        timer.audio_seconds = decode_to_pcm(["-i", path], pcm_path) / SAMPLE_RATE
+    os.remove(path)
+    return pcm_path
+
+
+def open_pcm(path: str) -> np.memmap:
+    """Memory-map the samples of a PCM file as a 1-D float32 array.
+
+    The map is copy-on-write: stages can hand it to torch without copying,
+    and concurrent stages share the same page cache.
+    """
+    with open(path, "rb") as f:
+        magic, sample_rate, channels, num_samples = _HEADER.unpack(f.read(_HEADER.size))
+    if magic != _MAGIC:
+        raise ValueError(f"{path} is not a PCM audio file")
+    if sample_rate != SAMPLE_RATE or channels != 1:
+        raise ValueError(f"{path} is {sample_rate} Hz with {channels} channels, expected {SAMPLE_RATE} Hz mono")
+    if num_samples == 0:
+        return np.zeros(0, dtype=np.float32)
+    return np.memmap(path, dtype="<f4", mode="c", offset=HEADER_SIZE, shape=(num_samples,))
+
+
+def pcm_duration(path: str) -> float:
+    """Duration of a PCM file in seconds, from its header"""
+    with open(path, "rb") as f:
+        _, sample_rate, _, num_samples = _HEADER.unpack(f.read(_HEADER.size))
+    return num_samples / sample_rate
@@ -0,0 +1,131 @@
+import numpy as np
+from typing import Optional
+
+# Above this many embeddings, exact agglomerative clustering (quadratic in memory)
+# runs on a k-means summary of the embeddings instead of on the embeddings themselves
+MAX_EXACT_CLUSTERING = 4000
+
+# k-means refinement passes when summarizing, and rows compared against the centers at once
+SUMMARY_ITERATIONS = 5
+BLOCK_ROWS = 4096
+
+
+def normalize_rows(embeddings: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (rows of zeros stay zero)"""
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings / np.maximum(norms, 1e-12)
+
+
+def nearest_centers(units: np.ndarray, centers: np.ndarray, block_rows: int = BLOCK_ROWS) -> np.ndarray:
+    """Index of the most cosine-similar center for every row, a block of rows at a time"""
+    assignment = np.empty(len(units), dtype=np.int64)
+    for start in range(0, len(units), block_rows):
+        assignment[start:start + block_rows] = np.argmax(units[start:start + block_rows] @ centers.T, axis=1)
+    return assignment
+
+
+def summarize(units: np.ndarray, num_groups: int, iterations: int = SUMMARY_ITERATIONS):
+    """Group unit vectors with spherical k-means.
+
+    Centers start evenly spaced through the rows, so the result is deterministic.
+    Returns (means, sizes, assignment): the unnormalized mean of each non-empty
+    group, its size, and each row's group index.
+    """
+    num_groups = min(num_groups, len(units))
+    centers = units[np.linspace(0, len(units) - 1, num_groups).astype(int)].copy()
+    for _ in range(iterations + 1):
+        assignment = nearest_centers(units, centers)
+        sums = np.zeros_like(centers)
+        np.add.at(sums, assignment, units)
+        sizes = np.bincount(assignment, minlength=len(centers))
+        # Empty groups keep their center for the next pass
+        filled = sizes > 0
+        centers[filled] = normalize_rows(sums[filled])
+
+    # Drop empty groups and renumber the rest
+    index = np.cumsum(filled) - 1
+    means = (sums[filled] / sizes[filled, None]).astype(np.float32)
+    return means, sizes[filled].astype(np.float64), index[assignment]
+
+
+def average_linkage(means: np.ndarray, sizes: np.ndarray, threshold: float,
+                    min_clusters: int = 1, max_clusters: Optional[int] = None) -> np.ndarray:
+    """Average-linkage agglomerative clustering of groups of unit vectors.
+
+    `means` are the groups' mean vectors, so the dot product of two rows is the
+    average cosine similarity between their members; single embeddings are
+    groups of size one. Returns a cluster index (a group row) per group.
+    """
+    n = len(means)
+    max_clusters = max_clusters or n
+    similarity = means @ means.T
+    np.fill_diagonal(similarity, -np.inf)
+    sizes = sizes.copy()
+    labels = np.arange(n)
+    # Most similar other cluster of every cluster, kept up to date as clusters merge
+    best = np.argmax(similarity, axis=1)
+    best_similarity = similarity[np.arange(n), best]
+    num_clusters = n
+
+    while num_clusters > min_clusters:
+        i = int(np.argmax(best_similarity))
+        j = int(best[i])
+        if 1.0 - best_similarity[i] > threshold and num_clusters <= max_clusters:
+            break
+
+        # Merge j into i; average linkage is the size-weighted mean of both rows
+        merged = (similarity[i] * sizes[i] + similarity[j] * sizes[j]) / (sizes[i] + sizes[j])
+        similarity[i] = merged
+        similarity[:, i] = merged
+        similarity[i, i] = -np.inf
+        similarity[j] = -np.inf
+        similarity[:, j] = -np.inf
+        sizes[i] += sizes[j]
+        labels[labels == j] = i
+        best_similarity[j] = -np.inf
+        num_clusters -= 1
+
+        # Only rows that pointed at i or j, and i itself, can have a new best
+        stale = np.flatnonzero((best == i) | (best == j))
+        stale = np.union1d(stale[best_similarity[stale] > -np.inf], [i])
+        best[stale] = np.argmax(similarity[stale], axis=1)
+        best_similarity[stale] = similarity[stale, best[stale]]
+        # Rows whose similarity to the merged cluster went up may now prefer it
+        improved = merged > best_similarity
+        best[improved] = i
+        best_similarity[improved] = merged[improved]
+
+    return labels
+
+
+def agglomerative_cluster(embeddings: np.ndarray, threshold: float,
+                          min_clusters: Optional[int] = None, max_clusters: Optional[int] = None,
+                          max_exact: int = MAX_EXACT_CLUSTERING) -> np.ndarray:
+    """Average-linkage agglomerative clustering on cosine distance.
+
+    Clusters are merged, closest first, while their average cosine distance is
+    below `threshold`. Merging continues past the threshold while there are more
+    than `max_clusters`, and stops early once only `min_clusters` are left.
+
+    Up to `max_exact` embeddings are clustered exactly. Larger inputs are first
+    summarized into `max_exact` k-means groups, which are then clustered with
+    their sizes as weights; time and memory then grow linearly with the number
+    of embeddings. Returns a cluster index per row, numbered 0.. in order of
+    first appearance.
+    """
+    n = len(embeddings)
+    if n == 0:
+        return np.zeros(0, dtype=int)
+    min_clusters = max(1, min_clusters or 1)
+
+    units = normalize_rows(embeddings)
+    if n > max_exact:
+        means, sizes, assignment = summarize(units, max_exact)
+        labels = average_linkage(means, sizes, threshold, min_clusters, max_clusters)[assignment]
+    else:
+        labels = average_linkage(units, np.ones(n), threshold, min_clusters, max_clusters)
+
+    _, first_seen, inverse = np.unique(labels, return_index=True, return_inverse=True)
+    order = np.argsort(np.argsort(first_seen))
+    return order[inverse]
@@ -3,105 +3,478 @@ import asyncio
 import torch
 import numpy as np
 import time
+import threading
+from typing import Optional
+from concurrent.futures import ThreadPoolExecutor
 from pyannote.audio import Pipeline
+from pyannote.audio.utils.signal import binarize
+from pyannote.core import SlidingWindowFeature
 from dotenv import load_dotenv
 from utils.audio import start_gpu_monitoring
+from modules.model_registry import acquire_model, release_model
+from modules import result_cache
+from modules.metrics import StageTimer
+from modules.audio_store import is_pcm, open_pcm, pcm_duration, SAMPLE_RATE
+from modules.speaker_stitching import SpeakerStitcher, plan_chunks, clip_segments, overlap_votes
+from modules.clustering import agglomerative_cluster, normalize_rows
+from modules.diarization_engines import (
+    DiarizationEngine, LightweightEngine, FakeEngine, speaker_label, EMBEDDING_BATCH_SIZE
+)
 
 # Load environment variables
 load_dotenv()
 
-async def perform_diarization(audio_path: str, sensitivity: float = 0.5):
-    """Perform speaker diarization on an audio file"""
-    # Get HuggingFace token from environment
+DIARIZATION_MODEL = "pyannote/speaker-diarization-3.1"
+
+# Diarization engine used when a request doesn't pick one: pyannote, lightweight or fake
+DIARIZATION_ENGINE = os.getenv("DIARIZATION_ENGINE", "pyannote").lower()
+
+# Comma-separated devices to spread diarization jobs over, e.g. "cuda:0,cuda:1".
+# Defaults to the current CUDA device, or the CPU when CUDA is unavailable.
+DIARIZATION_DEVICES = os.getenv("DIARIZATION_DEVICES", "")
+
+# Files longer than this (seconds) are diarized in overlapping chunks so memory stays
+# bounded; speakers are matched across chunks by embedding similarity. 0 disables chunking.
+DIARIZATION_CHUNK_SECONDS = float(os.getenv("DIARIZATION_CHUNK_SECONDS", "1800"))
+DIARIZATION_CHUNK_OVERLAP = float(os.getenv("DIARIZATION_CHUNK_OVERLAP", "30"))
+
+# Minimum cosine similarity for a chunk's speaker to be matched to a known speaker
+SPEAKER_STITCH_THRESHOLD = float(os.getenv("SPEAKER_STITCH_THRESHOLD", "0.5"))
+
+# Clustering threshold the pyannote 3.1 pipeline ships with, a euclidean distance
+# between unit-length embeddings (the cosine distance is half its square)
+PYANNOTE_CLUSTERING_THRESHOLD = 0.7045654963945799
+
+# Per-engine calibration of the clustering threshold, which every engine takes as a
+# cosine distance between speaker embeddings: (threshold at sensitivity 0.5, how far
+# sensitivity 1.0 lowers it for more speakers and 0.0 raises it for fewer).
+# pyannote keeps its shipped threshold. The lightweight engine embeds 1.5s windows,
+# which scatter more than pyannote's per-chunk embeddings, and keeps the looser
+# threshold it was tuned with. Engines without an entry use pyannote's.
+CLUSTERING_CALIBRATION = {
+    "pyannote": (PYANNOTE_CLUSTERING_THRESHOLD ** 2 / 2, 0.21),
+    "lightweight": (0.7, 0.3),
+}
+
+# Clusters of fewer (chunk, local speaker) embeddings are folded into larger ones,
+# as the pyannote 3.1 pipeline does
+MIN_CLUSTER_SIZE = 12
+
+# Dedicated workers for pyannote so diarization can overlap with transcription
+diarization_executor = ThreadPoolExecutor(thread_name_prefix="diarization")
+
+_device_lock = threading.Lock()
+_device_index = 0
+
+def get_diarization_devices() -> list:
+    """List the devices in the diarization device pool"""
+    if DIARIZATION_DEVICES.strip():
+        return [device.strip() for device in DIARIZATION_DEVICES.split(",") if device.strip()]
+    if torch.cuda.is_available():
+        return [f"cuda:{torch.cuda.current_device()}"]
+    return ["cpu"]
+
+def next_diarization_device() -> str:
+    """Pick the next device from the pool (round robin)"""
+    global _device_index
+    devices = get_diarization_devices()
+    with _device_lock:
+        device = devices[_device_index % len(devices)]
+        _device_index += 1
+    return device
+
+def get_diarization_pipeline(device: str = None):
+    """Get the shared pyannote pipeline for a device from the model registry.
+
+    Returns (pipeline, registry_key); pass the key to release_model() when done.
+    """
     hf_token = os.getenv("HUGGINGFACE_TOKEN")
     if not hf_token:
         raise ValueError("HUGGINGFACE_TOKEN not found. Required for pyannote.audio")
-    
-    # Run diarization in a thread pool to avoid blocking
-    loop = asyncio.get_event_loop()
-    
-    # Start GPU monitoring if CUDA is available (but less frequently to reduce noise)
-    if torch.cuda.is_available():
-        stop_monitoring = start_gpu_monitoring(interval=30.0)  # Check every 30 seconds instead of 5
-    else:
-        stop_monitoring = lambda: None
-    
-    def run_diarization():
-        # Initialize the diarization pipeline with latest model
-        print("Loading pyannote/speaker-diarization-3.1 model...")
-        
-        # Check CUDA availability and device properties for diarization
-        device = "cpu"
-        if torch.cuda.is_available():
-            cuda_device = torch.cuda.current_device()
-            device = f"cuda:{cuda_device}"
-            print(f"🚀 Using GPU: {torch.cuda.get_device_name(cuda_device)}")
+
+    if device is None:
+        device = next_diarization_device()
+
+    def load():
+        if device.startswith("cuda"):
+            print(f"🚀 Using GPU: {torch.cuda.get_device_name(torch.device(device))}")
         else:
             print("⚠️  CUDA not available for diarization, using CPU (will be much slower)")
-        
+
         # Filter common PyTorch warnings that don't affect functionality
         import warnings
         warnings.filterwarnings("ignore", message="std\\(\\): degrees of freedom")
         warnings.filterwarnings("ignore", message="Reduction of non-zero size tensor to zero size")
         warnings.filterwarnings("ignore", category=UserWarning, module="pyannote.audio.utils.reproducibility")
-            
+
         pipeline = Pipeline.from_pretrained(
-            "pyannote/speaker-diarization-3.1",
+            DIARIZATION_MODEL,
             use_auth_token=hf_token
         )
-        
-        # Configure clustering parameters based on sensitivity
-        # Higher sensitivity = more speakers detected
-        # Note: Direct clustering configuration is deprecated in newer versions
-        # Sensitivity parameter will be handled through pipeline instantiation parameters
-        
+
+        # Embed that many (chunk, local speaker) windows per forward pass
+        pipeline.embedding_batch_size = EMBEDDING_BATCH_SIZE
+
         # Move model to specified device
         pipeline = pipeline.to(torch.device(device))
         print(f"✓ Diarization model loaded on {device}")
-            
-        # Apply the pipeline to the audio file
-        print(f"Starting diarization of {audio_path}...")
-        print("⏳ This may take several minutes depending on audio length...")
-        print("   (pyannote.audio doesn't provide progress updates during processing)")
-
-        start_time = torch.cuda.Event(enable_timing=True) if torch.cuda.is_available() else None
-        end_time = torch.cuda.Event(enable_timing=True) if torch.cuda.is_available() else None
-
-        if start_time:
-            start_time.record()
-
-        diarization = pipeline(audio_path)
-
-        print("✓ Diarization processing completed!")
-        
-        if end_time:
-            end_time.record()
-            torch.cuda.synchronize()
-            elapsed_time = start_time.elapsed_time(end_time) / 1000  # Convert ms to seconds
-            print(f"Diarization completed in {elapsed_time:.2f} seconds on {device}")
-        else:
-            print("Diarization completed successfully on CPU")
-        
-        # Convert the results to a list of segments
-        segments = []
-        for turn, _, speaker in diarization.itertracks(yield_label=True):
-            segments.append({
-                "start": turn.start,
-                "end": turn.end,
-                "speaker": f"Speaker {speaker.split('_')[-1]}"  # Format as "Speaker 1", "Speaker 2", etc.
-            })
-        
-        # Sort segments by start time
-        segments.sort(key=lambda x: x["start"])
-        
-        return segments
+        return pipeline
+
+    key = ("pyannote", DIARIZATION_MODEL, device, "fp32")
+    return acquire_model(*key, loader=load), key
+
+def load_pipeline_input(audio_path: str):
+    """Input for a pyannote pipeline: PCM files from the audio store are passed
+    as an in-memory waveform backed by the memory map, anything else by path"""
+    if not is_pcm(audio_path):
+        return audio_path
+    waveform = torch.from_numpy(open_pcm(audio_path)).unsqueeze(0)  # (channel, time)
+    return {"waveform": waveform, "sample_rate": SAMPLE_RATE}
+
+def clustering_threshold(sensitivity: float, engine: Optional[str] = None) -> float:
+    """Map a diarization sensitivity in [0, 1] to `engine`'s cosine distance threshold"""
+    default, spread = CLUSTERING_CALIBRATION.get(
+        (engine or DIARIZATION_ENGINE).lower(), CLUSTERING_CALIBRATION["pyannote"]
+    )
+    sensitivity = min(max(sensitivity, 0.0), 1.0)
+    return default + (0.5 - sensitivity) * 2 * spread
+
+def features_cache_key(video_id: str, engine: Optional[str] = None) -> str:
+    """Result cache key for the speaker features a diarization engine extracted from a video's audio"""
+    engine = get_diarization_engine(engine or DIARIZATION_ENGINE)
+    return result_cache.make_key(
+        "embeddings",
+        video_id=video_id,
+        engine=engine.name,
+        model=engine.model,
+        format=result_cache.AUDIO_FORMAT,
+        chunk_seconds=DIARIZATION_CHUNK_SECONDS,
+        chunk_overlap=DIARIZATION_CHUNK_OVERLAP
+    )
+
+class _FeaturesExtracted(Exception):
+    """Stops a pipeline run once segmentation and embeddings are available"""
+
+def extract_features(pipeline, file) -> Optional[dict]:
+    """Run the expensive part of the pipeline: segmentation, speaker counting and
+    embedding extraction.
+
+    Returns the pipeline's intermediate outputs, which cluster_features() turns
+    into an annotation for any clustering setting, or None if there is no speech.
+    """
+    features = {}
+
+    def hook(step_name, step_artifact, file=None, total=None, completed=None):
+        # Progress updates within a step carry `completed`; the step's result doesn't
+        if completed is not None or step_artifact is None:
+            return
+        if step_name in ("segmentation", "speaker_counting", "embeddings"):
+            features[step_name] = step_artifact
+        if step_name == "embeddings":
+            # Everything after this point is clustering, which cluster_features() does
+            raise _FeaturesExtracted()
+
+    try:
+        pipeline(file, hook=hook)
+    except _FeaturesExtracted:
+        pass
+    # The pipeline returns before extracting embeddings when nobody speaks
+    return features if "embeddings" in features else None
+
+def cluster_embeddings(embeddings: np.ndarray, binarized: SlidingWindowFeature, threshold: float,
+                       min_speakers: Optional[int] = None, max_speakers: Optional[int] = None,
+                       min_cluster_size: int = MIN_CLUSTER_SIZE):
+    """Cluster the pipeline's (chunk, local speaker) embeddings with clustering.py.
+
+    Takes the place of the pipeline's own clustering step: the embeddings of
+    active local speakers are clustered with agglomerative_cluster at the
+    cosine distance `threshold`, clusters
+    smaller than `min_cluster_size` are folded into the most similar larger
+    one, and every (chunk, local speaker) is then assigned to its most similar
+    centroid. Returns (hard_clusters, centroids) like pyannote's clustering.
+    """
+    num_chunks, num_local_speakers, dimension = embeddings.shape
+    # Local speakers that are active in their chunk and whose embedding was extracted
+    active = np.sum(binarized.data, axis=1) > 0
+    valid = ~np.any(np.isnan(embeddings), axis=2)
+    chunk_index, speaker_index = np.nonzero(active & valid)
+    train = embeddings[chunk_index, speaker_index]
+    if len(train) < 2:
+        centroids = train[:1] if len(train) else np.zeros((1, dimension), dtype=np.float32)
+        return np.zeros((num_chunks, num_local_speakers), dtype=int), centroids
+
+    labels = agglomerative_cluster(train, threshold, min_speakers, max_speakers)
+    sizes = np.bincount(labels)
+    min_cluster_size = min(min_cluster_size, max(1, round(0.1 * len(train))))
+    large = np.flatnonzero(sizes >= min_cluster_size)
+    if len(large) < (min_speakers or 1):
+        # Keep the biggest clusters when too few are large enough for the minimum speaker count
+        large = np.sort(np.argsort(-sizes, kind="stable")[:max(min_speakers or 1, len(large))])
+    centroids = np.stack([train[labels == k].mean(axis=0) for k in large])
+
+    # Every (chunk, local speaker), including the small clusters' members, goes to the closest centroid
+    similarity = normalize_rows(np.nan_to_num(embeddings.reshape(-1, dimension))) @ normalize_rows(centroids).T
+    hard_clusters = np.argmax(similarity, axis=1).reshape(num_chunks, num_local_speakers)
+    return hard_clusters, centroids
+
+def cluster_features(pipeline, features: dict, threshold: float,
+                     min_speakers: Optional[int] = None, max_speakers: Optional[int] = None):
+    """Cluster extracted speaker features into a pyannote annotation.
+
+    Mirrors the end of the pyannote pipeline, but clusters with
+    cluster_embeddings() using our own threshold and speaker count hints.
+    Returns (annotation, centroids), where the annotation's labels are integer
+    cluster indices into the centroid rows.
+    """
+    segmentations = features["segmentation"]
+    if pipeline._segmentation.model.specifications.powerset:
+        binarized = segmentations
+    else:
+        binarized = binarize(segmentations, onset=pipeline.segmentation.threshold, initial_state=False)
+
+    start_time = time.time()
+    hard_clusters, centroids = cluster_embeddings(
+        features["embeddings"], binarized, threshold, min_speakers, max_speakers
+    )
+    print(f"Clustered {features['embeddings'].shape[0]} segmentation chunks ({len(centroids)} speakers) "
+          f"in {time.time() - start_time:.2f}s")
+
+    # Cap the number of simultaneous speakers at the requested maximum
+    count = features["speaker_counting"]
+    if max_speakers:
+        count = SlidingWindowFeature(np.minimum(count.data, max_speakers).astype(np.int8), count.sliding_window)
+
+    # Speakers a segmentation chunk doesn't contain are left out of the reconstruction
+    inactive_speakers = np.sum(binarized.data, axis=1) == 0
+    hard_clusters[inactive_speakers] = -2
+    discrete = pipeline.reconstruct(segmentations, hard_clusters, count)
+    annotation = pipeline.to_annotation(discrete, min_duration_on=0.0, min_duration_off=pipeline.segmentation.min_duration_off)
+    return annotation, centroids
+
+def annotation_to_segments(diarization, offset: float = 0.0) -> list:
+    """Turn a pyannote annotation into segments sorted by start time"""
+    segments = []
+    for turn, _, speaker in diarization.itertracks(yield_label=True):
+        segments.append({"start": turn.start + offset, "end": turn.end + offset, "speaker": speaker})
+    segments.sort(key=lambda x: x["start"])
+    return segments
+
+def plan_diarization(audio_path: str) -> list:
+    """Chunks (see plan_chunks) a file is diarized in.
+
+    Long PCM files are split into overlapping windows of DIARIZATION_CHUNK_SECONDS;
+    anything else is a single chunk covering the whole file.
+    """
+    if not is_pcm(audio_path):
+        return [(0.0, float("inf"), 0.0, float("inf"))]
+    duration = pcm_duration(audio_path)
+    if DIARIZATION_CHUNK_SECONDS <= 0 or duration <= DIARIZATION_CHUNK_SECONDS:
+        return [(0.0, duration, 0.0, duration)]
+    return plan_chunks(duration, DIARIZATION_CHUNK_SECONDS, DIARIZATION_CHUNK_OVERLAP)
+
+def diarize_features(pipeline, audio_path: Optional[str], chunk_features: Optional[list], threshold: float,
+                     min_speakers: Optional[int] = None, max_speakers: Optional[int] = None,
+                     chunk_callback=None):
+    """Diarize a file chunk by chunk, extracting features unless they are given.
+
+    Only one chunk's audio is held in memory at a time. Each chunk's speakers are
+    mapped onto global speakers with a SpeakerStitcher, and chunk_callback(segments,
+    chunks_done, total_chunks), if given, receives each chunk's final segments as
+    soon as it is done.
+
+    Returns (segments, chunk_features); pass chunk_features back in to re-cluster
+    the same audio without running the neural models again.
+    """
+    if chunk_features is None:
+        chunks = [dict(zip(("start", "end", "keep_start", "keep_end"), chunk)) for chunk in plan_diarization(audio_path)]
+    else:
+        chunks = chunk_features
+    if len(chunks) > 1:
+        print(f"Diarizing {chunks[-1]['end']:.0f}s of audio in {len(chunks)} chunks of up to "
+              f"{DIARIZATION_CHUNK_SECONDS:.0f}s ({DIARIZATION_CHUNK_OVERLAP:.0f}s overlap)")
+
+    stitcher = SpeakerStitcher(SPEAKER_STITCH_THRESHOLD)
+    audio = open_pcm(audio_path) if chunk_features is None and len(chunks) > 1 else None
+    segments = []
+    extracted = []
+    previous = []  # previous chunk's segments (global speakers), for the overlap fallback
+    previous_end = 0.0
+    for i, chunk in enumerate(chunks):
+        chunk_start_time = time.time()
+        start, end = chunk["start"], chunk["end"]
+        if chunk_features is None:
+            if audio is None:
+                file = load_pipeline_input(audio_path)
+            else:
+                waveform = torch.from_numpy(np.array(audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)])).unsqueeze(0)
+                file = {"waveform": waveform, "sample_rate": SAMPLE_RATE}
+            chunk = dict(chunk, features=extract_features(pipeline, file))
+            del file
+            extracted.append(chunk)
+
+        local = []
+        labels = []
+        embeddings = np.zeros((0, 0))
+        durations = {}
+        if chunk["features"] is not None:
+            diarization, centroids = cluster_features(pipeline, chunk["features"], threshold, min_speakers, max_speakers)
+            local = annotation_to_segments(diarization, offset=start)
+            labels = diarization.labels()
+            durations = {label: diarization.label_duration(label) for label in labels}
+            # Speakers the clustering produced no centroid for get a NaN embedding
+            embeddings = np.full((len(labels), centroids.shape[1]), np.nan)
+            for row, label in enumerate(labels):
+                if label < len(centroids):
+                    embeddings[row] = centroids[label]
+
+        votes = overlap_votes(local, previous, start, previous_end) if i > 0 else {}
+        mapping = stitcher.assign(labels, embeddings, durations, votes)
+        chunk_segments = [dict(segment, speaker=mapping[segment["speaker"]]) for segment in local]
+        kept = [
+            dict(segment, speaker=speaker_label(segment["speaker"]))
+            for segment in clip_segments(chunk_segments, chunk["keep_start"], chunk["keep_end"])
+        ]
+        segments.extend(kept)
+        previous, previous_end = chunk_segments, end
+        if len(chunks) > 1:
+            print(f"Chunk {i+1}/{len(chunks)} ({start:.0f}s-{end:.0f}s) diarized in {time.time() - chunk_start_time:.1f}s: "
+                  f"{len(labels)} local speakers, {stitcher.num_speakers} overall")
+        if chunk_callback:
+            chunk_callback(kept, i + 1, len(chunks))
+
+    return segments, chunk_features if chunk_features is not None else extracted
+
+class PyannoteEngine(DiarizationEngine):
+    """The pyannote 3.1 pipeline; needs HUGGINGFACE_TOKEN and is best on a GPU"""
+
+    name = "pyannote"
+    model = DIARIZATION_MODEL
+
+    def diarize(self, audio_path: str, threshold: float, min_speakers: Optional[int] = None,
+                max_speakers: Optional[int] = None, features_key: Optional[str] = None,
+                chunk_callback=None) -> list:
+        # Get the cached pipeline (only loads on first use for each device)
+        pipeline, pipeline_key = get_diarization_pipeline()
+        device = pipeline_key[2]
+        try:
+            chunk_features = result_cache.get_pickle("embeddings", features_key) if features_key else None
+            if chunk_features is not None:
+                print(f"Re-clustering cached speaker embeddings of {audio_path} (threshold {threshold:.3f})...")
+            else:
+                print(f"Starting diarization of {audio_path} (threshold {threshold:.3f})...")
+                print("⏳ This may take several minutes depending on audio length...")
+
+            on_cuda = device.startswith("cuda")
+            start_time = torch.cuda.Event(enable_timing=True) if on_cuda else None
+            end_time = torch.cuda.Event(enable_timing=True) if on_cuda else None
+
+            if start_time:
+                start_time.record()
+
+            segments, extracted = diarize_features(
+                pipeline, audio_path, chunk_features, threshold, min_speakers, max_speakers, chunk_callback
+            )
+            if features_key and chunk_features is None:
+                result_cache.put_pickle("embeddings", features_key, extracted)
+
+            print("✓ Diarization processing completed!")
+
+            if end_time:
+                end_time.record()
+                torch.cuda.synchronize()
+                elapsed_time = start_time.elapsed_time(end_time) / 1000  # Convert ms to seconds
+                print(f"Diarization completed in {elapsed_time:.2f} seconds on {device}")
+            else:
+                print("Diarization completed successfully on CPU")
+
+            return segments
+        finally:
+            release_model(*pipeline_key)
+
+    def recluster(self, features_key: str, threshold: float, min_speakers: Optional[int] = None,
+                  max_speakers: Optional[int] = None) -> Optional[list]:
+        chunk_features = result_cache.get_pickle("embeddings", features_key)
+        if chunk_features is None:
+            return None
+        pipeline, pipeline_key = get_diarization_pipeline()
+        try:
+            segments, _ = diarize_features(pipeline, None, chunk_features, threshold, min_speakers, max_speakers)
+            return segments
+        finally:
+            release_model(*pipeline_key)
+
+DIARIZATION_ENGINES = {engine.name: engine for engine in (PyannoteEngine(), LightweightEngine(), FakeEngine())}
+
+def get_diarization_engine(name: Optional[str]) -> DiarizationEngine:
+    engine = DIARIZATION_ENGINES.get((name or "").lower())
+    if engine is None:
+        raise ValueError(f"Unknown diarization engine '{name}' (expected one of: {', '.join(DIARIZATION_ENGINES)})")
+    return engine
+
+async def perform_diarization(audio_path: str, sensitivity: float = 0.5,
+                              min_speakers: Optional[int] = None, max_speakers: Optional[int] = None,
+                              features_key: Optional[str] = None, chunk_callback=None,
+                              engine: Optional[str] = None):
+    """Perform speaker diarization on an audio file.
+
+    `engine` names the diarization engine (DIARIZATION_ENGINE by default).
+    `sensitivity` sets the clustering threshold (higher finds more speakers) and
+    min_speakers/max_speakers bound the number of speakers found. With a
+    `features_key` the speaker embeddings are cached in the result cache, so
+    diarizing the same audio again with other settings only re-clusters.
+
+    Long PCM files are diarized in chunks (see diarize_features); chunk_callback
+    is called on the event loop with each chunk's segments as it finishes.
+    """
+    diarization_engine = get_diarization_engine(engine or DIARIZATION_ENGINE)
+    threshold = clustering_threshold(sensitivity, diarization_engine.name)
+
+    # Run diarization in a thread pool to avoid blocking
+    loop = asyncio.get_event_loop()
+    
+    # Start GPU monitoring if CUDA is available (but less frequently to reduce noise)
+    if torch.cuda.is_available():
+        stop_monitoring = start_gpu_monitoring(interval=30.0)  # Check every 30 seconds instead of 5
+    else:
+        stop_monitoring = lambda: None
+    
+    notify = None
+    if chunk_callback:
+        notify = lambda *args: loop.call_soon_threadsafe(chunk_callback, *args)
+
+    def run_diarization():
+        return diarization_engine.diarize(audio_path, threshold, min_speakers, max_speakers, features_key, notify)
     
     # Run the diarization in a thread pool
-    diarization_result = await loop.run_in_executor(None, run_diarization)
+    timer = StageTimer("diarize", pcm_duration(audio_path) if is_pcm(audio_path) else None)
+    try:
+        diarization_result = await loop.run_in_executor(diarization_executor, run_diarization)
+    finally:
+        # Stop GPU monitoring even when diarization fails
+        stop_monitoring()
+    timer.finish()
     
-    # Stop GPU monitoring
     if torch.cuda.is_available():
-        stop_monitoring()
         print(f"Peak GPU Memory: {torch.cuda.max_memory_allocated() / 1024**2:.0f} MB\n")
     
     return diarization_result
+
+
+async def recluster_speakers(features_key: str, threshold: float,
+                             min_speakers: Optional[int] = None, max_speakers: Optional[int] = None,
+                             engine: Optional[str] = None):
+    """Diarize again from cached speaker features alone, with new clustering settings.
+
+    No audio is read and no neural model runs, so this takes seconds even for long
+    recordings. Returns the new segments, or None if the features are not cached.
+    """
+    diarization_engine = get_diarization_engine(engine or DIARIZATION_ENGINE)
+
+    def run_recluster():
+        start_time = time.time()
+        segments = diarization_engine.recluster(features_key, threshold, min_speakers, max_speakers)
+        if segments is not None:
+            print(f"Re-clustered cached speaker embeddings in {time.time() - start_time:.2f}s (threshold {threshold:.3f})")
+        return segments
+
+    return await asyncio.get_event_loop().run_in_executor(diarization_executor, run_recluster)
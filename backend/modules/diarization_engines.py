@@ -0,0 +1,264 @@
+import os
+import json
+import time
+import torch
+import numpy as np
+from typing import Optional
+from dotenv import load_dotenv
+from modules.model_registry import acquire_model, release_model
+from modules import result_cache
+from modules.audio_store import is_pcm, open_pcm, pcm_duration, SAMPLE_RATE
+from modules.vad import detect_speech
+from modules.clustering import agglomerative_cluster
+
+# Load environment variables
+load_dotenv()
+
+# Speaker embedding model of the lightweight engine (the one inside pyannote 3.1; not gated)
+LIGHTWEIGHT_EMBEDDING_MODEL = os.getenv("LIGHTWEIGHT_EMBEDDING_MODEL", "pyannote/wespeaker-voxceleb-resnet34-LM")
+
+# Speech is cut into windows of this length, one embedding each
+LIGHTWEIGHT_WINDOW_SECONDS = 1.5
+LIGHTWEIGHT_STEP_SECONDS = 0.75
+
+# Windows a speaker embedding model embeds in one forward pass (both the lightweight
+# engine and pyannote's embedding step)
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+
+# Segments the fake engine replays (a JSON list of {start, end, speaker}); without
+# one it alternates two speakers every FAKE_TURN_SECONDS
+FAKE_DIARIZATION_FIXTURE = os.getenv("FAKE_DIARIZATION_FIXTURE", "")
+FAKE_TURN_SECONDS = 10.0
+
+
+def speaker_label(index: int) -> str:
+    return f"Speaker {index:02d}"
+
+
+def audio_duration(audio_path: str) -> float:
+    if is_pcm(audio_path):
+        return pcm_duration(audio_path)
+    import whisper
+    return len(whisper.load_audio(audio_path, sr=SAMPLE_RATE)) / SAMPLE_RATE
+
+
+class DiarizationEngine:
+    """A speaker diarization backend.
+
+    diarize() runs on a worker thread and returns segments ({start, end,
+    speaker}, sorted by start, speakers named "Speaker 00", ...). With a
+    `features_key`, whatever the engine needs to re-cluster is cached in the
+    result cache under it, and recluster() later turns it into segments for
+    other clustering settings without touching the audio.
+
+    `threshold` is the cosine distance at which clusters stop merging (see
+    diarization.clustering_threshold for each engine's calibration);
+    chunk_callback(segments, chunks_done, total_chunks) receives segments as they
+    become final.
+    """
+
+    name = ""
+    model = ""  # identifies what the cached features depend on (part of the cache key)
+
+    def diarize(self, audio_path: str, threshold: float, min_speakers: Optional[int] = None,
+                max_speakers: Optional[int] = None, features_key: Optional[str] = None,
+                chunk_callback=None) -> list:
+        raise NotImplementedError
+
+    def recluster(self, features_key: str, threshold: float, min_speakers: Optional[int] = None,
+                  max_speakers: Optional[int] = None) -> Optional[list]:
+        """Segments for new clustering settings from cached features, or None if they aren't cached"""
+        return None
+
+
+def plan_windows(regions: list, window: float = LIGHTWEIGHT_WINDOW_SECONDS,
+                 step: float = LIGHTWEIGHT_STEP_SECONDS) -> list:
+    """Cut speech regions into overlapping windows.
+
+    Returns (region index, start, end) per window; regions shorter than a
+    window are a single window.
+    """
+    windows = []
+    for r, (region_start, region_end) in enumerate(regions):
+        if region_end - region_start <= window:
+            windows.append((r, region_start, region_end))
+            continue
+        start = region_start
+        while start + window < region_end:
+            windows.append((r, start, start + window))
+            start += step
+        windows.append((r, region_end - window, region_end))
+    return windows
+
+
+def embed_windows(model, audio: np.ndarray, windows: list, batch_size: int = EMBEDDING_BATCH_SIZE) -> np.ndarray:
+    """Speaker embedding of every window, computed in batches.
+
+    Windows are only batched with windows of the same length (in practice all
+    full-length windows together), so no padding skews their embeddings.
+    """
+    by_length = {}
+    for k, (_, start, end) in enumerate(windows):
+        by_length.setdefault(int(round((end - start) * SAMPLE_RATE)), []).append(k)
+
+    embeddings = np.zeros((len(windows), 0), dtype=np.float32)
+    with torch.inference_mode():
+        for length, indices in by_length.items():
+            for first in range(0, len(indices), batch_size):
+                batch = indices[first:first + batch_size]
+                offsets = [max(0, min(int(windows[k][1] * SAMPLE_RATE), len(audio) - length)) for k in batch]
+                waveforms = np.stack([audio[offset:offset + length] for offset in offsets]).astype(np.float32)
+                output = model(torch.from_numpy(waveforms)[:, None]).numpy()  # (batch, channel, time) in
+                if embeddings.shape[1] == 0:
+                    embeddings = np.zeros((len(windows), output.shape[1]), dtype=np.float32)
+                embeddings[batch] = output
+    return embeddings
+
+
+def windows_to_segments(windows: list, regions: list, labels: np.ndarray) -> list:
+    """Turn labeled windows back into speaker segments.
+
+    Within a region each instant goes to the window whose center is closest,
+    and consecutive pieces of the same speaker are joined.
+    """
+    segments = []
+    for k, (r, start, end) in enumerate(windows):
+        center = (start + end) / 2
+        piece_start = regions[r][0]
+        if k > 0 and windows[k - 1][0] == r:
+            piece_start = (center + (windows[k - 1][1] + windows[k - 1][2]) / 2) / 2
+        piece_end = regions[r][1]
+        if k + 1 < len(windows) and windows[k + 1][0] == r:
+            piece_end = (center + (windows[k + 1][1] + windows[k + 1][2]) / 2) / 2
+        speaker = speaker_label(int(labels[k]))
+        if segments and segments[-1]["speaker"] == speaker and segments[-1]["region"] == r:
+            segments[-1]["end"] = piece_end
+        else:
+            segments.append({"start": piece_start, "end": piece_end, "speaker": speaker, "region": r})
+    for segment in segments:
+        del segment["region"]
+    return segments
+
+
+class LightweightEngine(DiarizationEngine):
+    """CPU-only diarization: energy VAD, a small speaker embedding model over
+    sliding windows, and agglomerative clustering in NumPy.
+
+    Much cheaper than the pyannote pipeline and good enough for recordings
+    with a few clearly distinct speakers (e.g. two-person interviews).
+    Overlapping speech is not detected.
+    """
+
+    name = "lightweight"
+    model = LIGHTWEIGHT_EMBEDDING_MODEL
+
+    def _get_model(self):
+        def load():
+            from pyannote.audio import Model
+            # The embedding model is public; a token is only passed along if one is set
+            model = Model.from_pretrained(LIGHTWEIGHT_EMBEDDING_MODEL, use_auth_token=os.getenv("HUGGINGFACE_TOKEN"))
+            model.eval()
+            print(f"✓ Speaker embedding model {LIGHTWEIGHT_EMBEDDING_MODEL} loaded on cpu")
+            return model
+
+        key = ("embedding", LIGHTWEIGHT_EMBEDDING_MODEL, "cpu", "fp32")
+        return acquire_model(*key, loader=load), key
+
+    def extract(self, audio_path: str) -> dict:
+        """Speech regions, windows and one speaker embedding per window"""
+        audio = open_pcm(audio_path) if is_pcm(audio_path) else None
+        if audio is None:
+            import whisper
+            audio = whisper.load_audio(audio_path, sr=SAMPLE_RATE)
+        regions = detect_speech(audio)
+        windows = plan_windows(regions)
+
+        model, model_key = self._get_model()
+        try:
+            embeddings = embed_windows(model, audio, windows)
+        finally:
+            release_model(*model_key)
+
+        return {"regions": regions, "windows": windows, "embeddings": embeddings}
+
+    def cluster(self, features: dict, threshold: float, min_speakers: Optional[int] = None,
+                max_speakers: Optional[int] = None) -> list:
+        start_time = time.time()
+        labels = agglomerative_cluster(features["embeddings"], threshold, min_speakers, max_speakers)
+        print(f"Clustered {len(labels)} speaker embeddings into {len(set(labels.tolist()))} speakers "
+              f"in {time.time() - start_time:.2f}s")
+        return windows_to_segments(features["windows"], features["regions"], labels)
+
+    def diarize(self, audio_path: str, threshold: float, min_speakers: Optional[int] = None,
+                max_speakers: Optional[int] = None, features_key: Optional[str] = None,
+                chunk_callback=None) -> list:
+        features = result_cache.get_pickle("embeddings", features_key) if features_key else None
+        if features is None:
+            start_time = time.time()
+            features = self.extract(audio_path)
+            print(f"Extracted {len(features['windows'])} speaker embeddings from "
+                  f"{len(features['regions'])} speech regions in {time.time() - start_time:.1f}s")
+            if features_key:
+                result_cache.put_pickle("embeddings", features_key, features)
+
+        segments = self.cluster(features, threshold, min_speakers, max_speakers)
+        if chunk_callback:
+            chunk_callback(segments, 1, 1)
+        return segments
+
+    def recluster(self, features_key: str, threshold: float, min_speakers: Optional[int] = None,
+                  max_speakers: Optional[int] = None) -> Optional[list]:
+        features = result_cache.get_pickle("embeddings", features_key)
+        if features is None:
+            return None
+        return self.cluster(features, threshold, min_speakers, max_speakers)
+
+
+class FakeEngine(DiarizationEngine):
+    """Deterministic engine for tests; loads no model and ignores the threshold.
+
+    Replays FAKE_DIARIZATION_FIXTURE if set, otherwise alternates two speakers
+    every FAKE_TURN_SECONDS. max_speakers folds speakers onto the first ones.
+    """
+
+    name = "fake"
+    model = FAKE_DIARIZATION_FIXTURE
+
+    def segments_for(self, audio_path: str) -> list:
+        if FAKE_DIARIZATION_FIXTURE:
+            with open(FAKE_DIARIZATION_FIXTURE) as f:
+                return sorted(json.load(f), key=lambda segment: segment["start"])
+        duration = audio_duration(audio_path)
+        segments = []
+        start = 0.0
+        while start < duration:
+            end = min(duration, start + FAKE_TURN_SECONDS)
+            segments.append({"start": start, "end": end, "speaker": speaker_label(len(segments) % 2)})
+            start = end
+        return segments
+
+    def cluster(self, segments: list, max_speakers: Optional[int] = None) -> list:
+        speakers = sorted({segment["speaker"] for segment in segments})
+        limit = max_speakers or len(speakers)
+        return [
+            dict(segment, speaker=speaker_label(speakers.index(segment["speaker"]) % limit))
+            for segment in segments
+        ]
+
+    def diarize(self, audio_path: str, threshold: float, min_speakers: Optional[int] = None,
+                max_speakers: Optional[int] = None, features_key: Optional[str] = None,
+                chunk_callback=None) -> list:
+        features = self.segments_for(audio_path)
+        if features_key:
+            result_cache.put_pickle("embeddings", features_key, features)
+        segments = self.cluster(features, max_speakers)
+        if chunk_callback:
+            chunk_callback(segments, 1, 1)
+        return segments
+
+    def recluster(self, features_key: str, threshold: float, min_speakers: Optional[int] = None,
+                  max_speakers: Optional[int] = None) -> Optional[list]:
+        features = result_cache.get_pickle("embeddings", features_key)
+        if features is None:
+            return None
+        return self.cluster(features, max_speakers)
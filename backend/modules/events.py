@@ -0,0 +1,68 @@
+import asyncio
+import json
+
+# Events buffered per subscriber before the oldest are dropped (slow clients)
+SUBSCRIBER_QUEUE_SIZE = 256
+
+
+class EventBus:
+    """In-process publish/subscribe for job and batch progress events.
+
+    Topics are "job:<job_id>" and "batch:<batch_id>". Events for a job that
+    belongs to a batch are also delivered on the batch topic, so one
+    subscription can follow every job of the batch. Publish and subscribe from
+    the event loop thread.
+    """
+
+    def __init__(self):
+        self._subscribers = {}  # topic -> set of asyncio.Queue
+        self._job_batches = {}  # job id -> batch id
+
+    def subscribe(self, *topics) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        for topic in topics:
+            self._subscribers.setdefault(topic, set()).add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue, *topics):
+        for topic in topics:
+            subscribers = self._subscribers.get(topic)
+            if subscribers is None:
+                continue
+            subscribers.discard(queue)
+            if not subscribers:
+                del self._subscribers[topic]
+
+    def link_job(self, job_id: str, batch_id: str):
+        """Also deliver the job's events to subscribers of its batch"""
+        self._job_batches[job_id] = batch_id
+
+    def forget_job(self, job_id: str):
+        self._job_batches.pop(job_id, None)
+
+    def publish(self, topic: str, event_type: str, data: dict):
+        queues = set(self._subscribers.get(topic, ()))
+        if topic.startswith("job:"):
+            batch_id = self._job_batches.get(topic[4:])
+            if batch_id:
+                queues |= self._subscribers.get(f"batch:{batch_id}", set())
+
+        for queue in queues:
+            if queue.full():
+                # Drop the oldest event rather than block the pipeline on a slow client
+                queue.get_nowait()
+            queue.put_nowait((event_type, data))
+
+    def publish_job(self, job_id: str, event_type: str, data: dict):
+        self.publish(f"job:{job_id}", event_type, dict(data, job_id=job_id))
+
+    def publish_batch(self, batch_id: str, event_type: str, data: dict):
+        self.publish(f"batch:{batch_id}", event_type, dict(data, batch_id=batch_id))
+
+
+def format_sse(event_type: str, data: dict) -> str:
+    """Encode one Server-Sent Events message"""
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+
+events = EventBus()
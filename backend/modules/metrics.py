@@ -0,0 +1,262 @@
+import os
+import time
+import bisect
+import weakref
+import threading
+from dotenv import load_dotenv
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Load environment variables
+load_dotenv()
+
+# How often resident memory is sampled while a stage runs (seconds)
+RSS_SAMPLE_INTERVAL = float(os.getenv("METRICS_RSS_INTERVAL", "0.5"))
+
+# Histogram buckets (upper bounds) per kind of measurement
+DURATION_BUCKETS = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+REALTIME_FACTOR_BUCKETS = (0.1, 0.25, 0.5, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+WAIT_BUCKETS = (0.01, 0.1, 0.5, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600)
+RSS_BUCKETS = tuple(2**k * 1024**2 for k in range(8, 17))  # 256 MB to 64 GB
+
+_registry = []
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A named metric family with optional labels, rendered in Prometheus text format"""
+
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}  # label values -> value
+        self._lock = threading.Lock()
+        _registry.append(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.labels)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.extend(self._render_value(key, value))
+        return lines
+
+    def _render_value(self, key: tuple, value) -> list:
+        return [f"{self.name}{_format_labels(self.labels, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        with self._lock:
+            key = self._key(labels)
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down; with `function`, it is read at scrape time"""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, help: str, labels=(), function=None):
+        super().__init__(name, help, labels)
+        self.function = function
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def render(self) -> list:
+        if self.function is not None:
+            value = self.function()
+            if value is not None:
+                self.set(value)
+        return super().render()
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels=(), buckets=DURATION_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        with self._lock:
+            key = self._key(labels)
+            entry = self._values.get(key)
+            if entry is None:
+                # Per-bucket (not cumulative) counts, plus the +Inf bucket, sum and count
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][bisect.bisect_left(self.buckets, value)] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _render_value(self, key: tuple, entry) -> list:
+        counts, total, count = entry
+        lines = []
+        cumulative = 0
+        for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+            cumulative += bucket_count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labels, key, le)} {cumulative}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labels, key)} {_format_value(total)}")
+        lines.append(f"{self.name}_count{_format_labels(self.labels, key)} {count}")
+        return lines
+
+
+def current_rss_bytes():
+    """Resident memory of this process in bytes, or None when it can't be determined"""
+    if psutil is not None:
+        return psutil.Process().memory_info().rss
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def peak_rss_bytes():
+    """Highest resident memory this process has reached, or None when unknown"""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak if os.uname().sysname == "Darwin" else peak * 1024
+
+
+STAGE_DURATION = Histogram(
+    "tubescript_stage_duration_seconds", "Time a pipeline stage took (excluding queue wait)",
+    ["stage"], DURATION_BUCKETS
+)
+STAGE_REALTIME_FACTOR = Histogram(
+    "tubescript_stage_realtime_factor", "Seconds of audio a pipeline stage processed per second",
+    ["stage"], REALTIME_FACTOR_BUCKETS
+)
+STAGE_PEAK_RSS = Histogram(
+    "tubescript_stage_peak_rss_bytes", "Peak resident memory of the process while a pipeline stage ran",
+    ["stage"], RSS_BUCKETS
+)
+QUEUE_WAIT = Histogram(
+    "tubescript_queue_wait_seconds", "Time jobs waited for a scheduler worker or for memory headroom",
+    ["queue"], WAIT_BUCKETS
+)
+JOBS = Counter("tubescript_jobs_total", "Jobs finished, by outcome", ["status"])
+GPU_MEMORY = Gauge("tubescript_gpu_memory_allocated_bytes", "CUDA memory allocated by PyTorch", ["device"])
+GPU_UTILIZATION = Gauge("tubescript_gpu_utilization_ratio", "GPU utilization reported by NVML (0-1)", ["device"])
+RESIDENT_MEMORY = Gauge("process_resident_memory_bytes", "Resident memory size in bytes", function=current_rss_bytes)
+PEAK_MEMORY = Gauge("tubescript_process_peak_rss_bytes", "Highest resident memory of the process", function=peak_rss_bytes)
+
+
+# Stage timers that want resident memory samples, and the thread taking them
+_active_timers = weakref.WeakSet()
+_sampler_lock = threading.Lock()
+_sampler = None
+
+
+def _sample_rss():
+    global _sampler
+    while True:
+        with _sampler_lock:
+            timers = list(_active_timers)
+            if not timers:
+                _sampler = None
+                return
+        rss = current_rss_bytes()
+        for timer in timers:
+            timer.sample(rss)
+        time.sleep(RSS_SAMPLE_INTERVAL)
+
+
+class StageTimer:
+    """Times one run of a pipeline stage and tracks peak resident memory meanwhile.
+
+    Use it as a context manager, or call finish() when the stage is done; runs
+    that raise are not recorded. Set `audio_seconds` (or pass it to finish()) to
+    also record the stage's realtime factor.
+    """
+
+    def __init__(self, stage: str, audio_seconds: float = None):
+        global _sampler
+        self.stage = stage
+        self.audio_seconds = audio_seconds
+        self.peak_rss = None
+        self.sample(current_rss_bytes())
+        self._start = time.perf_counter()
+        self._finished = False
+        with _sampler_lock:
+            _active_timers.add(self)
+            if _sampler is None:
+                _sampler = threading.Thread(target=_sample_rss, name="metrics-rss", daemon=True)
+                _sampler.start()
+
+    def sample(self, rss):
+        if rss is not None and (self.peak_rss is None or rss > self.peak_rss):
+            self.peak_rss = rss
+
+    def finish(self, audio_seconds: float = None) -> float:
+        """Record the stage; returns its duration in seconds"""
+        seconds = time.perf_counter() - self._start
+        if self._finished:
+            return seconds
+        self._finished = True
+        with _sampler_lock:
+            _active_timers.discard(self)
+        self.sample(current_rss_bytes())
+        if audio_seconds is not None:
+            self.audio_seconds = audio_seconds
+
+        STAGE_DURATION.observe(seconds, stage=self.stage)
+        if self.audio_seconds and seconds > 0:
+            STAGE_REALTIME_FACTOR.observe(self.audio_seconds / seconds, stage=self.stage)
+        if self.peak_rss is not None:
+            STAGE_PEAK_RSS.observe(self.peak_rss, stage=self.stage)
+        return seconds
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.finish()
+        else:
+            with _sampler_lock:
+                _active_timers.discard(self)
+
+
+def render() -> str:
+    """All metrics in the Prometheus text exposition format (version 0.0.4)"""
+    lines = []
+    for metric in _registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,197 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Seconds a model may sit unused (refcount 0) before it is evicted. 0 disables eviction.
+MODEL_IDLE_TIMEOUT = float(os.getenv("MODEL_IDLE_TIMEOUT", "600"))
+
+# Resident models keyed by (kind, name, device, precision)
+_models = {}
+_registry_lock = threading.Lock()
+# Per-key locks so two jobs asking for the same model only load it once
+_load_locks = {}
+_reaper_started = False
+
+
+def _estimate_memory_bytes(model) -> int:
+    """Estimate the memory held by a model from its parameters, buffers and packed weights"""
+    total = 0
+    try:
+        for tensor in list(model.parameters()) + list(model.buffers()):
+            total += tensor.numel() * tensor.element_size()
+        # Dynamically quantized layers keep their int8 weight and bias in a packed
+        # object that parameters() and buffers() don't see. Both the layer and its
+        # packed-params child expose _weight_bias(), so count only the innermost one.
+        for module in model.modules():
+            if not hasattr(module, "_weight_bias"):
+                continue
+            if any(hasattr(child, "_weight_bias") for child in module.children()):
+                continue
+            for tensor in module._weight_bias():
+                if tensor is not None:
+                    total += tensor.numel() * tensor.element_size()
+    except Exception:
+        # Not a torch module (or the pipeline doesn't expose its weights)
+        pass
+    return total
+
+
+def _start_reaper():
+    """Start the background thread that evicts idle models"""
+    global _reaper_started
+    if _reaper_started or MODEL_IDLE_TIMEOUT <= 0:
+        return
+    _reaper_started = True
+
+    def reaper():
+        interval = max(1.0, min(60.0, MODEL_IDLE_TIMEOUT / 4))
+        while True:
+            time.sleep(interval)
+            evict_idle_models()
+
+    thread = threading.Thread(target=reaper, daemon=True)
+    thread.start()
+
+
+def acquire_model(kind: str, name: str, device: str, precision: str, loader):
+    """Return a resident model for (kind, name, device, precision), loading it once per process.
+
+    The caller must hand the model back with release_model() when done.
+    `loader` is only called on a miss and must return the loaded model.
+    """
+    key = (kind, name, device, precision)
+
+    with _registry_lock:
+        entry = _models.get(key)
+        if entry is not None:
+            entry["refcount"] += 1
+            entry["last_used"] = time.time()
+            entry["hits"] += 1
+            return entry["model"]
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        # Another job may have finished loading while we waited
+        with _registry_lock:
+            entry = _models.get(key)
+            if entry is not None:
+                entry["refcount"] += 1
+                entry["last_used"] = time.time()
+                entry["hits"] += 1
+                return entry["model"]
+
+        print(f"Model registry: loading {kind} model '{name}' on {device} ({precision})...")
+        load_start = time.time()
+        model = loader()
+        load_time = time.time() - load_start
+        print(f"Model registry: {kind} model '{name}' loaded in {load_time:.2f} seconds")
+
+        with _registry_lock:
+            _models[key] = {
+                "model": model,
+                "refcount": 1,
+                "loaded_at": time.time(),
+                "last_used": time.time(),
+                "load_seconds": load_time,
+                "memory_bytes": _estimate_memory_bytes(model),
+                "hits": 0,
+                "lock": threading.Lock(),
+            }
+
+    _start_reaper()
+    return model
+
+
+def release_model(kind: str, name: str, device: str, precision: str):
+    """Drop one reference to a model acquired with acquire_model()"""
+    key = (kind, name, device, precision)
+    with _registry_lock:
+        entry = _models.get(key)
+        if entry is None:
+            return
+        entry["refcount"] = max(0, entry["refcount"] - 1)
+        entry["last_used"] = time.time()
+
+
+@contextmanager
+def use_model(kind: str, name: str, device: str, precision: str, loader):
+    """Context manager wrapping acquire_model()/release_model()"""
+    model = acquire_model(kind, name, device, precision, loader)
+    try:
+        yield model
+    finally:
+        release_model(kind, name, device, precision)
+
+
+def model_lock(kind: str, name: str, device: str, precision: str) -> threading.Lock:
+    """Lock for running a model that can't serve several callers at once.
+
+    Only valid while the caller holds a reference from acquire_model().
+    """
+    with _registry_lock:
+        return _models[(kind, name, device, precision)]["lock"]
+
+
+def _unload(key, entry):
+    """Free an evicted model, including any CUDA cache it was holding"""
+    kind, name, device, precision = key
+    del entry["model"]
+    if device.startswith("cuda"):
+        try:
+            import torch
+            torch.cuda.empty_cache()
+        except Exception:
+            pass
+    print(f"Model registry: evicted {kind} model '{name}' from {device} ({precision})")
+
+
+def evict_idle_models(timeout: float = None) -> int:
+    """Evict unreferenced models idle for longer than `timeout` seconds.
+
+    Returns the number of models evicted.
+    """
+    if timeout is None:
+        timeout = MODEL_IDLE_TIMEOUT
+    if timeout <= 0:
+        return 0
+
+    now = time.time()
+    evicted = []
+    with _registry_lock:
+        for key, entry in list(_models.items()):
+            if entry["refcount"] == 0 and now - entry["last_used"] >= timeout:
+                evicted.append((key, _models.pop(key)))
+
+    for key, entry in evicted:
+        _unload(key, entry)
+    return len(evicted)
+
+
+def get_resident_models() -> dict:
+    """Describe the models currently resident in this process"""
+    now = time.time()
+    models = []
+    with _registry_lock:
+        for (kind, name, device, precision), entry in _models.items():
+            models.append({
+                "kind": kind,
+                "name": name,
+                "device": device,
+                "precision": precision,
+                "refcount": entry["refcount"],
+                "memory_mb": round(entry["memory_bytes"] / 1024**2, 2),
+                "load_seconds": round(entry["load_seconds"], 2),
+                "idle_seconds": round(now - entry["last_used"], 1) if entry["refcount"] == 0 else 0.0,
+                "hits": entry["hits"],
+            })
+
+    return {
+        "idle_timeout": MODEL_IDLE_TIMEOUT,
+        "total_memory_mb": round(sum(model["memory_mb"] for model in models), 2),
+        "models": models,
+    }
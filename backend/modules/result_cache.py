@@ -0,0 +1,412 @@
+import os
+import json
+import pickle
+import time
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: the cache is then only safe to share within one process
+    fcntl = None
+
+# Load environment variables
+load_dotenv()
+
+# Where cached audio and stage results live on disk
+RESULT_CACHE_DIR = os.path.expanduser(os.getenv("RESULT_CACHE_DIR", "~/.cache/tubescript"))
+
+# Disk budget for the cache; least recently used entries are evicted beyond it. 0 disables the cache.
+RESULT_CACHE_MAX_MB = float(os.getenv("RESULT_CACHE_MAX_MB", "10240"))
+
+# Bump when a change to the pipeline makes previously cached results stale
+PIPELINE_VERSION = "2"
+
+# Format of cached audio (see modules/audio_store.py); entries in other formats are never hit
+AUDIO_FORMAT = "pcm"
+
+# Cache stages, from earliest to latest in the pipeline ("embeddings" holds the
+# speaker features diarization re-clusters when only its settings change)
+STAGES = ["audio", "embeddings", "diarization", "transcription"]
+
+# Entries used this recently are not evicted, even when no job has them pinned
+EVICTION_GRACE_SECONDS = 60
+
+# Cache hits update the index's access times in memory; they are written out
+# with the next commit, or at the latest after this many seconds
+ACCESS_FLUSH_INTERVAL = 30
+
+# Temp directories of entries being written are removed once this old (left by a crash)
+STALE_TMP_SECONDS = 3600
+
+_INDEX_FILE = "index.json"  # entry key -> {"stage", "size", "created", "last_access"}
+_LOCK_FILE = "index.lock"
+_PIN_FILE = ".pin"
+
+_lock = threading.Lock()
+_pins = {}  # entry key -> [jobs in this process using the entry, open pin file or None]
+_accessed = {}  # entry key -> last access time not yet written to the index
+_flush_timer = None
+_stats = {stage: {"hits": 0, "misses": 0} for stage in STAGES}
+
+
+def cache_enabled() -> bool:
+    return RESULT_CACHE_MAX_MB > 0
+
+
+def make_key(stage: str, **parts) -> str:
+    """Build the cache key for a stage from the options its result depends on"""
+    payload = json.dumps({"stage": stage, "version": PIPELINE_VERSION, **parts}, sort_keys=True)
+    return f"{stage}/{hashlib.sha256(payload.encode()).hexdigest()[:32]}"
+
+
+def _entry_dir(key: str) -> str:
+    return os.path.join(RESULT_CACHE_DIR, *key.split("/"))
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+@contextmanager
+def _index_lock():
+    """Hold the cache lock for a read-modify-write of the index.
+
+    A thread lock within this process, plus an exclusive file lock shared with
+    every other process (e.g. uvicorn worker) using RESULT_CACHE_DIR.
+    """
+    with _lock:
+        if fcntl is None:
+            yield
+            return
+        os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+        with open(os.path.join(RESULT_CACHE_DIR, _LOCK_FILE), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _load_index() -> dict:
+    """Read the index from disk, rebuilding it from the cache directories if needed.
+
+    Always re-read under _index_lock(): other processes update it too.
+    """
+    index = {}
+    index_path = os.path.join(RESULT_CACHE_DIR, _INDEX_FILE)
+    try:
+        with open(index_path) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        # Rebuild from whatever is on disk
+        for stage in STAGES:
+            stage_dir = os.path.join(RESULT_CACHE_DIR, stage)
+            if not os.path.isdir(stage_dir):
+                continue
+            for name in os.listdir(stage_dir):
+                path = os.path.join(stage_dir, name)
+                # Entries still being written, or left over from a crash (removed below)
+                if name.endswith(".tmp"):
+                    continue
+                mtime = os.path.getmtime(path)
+                index[f"{stage}/{name}"] = {
+                    "stage": stage,
+                    "size": _dir_size(path),
+                    "created": mtime,
+                    "last_access": mtime,
+                }
+        _remove_stale_tmp()
+        _save_index(index)
+
+    # Drop entries whose directory disappeared
+    for key in [key for key in index if not os.path.isdir(_entry_dir(key))]:
+        del index[key]
+
+    # Apply the access times of this process's hits (cleared once saved)
+    for key, last_access in _accessed.items():
+        if key in index:
+            index[key]["last_access"] = max(index[key]["last_access"], last_access)
+    return index
+
+
+def _save_index(index: dict):
+    os.makedirs(RESULT_CACHE_DIR, exist_ok=True)
+    index_path = os.path.join(RESULT_CACHE_DIR, _INDEX_FILE)
+    tmp_path = f"{index_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(index, f)
+    os.replace(tmp_path, index_path)
+    _accessed.clear()
+
+
+def _remove_stale_tmp():
+    """Remove temp entry directories (see _new_entry_dir) left behind by a crash"""
+    now = time.time()
+    for stage in STAGES:
+        stage_dir = os.path.join(RESULT_CACHE_DIR, stage)
+        if not os.path.isdir(stage_dir):
+            continue
+        for name in os.listdir(stage_dir):
+            path = os.path.join(stage_dir, name)
+            if name.endswith(".tmp") and now - os.path.getmtime(path) > STALE_TMP_SECONDS:
+                shutil.rmtree(path, ignore_errors=True)
+
+
+def _pin(key: str):
+    """Pin an entry against eviction by any process; call under _index_lock().
+
+    Each process holds a shared file lock on the entry's pin file while any
+    of its jobs use the entry.
+    """
+    pin = _pins.get(key)
+    if pin is None:
+        pin_file = None
+        if fcntl is not None:
+            pin_file = open(os.path.join(_entry_dir(key), _PIN_FILE), "a")
+            fcntl.flock(pin_file, fcntl.LOCK_SH)
+        pin = _pins[key] = [0, pin_file]
+    pin[0] += 1
+
+
+def _unpin(key: str):
+    pin = _pins.get(key)
+    if not pin:
+        return
+    pin[0] -= 1
+    if pin[0] == 0:
+        if pin[1] is not None:
+            pin[1].close()  # releases the file lock
+        del _pins[key]
+
+
+def _pinned(key: str) -> bool:
+    """Whether this or another process has the entry pinned"""
+    if _pins.get(key):
+        return True
+    pin_path = os.path.join(_entry_dir(key), _PIN_FILE)
+    if fcntl is None or not os.path.exists(pin_path):
+        return False
+    with open(pin_path, "a") as pin_file:
+        try:
+            fcntl.flock(pin_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return True
+    return False
+
+
+def _evict(index: dict, budget_bytes: float):
+    """Evict least recently used entries until the cache fits the budget.
+
+    Entries pinned by any process, or used within EVICTION_GRACE_SECONDS, are kept.
+    """
+    total = sum(entry["size"] for entry in index.values())
+    if total > budget_bytes:
+        _remove_stale_tmp()
+    now = time.time()
+    for key, entry in sorted(index.items(), key=lambda item: item[1]["last_access"]):
+        if total <= budget_bytes:
+            break
+        if now - entry["last_access"] < EVICTION_GRACE_SECONDS or _pinned(key):
+            continue
+        shutil.rmtree(_entry_dir(key), ignore_errors=True)
+        total -= entry["size"]
+        del index[key]
+        print(f"Result cache: evicted {key} ({entry['size'] / 1024**2:.1f} MB)")
+
+
+def _flush_accesses():
+    """Write the access times of recent cache hits to the index"""
+    global _flush_timer
+    with _index_lock():
+        _flush_timer = None
+        if _accessed:
+            _save_index(_load_index())
+
+
+def _lookup(key: str, stage: str) -> bool:
+    """Record a hit or miss for `key` and return whether it is cached.
+
+    Entry directories only appear once fully written (see _commit), so this
+    doesn't read the index; the access time is written out later.
+    """
+    global _flush_timer
+    hit = os.path.isdir(_entry_dir(key))
+    with _lock:
+        if not hit:
+            _stats[stage]["misses"] += 1
+            return False
+        _stats[stage]["hits"] += 1
+        _accessed[key] = time.time()
+        if _flush_timer is None:
+            _flush_timer = threading.Timer(ACCESS_FLUSH_INTERVAL, _flush_accesses)
+            _flush_timer.daemon = True
+            _flush_timer.start()
+    return True
+
+
+def _commit(key: str, stage: str, tmp_dir: str, pin: bool = False) -> bool:
+    """Move a fully written entry into place and account for it.
+
+    An entry that already exists is kept and the new one discarded: keys are
+    derived from everything the result depends on, and another job may be
+    reading the existing files. With `pin`, the entry is pinned before
+    anything is evicted. Returns whether the new entry was stored.
+    """
+    with _index_lock():
+        index = _load_index()
+        final_dir = _entry_dir(key)
+        now = time.time()
+        if os.path.isdir(final_dir):
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            entry = index.setdefault(key, {"stage": stage, "size": _dir_size(final_dir), "created": now})
+            entry["last_access"] = now
+            if pin:
+                _pin(key)
+            _save_index(index)
+            return False
+        os.makedirs(os.path.dirname(final_dir), exist_ok=True)
+        os.replace(tmp_dir, final_dir)
+        index[key] = {"stage": stage, "size": _dir_size(final_dir), "created": now, "last_access": now}
+        if pin:
+            _pin(key)
+        _evict(index, RESULT_CACHE_MAX_MB * 1024**2)
+        _save_index(index)
+        return True
+
+
+def _new_entry_dir(key: str) -> str:
+    tmp_dir = f"{_entry_dir(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+    os.makedirs(tmp_dir, exist_ok=True)
+    return tmp_dir
+
+
+def get_json(stage: str, key: str):
+    """Return a cached JSON result, or None on a miss"""
+    if not cache_enabled() or not _lookup(key, stage):
+        return None
+    try:
+        with open(os.path.join(_entry_dir(key), "result.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def put_json(stage: str, key: str, data):
+    """Cache a JSON-serializable stage result"""
+    if not cache_enabled():
+        return
+    tmp_dir = _new_entry_dir(key)
+    with open(os.path.join(tmp_dir, "result.json"), "w") as f:
+        json.dump(data, f)
+    _commit(key, stage, tmp_dir)
+
+
+def get_pickle(stage: str, key: str):
+    """Return a cached Python object (e.g. numpy arrays), or None on a miss"""
+    if not cache_enabled() or not _lookup(key, stage):
+        return None
+    try:
+        with open(os.path.join(_entry_dir(key), "result.pkl"), "rb") as f:
+            return pickle.load(f)
+    except (OSError, pickle.UnpicklingError, EOFError):
+        return None
+
+
+def put_pickle(stage: str, key: str, data):
+    """Cache a picklable stage result"""
+    if not cache_enabled():
+        return
+    tmp_dir = _new_entry_dir(key)
+    with open(os.path.join(tmp_dir, "result.pkl"), "wb") as f:
+        pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+    _commit(key, stage, tmp_dir)
+
+
+def get_audio(video_id: str):
+    """Return (audio_path, video_info) for a cached download, or None on a miss.
+
+    The entry is pinned against eviction until release_audio() is called.
+    """
+    if not cache_enabled():
+        return None
+    key = make_key("audio", video_id=video_id, format=AUDIO_FORMAT)
+    if not _lookup(key, "audio"):
+        return None
+    entry_dir = _entry_dir(key)
+    with _index_lock():
+        # Evicted since the lookup
+        if not os.path.isdir(entry_dir):
+            return None
+        _pin(key)
+    try:
+        with open(os.path.join(entry_dir, "video_info.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        release_audio(video_id)
+        return None
+    return os.path.join(entry_dir, meta["audio_file"]), meta["video_info"]
+
+
+def put_audio(video_id: str, audio_path: str, video_info: dict) -> str:
+    """Move a downloaded audio file into the cache and return its cached path.
+
+    If the video's audio is already cached, the existing file is kept (and
+    returned) and the new download deleted. The entry is pinned against
+    eviction until release_audio() is called.
+    """
+    if not cache_enabled():
+        return audio_path
+    key = make_key("audio", video_id=video_id, format=AUDIO_FORMAT)
+    tmp_dir = _new_entry_dir(key)
+    audio_file = os.path.basename(audio_path)
+    shutil.move(audio_path, os.path.join(tmp_dir, audio_file))
+    with open(os.path.join(tmp_dir, "video_info.json"), "w") as f:
+        json.dump({"audio_file": audio_file, "video_info": video_info}, f)
+    if not _commit(key, "audio", tmp_dir, pin=True):
+        with open(os.path.join(_entry_dir(key), "video_info.json")) as f:
+            audio_file = json.load(f)["audio_file"]
+    return os.path.join(_entry_dir(key), audio_file)
+
+
+def release_audio(video_id: str):
+    """Unpin a cached audio entry once a job is done with it"""
+    key = make_key("audio", video_id=video_id, format=AUDIO_FORMAT)
+    with _lock:
+        _unpin(key)
+
+
+def get_cache_stats() -> dict:
+    """Describe cache usage and hit/miss counts per stage"""
+    with _index_lock():
+        index = _load_index() if cache_enabled() else {}
+        stages = {}
+        for stage in STAGES:
+            entries = [entry for entry in index.values() if entry["stage"] == stage]
+            hits = _stats[stage]["hits"]
+            misses = _stats[stage]["misses"]
+            stages[stage] = {
+                "entries": len(entries),
+                "size_mb": round(sum(entry["size"] for entry in entries) / 1024**2, 2),
+                "hits": hits,
+                "misses": misses,
+                "hit_rate": round(hits / (hits + misses), 3) if hits + misses else 0.0,
+            }
+        return {
+            "enabled": cache_enabled(),
+            "directory": RESULT_CACHE_DIR,
+            "pipeline_version": PIPELINE_VERSION,
+            "max_mb": RESULT_CACHE_MAX_MB,
+            "size_mb": round(sum(stage["size_mb"] for stage in stages.values()), 2),
+            "stages": stages,
+        }
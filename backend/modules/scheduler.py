@@ -0,0 +1,220 @@
+import os
+import heapq
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+from dotenv import load_dotenv
+from modules.metrics import QUEUE_WAIT
+
+try:
+    import psutil
+except ImportError:
+    psutil = None
+
+# Load environment variables
+load_dotenv()
+
+# Concurrent workers per resource class
+RESOURCE_LIMITS = {
+    "download": int(os.getenv("SCHEDULER_DOWNLOAD_WORKERS", "4")),
+    "diarize": int(os.getenv("SCHEDULER_DIARIZE_WORKERS", "1")),
+    "transcribe": int(os.getenv("SCHEDULER_TRANSCRIBE_WORKERS", "1")),
+}
+
+# Videos from batch jobs processed at once across all batches; each batch gets a fair share
+MAX_CONCURRENT_VIDEOS = int(os.getenv("MAX_CONCURRENT_VIDEOS", "6"))
+
+# "priority" serves higher-priority jobs first (FIFO among equals); "fifo" ignores priority
+SCHEDULER_POLICY = os.getenv("SCHEDULER_POLICY", "priority").lower()
+
+# Admission control: new jobs are deferred while available memory is below this
+MIN_FREE_MEMORY_MB = float(os.getenv("MIN_FREE_MEMORY_MB", "2048"))
+
+# ...and rejected outright once this many jobs are already deferred
+MAX_DEFERRED_JOBS = int(os.getenv("MAX_DEFERRED_JOBS", "20"))
+
+# How often deferred jobs re-check memory headroom (seconds)
+ADMISSION_POLL_INTERVAL = 2.0
+
+
+class AdmissionError(Exception):
+    """Raised when a job can't be admitted because the host is out of headroom"""
+
+
+def get_available_memory_mb():
+    """Available system memory in MB, or None when it can't be determined"""
+    if psutil is not None:
+        return psutil.virtual_memory().available / 1024**2
+    try:
+        with open("/proc/meminfo") as f:
+            for line in f:
+                if line.startswith("MemAvailable:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return None
+
+
+def has_memory_headroom() -> bool:
+    available = get_available_memory_mb()
+    return available is None or available >= MIN_FREE_MEMORY_MB
+
+
+class ResourcePool:
+    """A bounded pool of workers for one resource class, with a priority wait queue"""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self._active = set()
+        self._waiters = []  # heap of [sort priority, share, sequence, job_id, future]
+        self._sequence = itertools.count()
+
+    async def acquire(self, job_id: str, priority: int = 0, share: int = 0):
+        """Wait for a worker. Among equal priorities, lower `share` (workers the
+        caller's group already holds) goes first, then arrival order."""
+        if len(self._active) < self.limit and not self._waiters:
+            self._active.add(job_id)
+            return
+
+        future = asyncio.get_event_loop().create_future()
+        sort_priority = -priority if SCHEDULER_POLICY == "priority" else 0
+        entry = [sort_priority, share, next(self._sequence), job_id, future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # We were handed the slot just as we got cancelled
+                self.release(job_id)
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self, job_id: str):
+        self._active.discard(job_id)
+        while self._waiters and len(self._active) < self.limit:
+            _, _, _, next_job_id, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self._active.add(next_job_id)
+            future.set_result(None)
+
+    def position(self, job_id: str):
+        """1-based position of a job in this pool's wait queue, or None if not waiting"""
+        for position, entry in enumerate(sorted(self._waiters, key=lambda e: (e[0], e[1], e[2])), 1):
+            if entry[3] == job_id:
+                return position
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "limit": self.limit,
+            "active": len(self._active),
+            "queued": len(self._waiters),
+        }
+
+
+class Scheduler:
+    """Runs jobs as asyncio tasks, bounding each pipeline stage by its resource pool"""
+
+    def __init__(self, limits: dict):
+        self.pools = {name: ResourcePool(name, limit) for name, limit in limits.items()}
+        self.pools["video"] = ResourcePool("video", MAX_CONCURRENT_VIDEOS)
+        self._batch_active = {}  # batch id -> videos of that batch holding a "video" worker
+        self._tasks = {}
+        self._deferred = []  # job ids waiting for memory headroom, in arrival order
+
+    def submit(self, job_id: str, coroutine):
+        """Admit a job and start running it.
+
+        Jobs are deferred while memory headroom is low, and rejected with
+        AdmissionError once too many are already deferred.
+        """
+        if not has_memory_headroom() and len(self._deferred) >= MAX_DEFERRED_JOBS:
+            coroutine.close()
+            raise AdmissionError("Server is low on memory and its queue is full, try again later")
+
+        task = asyncio.get_event_loop().create_task(self._run(job_id, coroutine))
+        self._tasks[job_id] = task
+        return task
+
+    async def _run(self, job_id: str, coroutine):
+        try:
+            if not has_memory_headroom():
+                wait_start = time.monotonic()
+                self._deferred.append(job_id)
+                print(f"[SCHEDULER] Deferring job {job_id}: available memory below {MIN_FREE_MEMORY_MB:.0f} MB")
+                try:
+                    # Admit deferred jobs in arrival order as memory frees up
+                    while self._deferred[0] != job_id or not has_memory_headroom():
+                        await asyncio.sleep(ADMISSION_POLL_INTERVAL)
+                finally:
+                    self._deferred.remove(job_id)
+                # Only deferred jobs are observed, so the histogram shows real admission waits
+                QUEUE_WAIT.observe(time.monotonic() - wait_start, queue="memory")
+            return await coroutine
+        finally:
+            self._tasks.pop(job_id, None)
+
+    @asynccontextmanager
+    async def slot(self, resource: str, job_id: str, priority: int = 0, on_wait=None, share: int = 0):
+        """Hold a worker of `resource` for the duration of the block.
+
+        `on_wait(position)` is called if the job has to queue for the worker.
+        """
+        pool = self.pools[resource]
+        wait_start = time.monotonic()
+        acquire = asyncio.ensure_future(pool.acquire(job_id, priority, share))
+        # Let the acquire run far enough to either take a worker or join the queue
+        await asyncio.sleep(0)
+        if not acquire.done() and on_wait:
+            on_wait(pool.position(job_id))
+        await acquire
+        QUEUE_WAIT.observe(time.monotonic() - wait_start, queue=resource)
+        try:
+            yield
+        finally:
+            pool.release(job_id)
+
+    @asynccontextmanager
+    async def video_slot(self, batch_id: str, job_id: str, priority: int = 0, on_wait=None):
+        """Hold one of the global batch-video workers for a video of `batch_id`.
+
+        Batches holding fewer workers are served first, so concurrent batches
+        share the machine instead of the first one taking every worker.
+        """
+        share = self._batch_active.get(batch_id, 0)
+        async with self.slot("video", job_id, priority, on_wait, share=share):
+            self._batch_active[batch_id] = self._batch_active.get(batch_id, 0) + 1
+            try:
+                yield
+            finally:
+                self._batch_active[batch_id] -= 1
+                if self._batch_active[batch_id] == 0:
+                    del self._batch_active[batch_id]
+
+    def queue_position(self, job_id: str):
+        """Where a job is waiting: {"queue": resource, "position": n}, or None if it isn't"""
+        if job_id in self._deferred:
+            return {"queue": "memory", "position": self._deferred.index(job_id) + 1}
+        for name, pool in self.pools.items():
+            position = pool.position(job_id)
+            if position is not None:
+                return {"queue": name, "position": position}
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "policy": SCHEDULER_POLICY,
+            "running_jobs": len(self._tasks),
+            "deferred_jobs": len(self._deferred),
+            "available_memory_mb": get_available_memory_mb(),
+            "min_free_memory_mb": MIN_FREE_MEMORY_MB,
+            "pools": {name: pool.stats() for name, pool in self.pools.items()},
+        }
+
+
+scheduler = Scheduler(RESOURCE_LIMITS)
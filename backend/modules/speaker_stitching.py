@@ -0,0 +1,139 @@
+import numpy as np
+
+
+def plan_chunks(duration: float, chunk_seconds: float, overlap_seconds: float) -> list:
+    """Split [0, duration] into overlapping windows.
+
+    Returns (start, end, keep_start, keep_end) per chunk. Consecutive chunks
+    overlap by `overlap_seconds`, and each keeps the segments on its side of
+    the middle of the overlap, so every instant is owned by exactly one chunk.
+    """
+    if duration <= chunk_seconds:
+        return [(0.0, duration, 0.0, duration)]
+
+    step = chunk_seconds - overlap_seconds
+    count = int(np.ceil((duration - overlap_seconds) / step))
+    windows = [(i * step, min(duration, i * step + chunk_seconds)) for i in range(count)]
+
+    chunks = []
+    for i, (start, end) in enumerate(windows):
+        keep_start = 0.0 if i == 0 else (start + windows[i - 1][1]) / 2
+        keep_end = duration if i == count - 1 else (windows[i + 1][0] + end) / 2
+        chunks.append((start, end, keep_start, keep_end))
+    return chunks
+
+
+def clip_segments(segments: list, start: float, end: float) -> list:
+    """The parts of segments that fall within [start, end)"""
+    clipped = []
+    for segment in segments:
+        clipped_start = max(segment["start"], start)
+        clipped_end = min(segment["end"], end)
+        if clipped_end > clipped_start:
+            clipped.append(dict(segment, start=clipped_start, end=clipped_end))
+    return clipped
+
+
+def _overlap(a: list, b: list) -> float:
+    """Total time two lists of (start, end) intervals overlap"""
+    total = 0.0
+    for a_start, a_end in a:
+        for b_start, b_end in b:
+            total += max(0.0, min(a_end, b_end) - max(a_start, b_start))
+    return total
+
+
+class SpeakerStitcher:
+    """Give speakers found independently in each chunk consistent global identities.
+
+    A chunk's local speakers are matched one-to-one to global speakers by cosine
+    similarity of their embeddings to each global speaker's centroid. Speakers
+    without a usable embedding (too little speech) fall back to agreement with
+    the previous chunk in the overlap region. Anyone still unmatched is a new
+    speaker.
+    """
+
+    def __init__(self, threshold: float = 0.5):
+        self.threshold = threshold
+        self.centroids = []  # unit-norm centroid embedding per global speaker (None until one is seen)
+        self.weights = []  # seconds of speech behind each centroid
+
+    @property
+    def num_speakers(self) -> int:
+        return len(self.centroids)
+
+    def assign(self, labels: list, embeddings: np.ndarray, durations: dict, overlap_votes: dict) -> dict:
+        """Map local speaker labels to global speaker indices.
+
+        `embeddings[i]` is the embedding of `labels[i]` (NaN rows are allowed),
+        `durations[label]` its seconds of speech in the chunk, and
+        `overlap_votes[label]` maps global speakers to the seconds that speaker
+        overlaps the local one in the region shared with the previous chunk.
+        """
+        if not labels:
+            return {}
+        embeddings = np.asarray(embeddings, dtype=np.float64).reshape(len(labels), -1)
+        norms = np.linalg.norm(embeddings, axis=1)
+        valid = np.isfinite(norms) & (norms > 0)
+        units = np.zeros_like(embeddings)
+        units[valid] = embeddings[valid] / norms[valid, None]
+
+        # Greedy one-to-one matching on embedding similarity, best pairs first
+        mapping = {}
+        taken = set()
+        pairs = []
+        for i in np.flatnonzero(valid):
+            for j, centroid in enumerate(self.centroids):
+                if centroid is not None and centroid.shape == units[i].shape:
+                    similarity = float(units[i] @ centroid)
+                    if similarity >= self.threshold:
+                        pairs.append((similarity, i, j))
+        for _, i, j in sorted(pairs, reverse=True):
+            if labels[i] in mapping or j in taken:
+                continue
+            mapping[labels[i]] = j
+            taken.add(j)
+
+        # Fall back to who was speaking at the same time in the previous chunk
+        for label in labels:
+            if label in mapping:
+                continue
+            votes = {j: seconds for j, seconds in overlap_votes.get(label, {}).items() if j not in taken and seconds > 0}
+            if votes:
+                mapping[label] = max(votes, key=votes.get)
+                taken.add(mapping[label])
+
+        for i, label in enumerate(labels):
+            if label not in mapping:
+                mapping[label] = len(self.centroids)
+                self.centroids.append(None)
+                self.weights.append(0.0)
+            if valid[i]:
+                self._update(mapping[label], units[i], durations.get(label, 0.0))
+        return mapping
+
+    def _update(self, j: int, unit: np.ndarray, seconds: float):
+        """Fold a chunk's embedding into a global speaker's centroid, weighted by speech time"""
+        weight = max(seconds, 1e-3)
+        centroid = self.centroids[j]
+        if centroid is None or centroid.shape != unit.shape:
+            merged = unit
+        else:
+            merged = centroid * self.weights[j] + unit * weight
+        norm = np.linalg.norm(merged)
+        self.centroids[j] = merged / norm if norm > 0 else merged
+        self.weights[j] += weight
+
+
+def overlap_votes(local_segments: list, previous_segments: list, start: float, end: float) -> dict:
+    """Seconds each previous-chunk (global) speaker overlaps each local speaker within [start, end)"""
+    local = {}
+    for segment in clip_segments(local_segments, start, end):
+        local.setdefault(segment["speaker"], []).append((segment["start"], segment["end"]))
+    previous = {}
+    for segment in clip_segments(previous_segments, start, end):
+        previous.setdefault(segment["speaker"], []).append((segment["start"], segment["end"]))
+    return {
+        label: {speaker: _overlap(intervals, other) for speaker, other in previous.items()}
+        for label, intervals in local.items()
+    }
@@ -0,0 +1,463 @@
+import os
+import json
+import time
+import sqlite3
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# "memory" keeps jobs in this process only; "sqlite" persists them and lets
+# several uvicorn workers share them
+JOB_STORE = os.getenv("JOB_STORE", "memory").lower()
+JOB_STORE_PATH = os.path.expanduser(os.getenv("JOB_STORE_PATH", "~/.cache/tubescript/jobs.db"))
+
+# Finished jobs and batches (and their transcripts) are purged after this many hours. 0 keeps them forever.
+JOB_TTL_HOURS = float(os.getenv("JOB_TTL_HOURS", "24"))
+
+# Fields stored as their own columns; everything else goes into the JSON data blob
+_JOB_COLUMNS = ["status", "progress", "message", "batch_id", "video_id"]
+_BATCH_COLUMNS = ["status", "progress", "message"]
+
+# Jobs and batches in these states are never purged
+_ACTIVE_STATUSES = ("queued", "processing", "extracting")
+
+
+class BaseStore:
+    """Storage for jobs and batches.
+
+    Job records never include the transcript body; fetch it separately with
+    get_result() so status polling stays cheap.
+    """
+
+    def create_job(self, job_id: str, job: dict):
+        raise NotImplementedError
+
+    def get_job(self, job_id: str):
+        """Return the job record without its transcript, or None"""
+        raise NotImplementedError
+
+    def update_job(self, job_id: str, **fields):
+        raise NotImplementedError
+
+    def get_result(self, job_id: str):
+        """Return the job's transcript, or None"""
+        raise NotImplementedError
+
+    def set_result(self, job_id: str, result: dict):
+        """Store the job's transcript; its partial segments are dropped since the transcript supersedes them"""
+        raise NotImplementedError
+
+    def delete_job(self, job_id: str):
+        raise NotImplementedError
+
+    def append_partial(self, job_id: str, segment: dict) -> int:
+        """Record a segment transcribed while the job is still running; returns its sequence number"""
+        raise NotImplementedError
+
+    def get_partials(self, job_id: str, since: int = 0) -> list:
+        """Partial segments with sequence number >= since, in the order they were recorded"""
+        raise NotImplementedError
+
+    def append_span(self, job_id: str, span: dict):
+        """Record a finished trace span of a job (see modules/tracing.py)"""
+        raise NotImplementedError
+
+    def get_spans(self, job_id: str) -> list:
+        """The job's trace spans, in the order they were recorded"""
+        raise NotImplementedError
+
+    def find_jobs(self, batch_id: str = None, video_id: str = None) -> list:
+        """List job records (without transcripts) matching a batch and/or video ID"""
+        raise NotImplementedError
+
+    def create_batch(self, batch_id: str, batch: dict):
+        raise NotImplementedError
+
+    def get_batch(self, batch_id: str):
+        raise NotImplementedError
+
+    def update_batch(self, batch_id: str, **fields):
+        raise NotImplementedError
+
+    def delete_batch(self, batch_id: str):
+        raise NotImplementedError
+
+    def purge_expired(self, ttl_seconds: float) -> int:
+        """Delete finished jobs and batches last updated more than ttl_seconds ago"""
+        raise NotImplementedError
+
+
+class InMemoryStore(BaseStore):
+    """Plain dictionaries, local to this process"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._results = {}
+        self._partials = {}
+        self._spans = {}
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def _public(self, job_id, job):
+        return dict(job, job_id=job_id)
+
+    def create_job(self, job_id, job):
+        job = dict(job)
+        result = job.pop("result", None)
+        now = time.time()
+        with self._lock:
+            self._jobs[job_id] = dict(job, created_at=now, updated_at=now)
+            if result is not None:
+                self._results[job_id] = result
+
+    def get_job(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return self._public(job_id, job) if job is not None else None
+
+    def update_job(self, job_id, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                job.update(fields, updated_at=time.time())
+
+    def get_result(self, job_id):
+        with self._lock:
+            return self._results.get(job_id)
+
+    def set_result(self, job_id, result):
+        with self._lock:
+            self._results[job_id] = result
+            self._partials.pop(job_id, None)
+            if job_id in self._jobs:
+                self._jobs[job_id]["updated_at"] = time.time()
+
+    def delete_job(self, job_id):
+        with self._lock:
+            self._jobs.pop(job_id, None)
+            self._results.pop(job_id, None)
+            self._partials.pop(job_id, None)
+            self._spans.pop(job_id, None)
+
+    def append_partial(self, job_id, segment):
+        with self._lock:
+            partials = self._partials.setdefault(job_id, [])
+            partials.append(segment)
+            return len(partials) - 1
+
+    def get_partials(self, job_id, since=0):
+        with self._lock:
+            return list(self._partials.get(job_id, [])[since:])
+
+    def append_span(self, job_id, span):
+        with self._lock:
+            self._spans.setdefault(job_id, []).append(span)
+
+    def get_spans(self, job_id):
+        with self._lock:
+            return list(self._spans.get(job_id, []))
+
+    def find_jobs(self, batch_id=None, video_id=None):
+        with self._lock:
+            return [
+                self._public(job_id, job) for job_id, job in self._jobs.items()
+                if (batch_id is None or job.get("batch_id") == batch_id)
+                and (video_id is None or job.get("video_id") == video_id)
+            ]
+
+    def create_batch(self, batch_id, batch):
+        now = time.time()
+        with self._lock:
+            self._batches[batch_id] = dict(batch, created_at=now, updated_at=now)
+
+    def get_batch(self, batch_id):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            return dict(batch, batch_id=batch_id) if batch is not None else None
+
+    def update_batch(self, batch_id, **fields):
+        with self._lock:
+            batch = self._batches.get(batch_id)
+            if batch is not None:
+                batch.update(fields, updated_at=time.time())
+
+    def delete_batch(self, batch_id):
+        with self._lock:
+            self._batches.pop(batch_id, None)
+
+    def purge_expired(self, ttl_seconds):
+        cutoff = time.time() - ttl_seconds
+        with self._lock:
+            expired_jobs = [
+                job_id for job_id, job in self._jobs.items()
+                if job["updated_at"] < cutoff and job["status"] not in _ACTIVE_STATUSES
+            ]
+            for job_id in expired_jobs:
+                del self._jobs[job_id]
+                self._results.pop(job_id, None)
+                self._partials.pop(job_id, None)
+                self._spans.pop(job_id, None)
+            expired_batches = [
+                batch_id for batch_id, batch in self._batches.items()
+                if batch["updated_at"] < cutoff and batch["status"] not in _ACTIVE_STATUSES
+            ]
+            for batch_id in expired_batches:
+                del self._batches[batch_id]
+        return len(expired_jobs) + len(expired_batches)
+
+
+class SQLiteStore(BaseStore):
+    """SQLite database in WAL mode, shareable between processes on one host"""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+
+        conn = self._conn()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                batch_id TEXT,
+                video_id TEXT,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                data TEXT NOT NULL DEFAULT '{}',
+                result TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS jobs_batch_id ON jobs (batch_id);
+            CREATE INDEX IF NOT EXISTS jobs_video_id ON jobs (video_id);
+            CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at);
+            CREATE TABLE IF NOT EXISTS partial_segments (
+                job_id TEXT NOT NULL,
+                seq INTEGER NOT NULL,
+                segment TEXT NOT NULL,
+                PRIMARY KEY (job_id, seq)
+            );
+            CREATE TABLE IF NOT EXISTS trace_spans (
+                job_id TEXT NOT NULL,
+                seq INTEGER PRIMARY KEY AUTOINCREMENT,
+                span TEXT NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS trace_spans_job_id ON trace_spans (job_id);
+            CREATE TABLE IF NOT EXISTS batches (
+                batch_id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                progress REAL NOT NULL DEFAULT 0,
+                message TEXT NOT NULL DEFAULT '',
+                data TEXT NOT NULL DEFAULT '{}',
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS batches_updated_at ON batches (updated_at);
+        """)
+
+    def _conn(self):
+        """One connection per thread, in autocommit mode (see _write())"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _write(self):
+        """A write transaction holding the database's write lock from the start.
+
+        BEGIN IMMEDIATE makes read-modify-write sequences atomic across every
+        thread and process sharing the database, not just within this one.
+        """
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def _split(self, record: dict, columns: list):
+        values = {column: record[column] for column in columns if column in record}
+        data = {key: value for key, value in record.items() if key not in columns}
+        return values, data
+
+    def _row_to_record(self, row, columns: list, id_column: str) -> dict:
+        record = json.loads(row["data"])
+        for column in columns:
+            record[column] = row[column]
+        record[id_column] = row[id_column]
+        record["created_at"] = row["created_at"]
+        record["updated_at"] = row["updated_at"]
+        return record
+
+    def _update(self, table: str, id_column: str, record_id: str, columns: list, fields: dict):
+        values, data = self._split(fields, columns)
+        with self._write() as conn:
+            if data:
+                row = conn.execute(f"SELECT data FROM {table} WHERE {id_column} = ?", (record_id,)).fetchone()
+                if row is None:
+                    return
+                merged = json.loads(row["data"])
+                merged.update(data)
+                values["data"] = json.dumps(merged)
+            values["updated_at"] = time.time()
+            assignments = ", ".join(f"{column} = ?" for column in values)
+            conn.execute(
+                f"UPDATE {table} SET {assignments} WHERE {id_column} = ?",
+                (*values.values(), record_id)
+            )
+
+    def create_job(self, job_id, job):
+        job = dict(job)
+        result = job.pop("result", None)
+        values, data = self._split(job, _JOB_COLUMNS)
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, batch_id, video_id, status, progress, message, data, result, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, values.get("batch_id"), values.get("video_id"), values.get("status", "queued"),
+                 values.get("progress", 0.0), values.get("message", ""), json.dumps(data),
+                 json.dumps(result) if result is not None else None, now, now)
+            )
+
+    def get_job(self, job_id):
+        row = self._conn().execute(
+            "SELECT job_id, batch_id, video_id, status, progress, message, data, created_at, updated_at "
+            "FROM jobs WHERE job_id = ?", (job_id,)
+        ).fetchone()
+        return self._row_to_record(row, _JOB_COLUMNS, "job_id") if row else None
+
+    def update_job(self, job_id, **fields):
+        self._update("jobs", "job_id", job_id, _JOB_COLUMNS, fields)
+
+    def get_result(self, job_id):
+        row = self._conn().execute("SELECT result FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        if row is None or row["result"] is None:
+            return None
+        return json.loads(row["result"])
+
+    def set_result(self, job_id, result):
+        with self._write() as conn:
+            conn.execute(
+                "UPDATE jobs SET result = ?, updated_at = ? WHERE job_id = ?",
+                (json.dumps(result), time.time(), job_id)
+            )
+            conn.execute("DELETE FROM partial_segments WHERE job_id = ?", (job_id,))
+
+    def delete_job(self, job_id):
+        with self._write() as conn:
+            conn.execute("DELETE FROM jobs WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM partial_segments WHERE job_id = ?", (job_id,))
+            conn.execute("DELETE FROM trace_spans WHERE job_id = ?", (job_id,))
+
+    def append_partial(self, job_id, segment):
+        with self._write() as conn:
+            row = conn.execute(
+                "SELECT COALESCE(MAX(seq) + 1, 0) AS seq FROM partial_segments WHERE job_id = ?", (job_id,)
+            ).fetchone()
+            conn.execute(
+                "INSERT INTO partial_segments (job_id, seq, segment) VALUES (?, ?, ?)",
+                (job_id, row["seq"], json.dumps(segment))
+            )
+        return row["seq"]
+
+    def get_partials(self, job_id, since=0):
+        rows = self._conn().execute(
+            "SELECT segment FROM partial_segments WHERE job_id = ? AND seq >= ? ORDER BY seq",
+            (job_id, since)
+        ).fetchall()
+        return [json.loads(row["segment"]) for row in rows]
+
+    def append_span(self, job_id, span):
+        with self._write() as conn:
+            conn.execute("INSERT INTO trace_spans (job_id, span) VALUES (?, ?)", (job_id, json.dumps(span)))
+
+    def get_spans(self, job_id):
+        rows = self._conn().execute(
+            "SELECT span FROM trace_spans WHERE job_id = ? ORDER BY seq", (job_id,)
+        ).fetchall()
+        return [json.loads(row["span"]) for row in rows]
+
+    def find_jobs(self, batch_id=None, video_id=None):
+        conditions = []
+        params = []
+        if batch_id is not None:
+            conditions.append("batch_id = ?")
+            params.append(batch_id)
+        if video_id is not None:
+            conditions.append("video_id = ?")
+            params.append(video_id)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        rows = self._conn().execute(
+            "SELECT job_id, batch_id, video_id, status, progress, message, data, created_at, updated_at "
+            f"FROM jobs {where} ORDER BY created_at", params
+        ).fetchall()
+        return [self._row_to_record(row, _JOB_COLUMNS, "job_id") for row in rows]
+
+    def create_batch(self, batch_id, batch):
+        values, data = self._split(batch, _BATCH_COLUMNS)
+        now = time.time()
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO batches (batch_id, status, progress, message, data, created_at, updated_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (batch_id, values.get("status", "queued"), values.get("progress", 0.0),
+                 values.get("message", ""), json.dumps(data), now, now)
+            )
+
+    def get_batch(self, batch_id):
+        row = self._conn().execute("SELECT * FROM batches WHERE batch_id = ?", (batch_id,)).fetchone()
+        return self._row_to_record(row, _BATCH_COLUMNS, "batch_id") if row else None
+
+    def update_batch(self, batch_id, **fields):
+        self._update("batches", "batch_id", batch_id, _BATCH_COLUMNS, fields)
+
+    def delete_batch(self, batch_id):
+        with self._write() as conn:
+            conn.execute("DELETE FROM batches WHERE batch_id = ?", (batch_id,))
+
+    def purge_expired(self, ttl_seconds):
+        cutoff = time.time() - ttl_seconds
+        placeholders = ", ".join("?" for _ in _ACTIVE_STATUSES)
+        with self._write() as conn:
+            conn.execute(
+                "DELETE FROM partial_segments WHERE job_id IN ("
+                f"SELECT job_id FROM jobs WHERE updated_at < ? AND status NOT IN ({placeholders}))",
+                (cutoff, *_ACTIVE_STATUSES)
+            )
+            conn.execute(
+                "DELETE FROM trace_spans WHERE job_id IN ("
+                f"SELECT job_id FROM jobs WHERE updated_at < ? AND status NOT IN ({placeholders}))",
+                (cutoff, *_ACTIVE_STATUSES)
+            )
+            jobs = conn.execute(
+                f"DELETE FROM jobs WHERE updated_at < ? AND status NOT IN ({placeholders})",
+                (cutoff, *_ACTIVE_STATUSES)
+            ).rowcount
+            batches = conn.execute(
+                f"DELETE FROM batches WHERE updated_at < ? AND status NOT IN ({placeholders})",
+                (cutoff, *_ACTIVE_STATUSES)
+            ).rowcount
+        return jobs + batches
+
+
+def create_store() -> BaseStore:
+    """Create the store selected by JOB_STORE"""
+    if JOB_STORE == "sqlite":
+        print(f"Using SQLite job store at {JOB_STORE_PATH}")
+        return SQLiteStore(JOB_STORE_PATH)
+    if JOB_STORE != "memory":
+        raise ValueError(f"Unknown JOB_STORE '{JOB_STORE}' (expected 'memory' or 'sqlite')")
+    return InMemoryStore()
@@ -0,0 +1,93 @@
+import time
+from contextlib import contextmanager
+
+# Span names of whole pipeline stages; other spans are queue waits or parts of a stage
+STAGES = ("download", "convert", "diarize", "transcribe", "assemble")
+
+
+class Tracer:
+    """Records the trace spans of one job in the job store.
+
+    A span is {"name", "track", "start", "end", "duration", "attributes"} with
+    wall-clock times in seconds. `track` groups spans that run one after another
+    (pipeline, queue, diarization, transcription), so stages that overlap in the
+    concurrent pipeline mode end up on different tracks.
+    """
+
+    def __init__(self, store, job_id: str):
+        self.store = store
+        self.job_id = job_id
+
+    def record(self, name: str, start: float, end: float, track: str = "pipeline", **attributes):
+        self.store.append_span(self.job_id, {
+            "name": name,
+            "track": track,
+            "start": start,
+            "end": end,
+            "duration": end - start,
+            "attributes": attributes,
+        })
+
+    @contextmanager
+    def span(self, name: str, track: str = "pipeline", **attributes):
+        """Record the block as a span; the yielded attributes dict can be added to.
+
+        Spans of blocks that raise are recorded too, with an `error` attribute.
+        """
+        start = time.time()
+        try:
+            yield attributes
+        except Exception as e:
+            attributes["error"] = str(e)
+            raise
+        finally:
+            self.record(name, start, time.time(), track, **attributes)
+
+
+def summarize_spans(spans: list, slowest: int = 5) -> dict:
+    """Seconds per pipeline stage and per queue, and the slowest chunks and segments"""
+    stages = {}
+    waits = {}
+    items = []
+    for span in spans:
+        if span["name"] in STAGES:
+            stages[span["name"]] = stages.get(span["name"], 0.0) + span["duration"]
+        elif span["track"] == "queue":
+            waits[span["name"]] = waits.get(span["name"], 0.0) + span["duration"]
+        else:
+            items.append(span)
+    items.sort(key=lambda span: span["duration"], reverse=True)
+    return {"stages": stages, "waits": waits, "slowest": items[:slowest]}
+
+
+def chrome_trace(spans: list, job_id: str) -> dict:
+    """Spans as a Chrome trace-event file (chrome://tracing, Perfetto).
+
+    Each track becomes a thread of one process; timestamps are microseconds
+    since the job's first span.
+    """
+    origin = min((span["start"] for span in spans), default=0.0)
+    tracks = {}
+    events = []
+    for span in spans:
+        tid = tracks.setdefault(span["track"], len(tracks) + 1)
+        events.append({
+            "name": span["name"],
+            "cat": span["track"],
+            "ph": "X",
+            "ts": round((span["start"] - origin) * 1e6),
+            "dur": round(span["duration"] * 1e6),
+            "pid": 1,
+            "tid": tid,
+            "args": span["attributes"],
+        })
+
+    metadata = [{"name": "process_name", "ph": "M", "pid": 1, "args": {"name": f"job {job_id}"}}]
+    for track, tid in tracks.items():
+        metadata.append({"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": track}})
+
+    return {
+        "traceEvents": metadata + events,
+        "displayTimeUnit": "ms",
+        "otherData": {"job_id": job_id, "start_time": origin},
+    }
@@ -4,191 +4,371 @@ import torch
 import numpy as np
 import whisper
 import time
-from pydub import AudioSegment
+from typing import Optional
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
 from utils.audio import start_gpu_monitoring
+from modules.model_registry import acquire_model, release_model, model_lock
+from modules.audio_store import is_pcm, open_pcm
+from modules.vad import compact_audio, remap_words
+from modules.metrics import StageTimer
+from modules.transcription_engines import get_engine, PRECISIONS, SAMPLE_RATE, BATCH_MAX_SECONDS
 
-async def transcribe_segments(audio_path: str, segments: list, progress_callback=None):
-    """Transcribe each diarized segment using Whisper"""
+# Load environment variables
+load_dotenv()
+
+# Speech recognition backend (see modules/transcription_engines.py):
+#   whisper        - openai-whisper in PyTorch (default)
+#   faster-whisper - CTranslate2 with int8 CPU kernels and batched decoding (optional package)
+#   fake           - deterministic output without a model, for tests
+TRANSCRIPTION_ENGINE = os.getenv("TRANSCRIPTION_ENGINE", "whisper").lower()
+
+# Whisper model size used for transcription (a request can pick another)
+WHISPER_MODEL = os.getenv("WHISPER_MODEL", "large")
+
+# Numeric precision Whisper runs in:
+#   auto - fp16 on CUDA; on the CPU fp32 (whisper) or int8 (faster-whisper)
+#   fp32 - full precision everywhere
+#   int8 - int8 linear layers (dynamically quantized with whisper; CPU only there, fp16 on CUDA)
+#   bf16 - bfloat16 on the CPU (needs AVX512-BF16/AMX for a speedup; fp16 on CUDA with whisper)
+WHISPER_PRECISION = os.getenv("WHISPER_PRECISION", "auto").lower()
+WHISPER_PRECISIONS = PRECISIONS
+
+# Number of short segments decoded together in one batch (1 = one segment at a time)
+WHISPER_BATCH_SIZE = int(os.getenv("WHISPER_BATCH_SIZE", "1"))
+
+# Dedicated workers for Whisper so transcription can overlap with diarization
+transcription_executor = ThreadPoolExecutor(thread_name_prefix="transcription")
+
+def decode_lock(engine, model_key: tuple):
+    """Held around every call into a shared model.
+
+    openai-whisper installs KV-cache and alignment hooks on the model module
+    for each decode, so two decodes on one model at once would see each
+    other's tensors; those run one at a time per model. Thread-safe engines
+    are not serialized.
+    """
+    return nullcontext() if engine.thread_safe else model_lock(*model_key)
+
+def available_models(engine: Optional[str] = None) -> list:
+    """Model names the engine can load (empty if it accepts any name)"""
+    return get_engine(engine or TRANSCRIPTION_ENGINE).available_models()
+
+def resolve_precision(precision: Optional[str] = None, engine: Optional[str] = None) -> str:
+    """The precision a model actually runs in ("fp16", "fp32", "int8" or "bf16")"""
+    engine = get_engine(engine or TRANSCRIPTION_ENGINE)
+    precision = (precision or WHISPER_PRECISION).lower()
+    if precision not in WHISPER_PRECISIONS:
+        raise ValueError(f"Unknown Whisper precision '{precision}' (expected one of: {', '.join(WHISPER_PRECISIONS)})")
+    return engine.resolve_precision(precision, engine.device())
+
+def get_whisper_model(model_name: Optional[str] = None, precision: Optional[str] = None, engine: Optional[str] = None):
+    """Get the shared speech recognition model for this process from the model registry.
+
+    `model_name` defaults to WHISPER_MODEL, `precision` to WHISPER_PRECISION and
+    `engine` to TRANSCRIPTION_ENGINE. Returns (model, registry_key); the key's
+    first item is the engine name. Pass the key to release_model() when done.
+    """
+    engine = get_engine(engine or TRANSCRIPTION_ENGINE)
+    model_name = model_name or WHISPER_MODEL
+    device = engine.device()
+    precision = resolve_precision(precision, engine.name)
+
+    key = (engine.name, model_name, device, precision)
+    return acquire_model(*key, loader=lambda: engine.load(model_name, device, precision)), key
+
+def load_audio_array(audio_path: str) -> np.ndarray:
+    """Get an audio file as a 16 kHz mono float32 array.
+
+    PCM files from the audio store are memory-mapped rather than decoded; any
+    other format is decoded once with ffmpeg.
+    """
+    if is_pcm(audio_path):
+        return open_pcm(audio_path)
+    return whisper.load_audio(audio_path, sr=SAMPLE_RATE)
+
+def slice_audio(audio: np.ndarray, start: float, end: float) -> np.ndarray:
+    """Return the samples between start and end (seconds) as a view into `audio`"""
+    start_sample = max(0, int(start * SAMPLE_RATE))
+    end_sample = min(len(audio), int(end * SAMPLE_RATE))
+    return audio[start_sample:max(start_sample, end_sample)]
+
+def model_device_type(model) -> Optional[str]:
+    """Device type a PyTorch model's weights are on (None for models of other engines)"""
+    if isinstance(model, torch.nn.Module):
+        return next(model.parameters()).device.type
+    return None
+
+def print_cuda_diagnostics(model):
+    """Print detailed CUDA info for the Whisper model"""
+    if torch.cuda.is_available():
+        print("\n===== CUDA DIAGNOSTICS FOR WHISPER =====")
+        print(f"CUDA Device: {torch.cuda.get_device_name(0)}")
+        print(f"CUDA Capability: {torch.cuda.get_device_capability(0)}")
+        print(f"CUDA Memory Total: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB")
+        print(f"CUDA Memory Allocated: {torch.cuda.memory_allocated() / 1024**3:.2f} GB")
+        print(f"CUDA Memory Reserved: {torch.cuda.memory_reserved() / 1024**3:.2f} GB")
+
+        # Verify model is on CUDA
+        device_type = model_device_type(model)
+        print(f"Whisper model is on device: {device_type or 'n/a (not a PyTorch model)'}")
+        if device_type not in ("cuda", None):
+            print("WARNING: Whisper model is NOT on CUDA despite CUDA being available!")
+    else:
+        print("CUDA is not available - using CPU for Whisper")
+
+def plan_batches(slices: list, batch_size: int) -> list:
+    """Group segment indices into work units.
+
+    Non-empty slices of up to 30 seconds are packed into batches of `batch_size`;
+    longer slices get a unit of their own. Returns a list of (indices, batched).
+    """
+    units = []
+    pending = []
+    max_samples = BATCH_MAX_SECONDS * SAMPLE_RATE
+    for i, audio in enumerate(slices):
+        if len(audio) == 0:
+            continue
+        if batch_size > 1 and len(audio) <= max_samples:
+            pending.append(i)
+            if len(pending) == batch_size:
+                units.append((pending, True))
+                pending = []
+        else:
+            units.append(([i], False))
+    if pending:
+        units.append((pending, True))
+
+    # Keep units roughly in timeline order so progress reads naturally
+    units.sort(key=lambda unit: unit[0][0])
+    return units
+
+async def transcribe_segments(audio_path: str, segments: list, progress_callback=None,
+                              batch_size: int = None, word_timestamps: bool = False,
+                              segment_callback=None, model_name: Optional[str] = None,
+                              precision: Optional[str] = None, span_callback=None):
+    """Transcribe each diarized segment using Whisper.
+
+    `model_name` and `precision` select the Whisper model (see get_whisper_model).
+
+    With batch_size > 1 (default WHISPER_BATCH_SIZE), short segments are decoded
+    together in batches instead of one at a time. When word_timestamps is set,
+    each returned segment carries a "words" list on the original timeline.
+    segment_callback(index, segment), if given, receives each transcribed
+    segment as soon as it is ready, in completion order. span_callback(name,
+    start, end, **attributes), if given, receives the wall-clock time each
+    segment (or batch of segments) took, for the job's trace.
+    """
     loop = asyncio.get_event_loop()
-    
-    # Start GPU monitoring if CUDA is available
+    if batch_size is None:
+        batch_size = WHISPER_BATCH_SIZE
+
+    # Decode the audio once to a 16 kHz mono float32 array in a thread pool;
+    # segments are then sliced out of it as views, without temp files
+    audio = await loop.run_in_executor(None, load_audio_array, audio_path)
+    slices = [slice_audio(audio, segment["start"], segment["end"]) for segment in segments]
+
+    # Get the shared Whisper model in a thread pool (only loads on first use)
+    model, model_key = await loop.run_in_executor(transcription_executor, get_whisper_model, model_name, precision)
+    engine = get_engine(model_key[0])
+    # Timed from here so the stage metrics don't include loading the model
+    timer = StageTimer("transcribe")
+
+    # Start GPU monitoring if CUDA is available; stopped in the finally block below
     if torch.cuda.is_available():
         print("\nStarting GPU monitoring during transcription...")
         stop_monitoring = start_gpu_monitoring(interval=10.0)  # Check every 10 seconds
     else:
         stop_monitoring = lambda: None
-    
-    def load_audio():
-        # Load the audio file
-        return AudioSegment.from_wav(audio_path)
-    
-    # Load the audio file in a thread pool
-    audio = await loop.run_in_executor(None, load_audio)
-    
-    def load_model():
-        # Load the Whisper model
-        # Use large model for high accuracy
-        print("Loading Whisper large model...")
-        
-        # Check CUDA availability and device properties
-        if torch.cuda.is_available():
-            cuda_device = torch.cuda.current_device()
-            print(f"CUDA available: Using {torch.cuda.get_device_name(cuda_device)}")
-            print(f"CUDA memory allocated: {torch.cuda.memory_allocated(cuda_device) / 1024**2:.2f} MB")
-            # Enable TensorFloat32 precision if available (for Ampere+ GPUs)
-            if torch.cuda.get_device_capability(cuda_device)[0] >= 8:
-                print("Enabling TensorFloat32 for faster inference")
-                torch.set_float32_matmul_precision('high')
-        else:
-            print("WARNING: CUDA not available, using CPU (will be much slower)")
-        
-        # Load model (directly specifying device to avoid double transfer)
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        model = whisper.load_model("large", device=device)
-        print(f"Whisper large model loaded successfully on {device}")
-        
-        return model
-    
-    # Load the Whisper model in a thread pool
-    model = await loop.run_in_executor(None, load_model)
-    
-    # Process each segment
-    transcribed_segments = []
-    
-    # Track total processing time
-    whisper_start_time = time.time()
-    
-    for i, segment in enumerate(segments):
-        # Get the segment timing
-        start_ms = int(segment["start"] * 1000)
-        end_ms = int(segment["end"] * 1000)
-        
-        # Extract the audio segment
-        segment_audio = audio[start_ms:end_ms]
-        
-        # Save to a temporary file
-        temp_path = f"temp_segment_{i}.wav"
-        
-        def process_segment():
-            # Export segment to a temporary file
-            segment_audio.export(temp_path, format="wav")
-            
-            # Detailed CUDA diagnostics
-            is_cuda_available = torch.cuda.is_available()
-            if i == 0:  # Only for first segment
-                # Print detailed CUDA info
-                if is_cuda_available:
-                    print("\n===== CUDA DIAGNOSTICS FOR WHISPER =====")
-                    print(f"CUDA Device: {torch.cuda.get_device_name(0)}")
-                    print(f"CUDA Capability: {torch.cuda.get_device_capability(0)}")
-                    print(f"CUDA Memory Total: {torch.cuda.get_device_properties(0).total_memory / 1024**3:.2f} GB")
-                    print(f"CUDA Memory Allocated: {torch.cuda.memory_allocated() / 1024**3:.2f} GB")
-                    print(f"CUDA Memory Reserved: {torch.cuda.memory_reserved() / 1024**3:.2f} GB")
-                    
-                    # Verify model is on CUDA
-                    device_type = next(model.parameters()).device.type
-                    print(f"Whisper model is on device: {device_type}")
-                    if device_type != "cuda":
-                        print("WARNING: Whisper model is NOT on CUDA despite CUDA being available!")
-                else:
-                    print("CUDA is not available - using CPU for Whisper")
-            
-            # Measure transcription time and memory usage
-            start_time = time.time()
-            if is_cuda_available:
-                # Record memory before transcription
-                mem_before = torch.cuda.memory_allocated() / 1024**2
-                
-                # Setup CUDA timing events
-                start_event = torch.cuda.Event(enable_timing=True)
-                end_event = torch.cuda.Event(enable_timing=True)
-                start_event.record()
-            
-            # Transcribe with Whisper
-            try:
-                result = model.transcribe(
-                    temp_path,
-                    language="en",  # Can be made configurable for other languages
-                    fp16=is_cuda_available,  # Enable half-precision for GPU speedup
-                    no_speech_threshold=0.6
-                )
-                
-                # Record timing information
-                elapsed_time = time.time() - start_time
-                
+
+    def make_segment(segment, result):
+        # Add the transcription to the diarization segment
+        transcribed_segment = segment.copy()
+        transcribed_segment["text"] = result["text"]
+        if word_timestamps:
+            transcribed_segment["words"] = result["words"]
+        return transcribed_segment
+
+    try:
+        # Zero-length segments have nothing to transcribe
+        results = [{"text": "", "words": []} for _ in segments]
+        completed = len(segments) - sum(1 for audio_slice in slices if len(audio_slice) > 0)
+
+        # Track total processing time
+        whisper_start_time = time.time()
+        print_cuda_diagnostics(model)
+        if batch_size > 1:
+            print(f"Batched transcription enabled (batch size {batch_size})")
+
+        for indices, batched in plan_batches(slices, batch_size):
+            unit_audio = [slices[i] for i in indices]
+            unit_offsets = [segments[i]["start"] for i in indices]
+            audio_duration = sum(len(audio_slice) for audio_slice in unit_audio) / SAMPLE_RATE
+
+            def process_unit():
+                # Measure transcription time and memory usage
+                is_cuda_available = torch.cuda.is_available()
+                start_time = time.time()
                 if is_cuda_available:
-                    # Record CUDA-specific timing and memory
-                    end_event.record()
-                    torch.cuda.synchronize()
-                    cuda_time_ms = start_event.elapsed_time(end_event)
-                    mem_after = torch.cuda.memory_allocated() / 1024**2
-                    mem_diff = mem_after - mem_before
-                    
+                    # Record memory before transcription
+                    mem_before = torch.cuda.memory_allocated() / 1024**2
+
+                    # Setup CUDA timing events
+                    start_event = torch.cuda.Event(enable_timing=True)
+                    end_event = torch.cuda.Event(enable_timing=True)
+                    start_event.record()
+
+                # Transcribe with Whisper
+                try:
+                    if batched:
+                        unit_results = engine.transcribe_batch(model, unit_audio, unit_offsets, word_timestamps)
+                    else:
+                        unit_results = [engine.transcribe(model, unit_audio[0], unit_offsets[0], word_timestamps)]
+
+                    # Record timing information
+                    elapsed_time = time.time() - start_time
+
                     # Log detailed information (limit to avoid spam)
-                    if i % 5 == 0 or i == 0:  # Log every 5th segment and the first one
-                        segment_duration_sec = (end_ms - start_ms) / 1000
-                        print(f"Segment {i+1}/{len(segments)}: {segment_duration_sec:.2f}s audio processed in {cuda_time_ms:.2f}ms on CUDA "
-                              f"({segment_duration_sec*1000/cuda_time_ms:.2f}x realtime)")
-                        print(f"  Memory change: {mem_diff:.2f} MB, Total allocated: {mem_after:.2f} MB")
-                else:
-                    # CPU timing
-                    if i % 5 == 0 or i == 0:
-                        segment_duration_sec = (end_ms - start_ms) / 1000
-                        print(f"Segment {i+1}/{len(segments)}: {segment_duration_sec:.2f}s audio processed in {elapsed_time*1000:.2f}ms on CPU "
-                              f"({segment_duration_sec/elapsed_time:.2f}x realtime)")
-                
-            except Exception as e:
-                print(f"Error during transcription: {str(e)}")
-                raise
-            
-            # Clean up temporary file
-            if os.path.exists(temp_path):
-                os.remove(temp_path)
-                
-            return result
-        
-        # Process segment in a thread pool
-        print(f"Processing segment {i+1}/{len(segments)}: {start_ms}ms to {end_ms}ms (duration: {end_ms-start_ms}ms)")
-        result = await loop.run_in_executor(None, process_segment)
-        
+                    if batched or indices[0] % 5 == 0:
+                        label = f"Batch of {len(indices)} segments" if batched else f"Segment {indices[0]+1}/{len(segments)}"
+                        if is_cuda_available:
+                            # Record CUDA-specific timing and memory
+                            end_event.record()
+                            torch.cuda.synchronize()
+                            cuda_time_ms = start_event.elapsed_time(end_event)
+                            mem_after = torch.cuda.memory_allocated() / 1024**2
+                            mem_diff = mem_after - mem_before
+                            print(f"{label}: {audio_duration:.2f}s audio processed in {cuda_time_ms:.2f}ms on CUDA "
+                                  f"({audio_duration*1000/cuda_time_ms:.2f}x realtime)")
+                            print(f"  Memory change: {mem_diff:.2f} MB, Total allocated: {mem_after:.2f} MB")
+                        else:
+                            # CPU timing
+                            print(f"{label}: {audio_duration:.2f}s audio processed in {elapsed_time*1000:.2f}ms on CPU "
+                                  f"({audio_duration/elapsed_time:.2f}x realtime)")
+
+                except Exception as e:
+                    print(f"Error during transcription: {str(e)}")
+                    raise
+
+                return unit_results
+
+            def run_unit():
+                # Timed inside the lock, so waiting for another job's decode isn't counted
+                with decode_lock(engine, model_key):
+                    return process_unit()
+
+            # Process the unit in a thread pool
+            first = segments[indices[0]]
+            print(f"Processing segment{'s' if batched else ''} {', '.join(str(i+1) for i in indices)}/{len(segments)}: "
+                  f"starting at {int(first['start']*1000)}ms ({audio_duration*1000:.0f}ms of audio)")
+            unit_start = time.time()
+            unit_results = await loop.run_in_executor(transcription_executor, run_unit)
+            if span_callback:
+                span_callback(
+                    f"batch of {len(indices)} segments" if batched else f"segment {indices[0]+1}",
+                    unit_start, time.time(),
+                    segments=[i + 1 for i in indices],
+                    audio_start=first["start"],
+                    audio_seconds=audio_duration,
+                    speakers=sorted({segments[i].get("speaker", "") for i in indices})
+                )
+
+            for i, result in zip(indices, unit_results):
+                results[i] = result
+                completed += 1
+                print(f"Segment {i+1}/{len(segments)} processed: '{result['text'][:50]}...' (if longer)")
+                if segment_callback:
+                    segment_callback(i, make_segment(segments[i], result))
+
+            # Update progress if callback provided
+            if progress_callback:
+                progress_callback(completed)
+
         # Add transcription to segment data
-        transcribed_segment = segment.copy()
-        transcribed_segment["text"] = result["text"].strip()
-        print(f"Segment {i+1}/{len(segments)} processed: '{result['text'].strip()[:50]}...' (if longer)")
-        
-        # Update progress if callback provided
-        if progress_callback:
-            progress_callback(i + 1)
-        
-        transcribed_segments.append(transcribed_segment)
-    
-    # Stop GPU monitoring
-    if torch.cuda.is_available():
-        stop_monitoring()
-        
+        transcribed_segments = [
+            make_segment(segment, result) for segment, result in zip(segments, results)
+        ]
+
         # Calculate overall statistics
         total_time = time.time() - whisper_start_time
         total_audio_duration = sum([(segment["end"] - segment["start"]) for segment in segments])
-        
+
         print("\n===== WHISPER PROCESSING COMPLETED =====")
         print(f"Processed {len(segments)} segments totaling {total_audio_duration:.2f} seconds")
         print(f"Total processing time: {total_time:.2f} seconds")
-        print(f"Realtime factor: {total_audio_duration/total_time:.2f}x")
-        
-        # Check if still using CUDA and report memory stats
-        device_type = next(model.parameters()).device.type
-        if device_type == "cuda":
-            print(f"Model is on CUDA: Yes")
-            print(f"Final CUDA memory allocated: {torch.cuda.memory_allocated() / 1024**2:.2f} MB")
-            print(f"Final CUDA memory reserved: {torch.cuda.memory_reserved() / 1024**2:.2f} MB")
-            print(f"Peak CUDA memory allocated: {torch.cuda.max_memory_allocated() / 1024**2:.2f} MB")
-            
-            # Clear GPU memory
-            del model
-            torch.cuda.empty_cache()
-            print(f"CUDA memory after cleanup: {torch.cuda.memory_allocated() / 1024**2:.2f} MB")
-            print("===== GPU PROCESSING COMPLETE =====\n")
-        else:
-            print("Model was on CPU at end of processing")
-    
+        print(f"Throughput: {len(segments)/max(total_time, 1e-6):.2f} segments/second")
+        print(f"Realtime factor: {total_audio_duration/max(total_time, 1e-6):.2f}x")
+        timer.finish(audio_seconds=total_audio_duration)
+
+        if torch.cuda.is_available():
+            # Check if still using CUDA and report memory stats
+            device_type = model_device_type(model)
+            if device_type == "cuda":
+                print(f"Model is on CUDA: Yes")
+                print(f"Final CUDA memory allocated: {torch.cuda.memory_allocated() / 1024**2:.2f} MB")
+                print(f"Final CUDA memory reserved: {torch.cuda.memory_reserved() / 1024**2:.2f} MB")
+                print(f"Peak CUDA memory allocated: {torch.cuda.max_memory_allocated() / 1024**2:.2f} MB")
+                print("===== GPU PROCESSING COMPLETE =====\n")
+            else:
+                print("Model was on CPU at end of processing")
+    finally:
+        # Stop GPU monitoring even when transcription fails
+        stop_monitoring()
+        # Hand the model back to the registry; it stays resident for the next job
+        release_model(*model_key)
+
     return transcribed_segments
+
+async def transcribe_full(audio_path: str, progress_callback=None, speech_regions: list = None,
+                          model_name: Optional[str] = None, precision: Optional[str] = None) -> list:
+    """Transcribe the whole file in a single Whisper pass with word timestamps.
+
+    With speech_regions (from vad.detect_speech) only those parts of the audio
+    are transcribed. Returns the words on the original timeline; speakers are
+    assigned afterwards from the diarization segments (see
+    assembler.assign_speakers_to_words).
+    """
+    loop = asyncio.get_event_loop()
+
+    # Decode the audio once to a 16 kHz mono float32 array in a thread pool
+    audio = await loop.run_in_executor(None, load_audio_array, audio_path)
+    timeline = None
+    if speech_regions is not None:
+        # Transcribe the speech regions back to back, then map the words back
+        audio, timeline = compact_audio(audio, speech_regions)
+
+    # Get the shared Whisper model in a thread pool (only loads on first use)
+    model, model_key = await loop.run_in_executor(transcription_executor, get_whisper_model, model_name, precision)
+    engine = get_engine(model_key[0])
+    # Timed from here so the stage metrics don't include loading the model
+    timer = StageTimer("transcribe")
+
+    try:
+        print_cuda_diagnostics(model)
+        audio_duration = len(audio) / SAMPLE_RATE
+        print(f"Transcribing {audio_duration:.2f}s of audio in a single pass...")
+
+        def run_full():
+            with decode_lock(engine, model_key):
+                return engine.transcribe(model, audio, 0.0, word_timestamps=True)
+
+        whisper_start_time = time.time()
+        result = await loop.run_in_executor(transcription_executor, run_full)
+        total_time = time.time() - whisper_start_time
+
+        print("\n===== WHISPER PROCESSING COMPLETED =====")
+        print(f"Transcribed {len(result['words'])} words from {audio_duration:.2f} seconds of audio")
+        print(f"Total processing time: {total_time:.2f} seconds")
+        print(f"Realtime factor: {audio_duration/max(total_time, 1e-6):.2f}x")
+        timer.finish(audio_seconds=audio_duration)
+    finally:
+        # Hand the model back to the registry; it stays resident for the next job
+        release_model(*model_key)
+
+    if progress_callback:
+        progress_callback(1.0)
+
+    if timeline is not None:
+        return remap_words(result["words"], timeline)
+    return result["words"]
@@ -0,0 +1,334 @@
+import os
+import torch
+import numpy as np
+import whisper
+from contextlib import nullcontext
+from typing import Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Whisper expects 16 kHz mono input
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE
+
+# Segments up to one Whisper window (30 seconds) can be packed into a batch
+BATCH_MAX_SECONDS = whisper.audio.CHUNK_LENGTH
+
+# Windows faster-whisper's batched pipeline decodes together on long audio
+FASTER_WHISPER_BATCH_SIZE = int(os.getenv("FASTER_WHISPER_BATCH_SIZE", "8"))
+
+# Precision names a request or WHISPER_PRECISION may use (see TranscriptionEngine.resolve_precision)
+PRECISIONS = ["auto", "fp32", "int8", "bf16"]
+
+
+class TranscriptionEngine:
+    """A speech recognition backend.
+
+    An engine loads models and transcribes 16 kHz mono float32 arrays. Loaded
+    models are shared through the model registry under (name, model name,
+    device, precision), so engines keep no state of their own.
+
+    transcribe() and transcribe_batch() return {"text": ..., "words": [...]}
+    per audio array; each word is {"word", "start", "end", "probability"} with
+    times shifted by the array's offset on the original timeline.
+    """
+
+    name = ""
+    # Whether one loaded model can run several transcriptions at once; if not,
+    # callers serialize them with model_registry.model_lock()
+    thread_safe = False
+
+    def available_models(self) -> list:
+        """Model names this engine can load (empty if it accepts any name)"""
+        return []
+
+    def device(self) -> str:
+        return "cuda" if torch.cuda.is_available() else "cpu"
+
+    def resolve_precision(self, precision: str, device: str) -> str:
+        """The precision a model actually runs in on `device` ("fp16", "fp32", "int8" or "bf16")"""
+        if device == "cuda":
+            return "fp32" if precision == "fp32" else "fp16"
+        return "fp32" if precision == "auto" else precision
+
+    def load(self, model_name: str, device: str, precision: str):
+        raise NotImplementedError
+
+    def transcribe(self, model, audio: np.ndarray, offset: float = 0.0, word_timestamps: bool = False) -> dict:
+        raise NotImplementedError
+
+    def transcribe_batch(self, model, slices: list, offsets: list, word_timestamps: bool = False) -> list:
+        """Transcribe several slices of at most BATCH_MAX_SECONDS; one at a time unless the engine batches"""
+        return [self.transcribe(model, audio, offset, word_timestamps) for audio, offset in zip(slices, offsets)]
+
+
+class WhisperEngine(TranscriptionEngine):
+    """openai-whisper in PyTorch, with optional int8 or bf16 inference on the CPU"""
+
+    name = "whisper"
+
+    def available_models(self) -> list:
+        return whisper.available_models()
+
+    def load(self, model_name: str, device: str, precision: str):
+        # Check CUDA availability and device properties
+        if device == "cuda":
+            cuda_device = torch.cuda.current_device()
+            print(f"CUDA available: Using {torch.cuda.get_device_name(cuda_device)}")
+            print(f"CUDA memory allocated: {torch.cuda.memory_allocated(cuda_device) / 1024**2:.2f} MB")
+            # Enable TensorFloat32 precision if available (for Ampere+ GPUs)
+            if torch.cuda.get_device_capability(cuda_device)[0] >= 8:
+                print("Enabling TensorFloat32 for faster inference")
+                torch.set_float32_matmul_precision('high')
+        else:
+            print(f"WARNING: CUDA not available, using CPU (will be much slower; running in {precision})")
+
+        # Load model (directly specifying device to avoid double transfer)
+        model = whisper.load_model(model_name, device=device)
+        if precision == "int8":
+            model = quantize_int8(model)
+        elif precision == "bf16":
+            # Weights stay fp32 and autocast runs each op in bf16 (see inference_context);
+            # the decoder only accepts fp32 audio features, so cast the encoder output back
+            model.encoder.register_forward_hook(lambda module, inputs, output: output.float())
+        model.precision = precision
+        return model
+
+    def transcribe(self, model, audio: np.ndarray, offset: float = 0.0, word_timestamps: bool = False) -> dict:
+        """Transcribe one audio array with model.transcribe"""
+        with inference_context(model):
+            result = model.transcribe(
+                audio,
+                language="en",  # Can be made configurable for other languages
+                fp16=use_fp16(model),  # Half precision on the GPU unless fp32 was asked for
+                no_speech_threshold=0.6,
+                word_timestamps=word_timestamps
+            )
+        return {
+            "text": result["text"].strip(),
+            "words": _collect_words(result, offset) if word_timestamps else [],
+        }
+
+    def transcribe_batch(self, model, slices: list, offsets: list, word_timestamps: bool = False) -> list:
+        """Transcribe several audio slices of at most 30 seconds in one batched decode.
+
+        Each slice is padded to a full Whisper window and the log-mel windows are
+        stacked so the encoder and decoder run over the whole batch at once.
+        """
+        fp16 = use_fp16(model)
+        n_mels = model.dims.n_mels
+        mels = []
+        for audio in slices:
+            padded = whisper.pad_or_trim(torch.from_numpy(audio).to(model.device))
+            mels.append(whisper.log_mel_spectrogram(padded, n_mels))
+        mel_batch = torch.stack(mels)
+
+        options = whisper.DecodingOptions(language="en", fp16=fp16, without_timestamps=True)
+        with inference_context(model):
+            decoded = whisper.decode(model, mel_batch, options)
+
+        tokenizer = _get_tokenizer(model) if word_timestamps else None
+
+        results = []
+        for audio, offset, mel, result in zip(slices, offsets, mels, decoded):
+            # Same no-speech rule model.transcribe applies with no_speech_threshold=0.6
+            if result.no_speech_prob > 0.6 and result.avg_logprob < -1.0:
+                results.append({"text": "", "words": []})
+                continue
+
+            # Decodes that look degenerate get a second chance through model.transcribe,
+            # which retries with temperature fallback
+            if result.compression_ratio > 2.4 or result.avg_logprob < -1.0:
+                results.append(self.transcribe(model, audio, offset, word_timestamps))
+                continue
+
+            words = []
+            if word_timestamps and result.tokens:
+                num_frames = len(audio) // whisper.audio.HOP_LENGTH
+                with inference_context(model):
+                    timings = whisper.timing.find_alignment(model, tokenizer, result.tokens, mel, num_frames)
+                duration = len(audio) / SAMPLE_RATE
+                for timing in timings:
+                    if not timing.word.strip():
+                        continue
+                    words.append({
+                        "word": timing.word,
+                        "start": offset + min(float(timing.start), duration),
+                        "end": offset + min(float(timing.end), duration),
+                        "probability": float(timing.probability),
+                    })
+
+            results.append({"text": result.text.strip(), "words": words})
+
+        return results
+
+
+def quantize_int8(model):
+    """Dynamically quantize the linear layers of a CPU Whisper model to int8.
+
+    Weights are stored as int8 and activations are quantized on the fly, so the
+    attention and MLP matmuls run as int8 GEMMs. Whisper's Linear subclass only
+    casts weights to the input dtype, which is a no-op in fp32, so it is turned
+    back into a plain nn.Linear that torch knows how to quantize.
+    """
+    for module in model.modules():
+        if isinstance(module, whisper.model.Linear):
+            module.__class__ = torch.nn.Linear
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+def inference_context(model):
+    """Context to run a Whisper model in; bf16 models compute under CPU autocast"""
+    if getattr(model, "precision", None) == "bf16":
+        return torch.autocast("cpu", dtype=torch.bfloat16)
+    return nullcontext()
+
+
+def use_fp16(model) -> bool:
+    return getattr(model, "precision", None) == "fp16"
+
+
+def _collect_words(result: dict, offset: float = 0.0) -> list:
+    """Flatten the word timings of a model.transcribe result, shifted by `offset` seconds"""
+    words = []
+    for segment in result.get("segments", []):
+        for word in segment.get("words", []):
+            words.append({
+                "word": word["word"],
+                "start": offset + word["start"],
+                "end": offset + word["end"],
+                "probability": word.get("probability", 0.0),
+            })
+    return words
+
+
+def _get_tokenizer(model):
+    return whisper.tokenizer.get_tokenizer(
+        model.is_multilingual,
+        num_languages=getattr(model, "num_languages", 99),
+        language="en",
+        task="transcribe"
+    )
+
+
+class FasterWhisperEngine(TranscriptionEngine):
+    """faster-whisper on CTranslate2: int8 kernels on the CPU and batched decoding of long audio.
+
+    Requires the optional `faster-whisper` package.
+    """
+
+    name = "faster-whisper"
+    thread_safe = True  # CTranslate2 models serve concurrent calls
+
+    # CTranslate2 compute types per (device, precision)
+    COMPUTE_TYPES = {
+        ("cuda", "fp16"): "float16",
+        ("cuda", "fp32"): "float32",
+        ("cuda", "int8"): "int8_float16",
+        ("cuda", "bf16"): "bfloat16",
+        ("cpu", "fp32"): "float32",
+        ("cpu", "int8"): "int8",
+        ("cpu", "bf16"): "bfloat16",
+    }
+
+    def available_models(self) -> list:
+        from faster_whisper import available_models
+        return available_models()
+
+    def resolve_precision(self, precision: str, device: str) -> str:
+        # CTranslate2's int8 CPU kernels are its main advantage, so default to them
+        if precision == "auto":
+            return "fp16" if device == "cuda" else "int8"
+        return precision
+
+    def load(self, model_name: str, device: str, precision: str):
+        try:
+            from faster_whisper import WhisperModel
+        except ImportError:
+            raise RuntimeError("TRANSCRIPTION_ENGINE=faster-whisper requires the faster-whisper package")
+
+        compute_type = self.COMPUTE_TYPES[(device, precision)]
+        print(f"Loading faster-whisper model '{model_name}' on {device} ({compute_type})")
+        return WhisperModel(model_name, device=device, compute_type=compute_type)
+
+    def transcribe(self, model, audio: np.ndarray, offset: float = 0.0, word_timestamps: bool = False) -> dict:
+        options = dict(language="en", no_speech_threshold=0.6, word_timestamps=word_timestamps)
+        audio = np.asarray(audio, dtype=np.float32)
+        if len(audio) > BATCH_MAX_SECONDS * SAMPLE_RATE:
+            # Long audio is cut into windows that are decoded in batches
+            segments, _ = _batched_pipeline(model).transcribe(audio, batch_size=FASTER_WHISPER_BATCH_SIZE, **options)
+        else:
+            segments, _ = model.transcribe(audio, **options)
+
+        texts = []
+        words = []
+        for segment in segments:  # a generator; decoding happens while iterating
+            texts.append(segment.text.strip())
+            for word in segment.words or []:
+                words.append({
+                    "word": word.word,
+                    "start": offset + word.start,
+                    "end": offset + word.end,
+                    "probability": word.probability,
+                })
+        return {"text": " ".join(text for text in texts if text), "words": words}
+
+
+def _batched_pipeline(model):
+    """faster-whisper's batched pipeline around a model, created once per model"""
+    pipeline = getattr(model, "_batched_pipeline", None)
+    if pipeline is None:
+        from faster_whisper import BatchedInferencePipeline
+        pipeline = model._batched_pipeline = BatchedInferencePipeline(model=model)
+    return pipeline
+
+
+class FakeEngine(TranscriptionEngine):
+    """Deterministic engine for tests and local development; loads no model.
+
+    Non-silent audio yields one word per second, numbered along the original
+    timeline ("w0 w1 ..."), so results depend only on the audio's length,
+    offset and whether it is silent.
+    """
+
+    name = "fake"
+    thread_safe = True
+
+    def device(self) -> str:
+        return "cpu"
+
+    def resolve_precision(self, precision: str, device: str) -> str:
+        return "fp32" if precision == "auto" else precision
+
+    def load(self, model_name: str, device: str, precision: str):
+        return {"engine": self.name, "model": model_name, "precision": precision}
+
+    def transcribe(self, model, audio: np.ndarray, offset: float = 0.0, word_timestamps: bool = False) -> dict:
+        duration = len(audio) / SAMPLE_RATE
+        if duration == 0 or float(np.sqrt(np.mean(np.square(audio, dtype=np.float64)))) < 1e-4:
+            return {"text": "", "words": []}
+
+        words = []
+        for i in range(max(1, int(duration))):
+            start = offset + i
+            words.append({
+                "word": f" w{int(start)}",
+                "start": start,
+                "end": min(start + 1.0, offset + duration),
+                "probability": 1.0,
+            })
+        return {
+            "text": "".join(word["word"] for word in words).strip(),
+            "words": words if word_timestamps else [],
+        }
+
+
+ENGINES = {engine.name: engine for engine in (WhisperEngine(), FasterWhisperEngine(), FakeEngine())}
+
+
+def get_engine(name: Optional[str]) -> TranscriptionEngine:
+    engine = ENGINES.get((name or "").lower())
+    if engine is None:
+        raise ValueError(f"Unknown transcription engine '{name}' (expected one of: {', '.join(ENGINES)})")
+    return engine
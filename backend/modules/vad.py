@@ -0,0 +1,162 @@
+import os
+import numpy as np
+from dotenv import load_dotenv
+from modules.audio_store import open_pcm, SAMPLE_RATE
+
+# Load environment variables
+load_dotenv()
+
+# Trim non-speech before transcription unless a request says otherwise
+VAD_ENABLED = os.getenv("VAD_ENABLED", "false").lower() == "true"
+
+# A frame counts as speech when it is this many dB above the estimated noise floor
+VAD_THRESHOLD_DB = float(os.getenv("VAD_THRESHOLD_DB", "12"))
+
+FRAME_SECONDS = 0.03
+
+# Speech shorter than this is dropped, silence shorter than this is bridged
+MIN_SPEECH_SECONDS = 0.25
+MIN_SILENCE_SECONDS = 0.6
+
+# Padding kept around each speech region so word onsets and endings aren't clipped
+PAD_SECONDS = 0.2
+
+# Frames whose level is below this are silence regardless of the noise floor
+ABSOLUTE_FLOOR_DB = -60.0
+
+# Audio is scanned in blocks of this many seconds to bound memory on long files
+_BLOCK_SECONDS = 600
+
+
+def frame_levels(audio: np.ndarray, frame_seconds: float = FRAME_SECONDS) -> np.ndarray:
+    """RMS level of each frame in dBFS"""
+    frame = int(frame_seconds * SAMPLE_RATE)
+    block = (int(_BLOCK_SECONDS * SAMPLE_RATE) // frame) * frame
+    levels = []
+    for start in range(0, len(audio) - frame + 1, block):
+        chunk = np.asarray(audio[start:start + block], dtype=np.float32)
+        chunk = chunk[:len(chunk) // frame * frame].reshape(-1, frame)
+        rms = np.sqrt(np.mean(np.square(chunk, dtype=np.float64), axis=1))
+        levels.append(20 * np.log10(np.maximum(rms, 1e-10)))
+    return np.concatenate(levels) if levels else np.zeros(0)
+
+
+def _runs(mask: np.ndarray) -> list:
+    """(start, end) frame index pairs of the runs of True in a boolean array"""
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(padded[1:] != padded[:-1])
+    return list(zip(edges[::2], edges[1::2]))
+
+
+def detect_speech(audio: np.ndarray, threshold_db: float = VAD_THRESHOLD_DB) -> list:
+    """Find speech in a 16 kHz mono signal with an adaptive energy threshold.
+
+    Returns a sorted list of non-overlapping (start, end) regions in seconds.
+    """
+    levels = frame_levels(audio)
+    if len(levels) == 0:
+        return []
+
+    # The quietest frames approximate the noise floor of the recording
+    noise_floor = np.percentile(levels, 10)
+    threshold = max(noise_floor + threshold_db, ABSOLUTE_FLOOR_DB)
+    speech = levels > threshold
+
+    # Bridge short pauses so sentences aren't split into fragments
+    min_silence = int(MIN_SILENCE_SECONDS / FRAME_SECONDS)
+    for start, end in _runs(~speech):
+        if start > 0 and end < len(speech) and end - start < min_silence:
+            speech[start:end] = True
+
+    min_speech = int(MIN_SPEECH_SECONDS / FRAME_SECONDS)
+    duration = len(audio) / SAMPLE_RATE
+    regions = []
+    for start, end in _runs(speech):
+        if end - start < min_speech:
+            continue
+        region_start = max(0.0, float(start) * FRAME_SECONDS - PAD_SECONDS)
+        region_end = min(duration, float(end) * FRAME_SECONDS + PAD_SECONDS)
+        if regions and region_start <= regions[-1][1]:
+            regions[-1] = (regions[-1][0], region_end)
+        else:
+            regions.append((region_start, region_end))
+    return regions
+
+
+def detect_speech_in_file(audio_path: str, threshold_db: float = VAD_THRESHOLD_DB):
+    """Run detect_speech on a PCM file from the audio store.
+
+    Returns (regions, stats) where stats is speech_stats() for the file.
+    """
+    audio = open_pcm(audio_path)
+    regions = detect_speech(audio, threshold_db)
+    return regions, speech_stats(regions, len(audio) / SAMPLE_RATE)
+
+
+def split_segments(segments: list, regions: list) -> list:
+    """Cut segments down to the parts that overlap speech regions.
+
+    Each piece keeps the fields of its segment (e.g. the speaker) and its
+    timestamps stay on the original timeline.
+    """
+    pieces = []
+    j = 0
+    for segment in segments:
+        # Regions are sorted, so skip those that end before this segment starts
+        while j < len(regions) and regions[j][1] <= segment["start"]:
+            j += 1
+        k = j
+        while k < len(regions) and regions[k][0] < segment["end"]:
+            start = max(segment["start"], regions[k][0])
+            end = min(segment["end"], regions[k][1])
+            if end > start:
+                pieces.append(dict(segment, start=start, end=end))
+            k += 1
+    return pieces
+
+
+def compact_audio(audio: np.ndarray, regions: list):
+    """Concatenate the speech regions of a signal.
+
+    Returns (compacted audio, timeline); pass the timeline to remap_words() to map
+    word timestamps in the compacted audio back to the original.
+    """
+    pieces = []
+    timeline = []  # (compacted start, original start) of each region
+    position = 0.0
+    for start, end in regions:
+        piece = audio[int(start * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        timeline.append((position, start))
+        pieces.append(piece)
+        position += len(piece) / SAMPLE_RATE
+    compacted = np.concatenate(pieces).astype(np.float32, copy=False) if pieces else np.zeros(0, dtype=np.float32)
+    return compacted, timeline
+
+
+def remap_words(words: list, timeline: list) -> list:
+    """Map word timestamps in compacted audio back to the original timeline"""
+    if not timeline:
+        return words
+    starts = np.array([compacted_start for compacted_start, _ in timeline])
+
+    def remap(t):
+        i = max(0, int(np.searchsorted(starts, t, side="right")) - 1)
+        compacted_start, original_start = timeline[i]
+        return original_start + (t - compacted_start)
+
+    remapped = []
+    for word in words:
+        start = remap(word["start"])
+        # Keep a word's end in the same region as its start
+        remapped.append(dict(word, start=start, end=start + (word["end"] - word["start"])))
+    return remapped
+
+
+def speech_stats(regions: list, duration: float) -> dict:
+    """How much audio the speech regions keep and how much is skipped"""
+    speech_seconds = sum(end - start for start, end in regions)
+    return {
+        "regions": len(regions),
+        "speech_seconds": round(speech_seconds, 2),
+        "skipped_seconds": round(max(0.0, duration - speech_seconds), 2),
+    }
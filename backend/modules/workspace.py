@@ -0,0 +1,128 @@
+import os
+import time
+import shutil
+import asyncio
+import tempfile
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Parent directory of the per-job working directories downloads are written to
+WORKSPACE_DIR = os.path.expanduser(os.getenv("WORKSPACE_DIR", os.path.join(tempfile.gettempdir(), "tubescript")))
+
+# Disk budget for all job workspaces; new downloads wait while usage is above it. 0 disables the quota.
+WORKSPACE_QUOTA_MB = float(os.getenv("WORKSPACE_QUOTA_MB", "20480"))
+
+# How often a download waiting for disk space re-checks usage (seconds)
+SPACE_POLL_INTERVAL = 2.0
+
+# Workspaces left behind by a previous run are removed at startup once they are this old
+STALE_WORKSPACE_SECONDS = 24 * 3600
+
+
+def _dir_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+class WorkspaceManager:
+    """Owns the per-job directories downloads and intermediate audio live in.
+
+    A job's directory is removed when the job finishes, whether it succeeded or
+    failed. Audio worth keeping is moved out into the result cache first.
+    """
+
+    def __init__(self, root: str, quota_mb: float):
+        self.root = root
+        self.quota_bytes = quota_mb * 1024**2
+        self._waiting = 0
+
+    def path(self, job_id: str) -> str:
+        return os.path.join(self.root, job_id)
+
+    def create(self, job_id: str) -> str:
+        """Create (or reuse) the workspace of a job and return its path"""
+        path = self.path(job_id)
+        os.makedirs(path, exist_ok=True)
+        return path
+
+    def cleanup(self, job_id: str):
+        """Remove a job's workspace and everything still in it"""
+        path = self.path(job_id)
+        if os.path.isdir(path):
+            freed = _dir_size(path)
+            shutil.rmtree(path, ignore_errors=True)
+            if freed:
+                print(f"Workspace: removed {path} ({freed / 1024**2:.1f} MB)")
+
+    def used_bytes(self) -> int:
+        return _dir_size(self.root) if os.path.isdir(self.root) else 0
+
+    def has_space(self) -> bool:
+        return self.quota_bytes <= 0 or self.used_bytes() < self.quota_bytes
+
+    async def wait_for_space(self, on_wait=None):
+        """Wait until workspace usage is below the quota before starting a download.
+
+        `on_wait(used_mb)` is called once if the caller has to wait.
+        """
+        if self.has_space():
+            return
+        self._waiting += 1
+        try:
+            if on_wait:
+                on_wait(self.used_bytes() / 1024**2)
+            while not self.has_space():
+                await asyncio.sleep(SPACE_POLL_INTERVAL)
+        finally:
+            self._waiting -= 1
+
+    def remove_stale(self, max_age: float = STALE_WORKSPACE_SECONDS) -> int:
+        """Remove workspaces not modified for `max_age` seconds (left by crashed runs)"""
+        if not os.path.isdir(self.root):
+            return 0
+        cutoff = time.time() - max_age
+        removed = 0
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.isdir(path) and os.path.getmtime(path) < cutoff:
+                    shutil.rmtree(path, ignore_errors=True)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
+
+    def stats(self) -> dict:
+        workspaces = []
+        used_bytes = 0
+        if os.path.isdir(self.root):
+            for name in sorted(os.listdir(self.root)):
+                path = os.path.join(self.root, name)
+                if os.path.isdir(path):
+                    size = _dir_size(path)
+                    used_bytes += size
+                    workspaces.append({"job_id": name, "size_mb": round(size / 1024**2, 2)})
+        used_mb = used_bytes / 1024**2
+        try:
+            free_mb = shutil.disk_usage(self.root if os.path.isdir(self.root) else tempfile.gettempdir()).free / 1024**2
+        except OSError:
+            free_mb = None
+        return {
+            "directory": self.root,
+            "quota_mb": self.quota_bytes / 1024**2,
+            "used_mb": round(used_mb, 2),
+            "disk_free_mb": round(free_mb, 2) if free_mb is not None else None,
+            "downloads_waiting": self._waiting,
+            "workspaces": workspaces,
+        }
+
+
+workspaces = WorkspaceManager(WORKSPACE_DIR, WORKSPACE_QUOTA_MB)
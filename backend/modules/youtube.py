@@ -1,4 +1,6 @@
 import os
+import time
+import shutil
 import asyncio
 import tempfile
 from typing import List, Dict, Optional
@@ -7,13 +9,101 @@ from pydub import AudioSegment
 import sys
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 from utils.validators import get_youtube_url_type
+from modules.audio_store import decode_to_pcm, PCM_EXTENSION, SAMPLE_RATE
+from modules.metrics import StageTimer
 
-async def download_youtube_audio(youtube_url: str):
-    """Download audio from a YouTube video"""
+# How audio is ingested: "stream" pipes the audio stream through one ffmpeg process
+# straight into a 16 kHz mono float32 PCM file (see modules/audio_store.py);
+# "download" has yt-dlp write a WAV that pydub then converts (also used as the
+# fallback when streaming fails)
+AUDIO_INGEST = os.getenv("AUDIO_INGEST", "stream").lower()
+
+def _video_metadata(info: dict, youtube_url: str) -> dict:
+    """Relevant video metadata from a yt-dlp info dict"""
+    return {
+        'title': info.get('title', 'Unknown'),
+        'duration': info.get('duration', 0),
+        'url': youtube_url,
+        'uploader': info.get('uploader', 'Unknown'),
+    }
+
+async def download_youtube_audio(youtube_url: str, output_dir: Optional[str] = None):
+    """Download audio from a YouTube video and extract metadata.
+
+    Files are written to `output_dir` (a fresh temporary directory if not given).
+    Returns (audio_path, video_info); the audio is 16 kHz mono, as a PCM file
+    when streamed or a WAV file from the fallback path.
+    """
+    if AUDIO_INGEST == "stream":
+        try:
+            return await stream_youtube_audio(youtube_url, output_dir)
+        except Exception as e:
+            print(f"Streaming ingestion failed ({str(e)}), falling back to download and convert")
+    return await download_and_convert_audio(youtube_url, output_dir)
+
+async def stream_youtube_audio(youtube_url: str, output_dir: Optional[str] = None):
+    """Decode a YouTube audio stream to a 16 kHz mono PCM file with a single ffmpeg process.
+
+    yt-dlp only resolves the stream URL; ffmpeg reads it over HTTP and downmixes and
+    resamples on the fly, so no full-rate intermediate file is written or loaded.
+    """
+    print(f"Starting streaming ingestion of YouTube URL: {youtube_url}")
+    temp_dir = output_dir or tempfile.mkdtemp()
+    output_path = os.path.join(temp_dir, f"audio{PCM_EXTENSION}")
+
+    ydl_opts = {
+        'format': 'bestaudio/best',
+        'quiet': True,
+        'no_warnings': True,
+        'noprogress': True
+    }
+
+    def ingest():
+        # Resolving, downloading and decoding are one step here, all counted as the download
+        timer = StageTimer("download")
+        with YoutubeDL(ydl_opts) as ydl:
+            info = ydl.extract_info(youtube_url, download=False)
+
+        if 'entries' in info:
+            # Playlist, take first video
+            info = info['entries'][0]
+
+        if info.get('protocol') not in ('http', 'https') or not info.get('url'):
+            raise ValueError(f"unsupported stream protocol '{info.get('protocol')}'")
+
+        input_args = ["-reconnect", "1", "-reconnect_streamed", "1", "-reconnect_delay_max", "5"]
+        # The stream URL only works with the headers yt-dlp negotiated
+        headers = "".join(f"{name}: {value}\r\n" for name, value in info.get('http_headers', {}).items())
+        if headers:
+            input_args += ["-headers", headers]
+        input_args += ["-i", info['url']]
+
+        start_time = time.time()
+        num_samples = decode_to_pcm(input_args, output_path)
+        print(f"Audio streamed and decoded in {time.time() - start_time:.1f}s "
+              f"({num_samples / SAMPLE_RATE:.0f}s of audio)")
+        timer.finish(audio_seconds=num_samples / SAMPLE_RATE)
+        return _video_metadata(info, youtube_url)
+
+    loop = asyncio.get_event_loop()
+    try:
+        video_info = await loop.run_in_executor(None, ingest)
+    except Exception:
+        if output_dir:
+            # The caller owns the directory; only drop the partial output
+            if os.path.exists(output_path):
+                os.remove(output_path)
+        else:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+        raise
+
+    return output_path, video_info
+
+async def download_and_convert_audio(youtube_url: str, output_dir: Optional[str] = None):
+    """Download audio with yt-dlp, then convert it to mono 16kHz WAV with pydub"""
     print(f"Starting download of YouTube URL: {youtube_url}")
-    """Download audio from a YouTube video and extract metadata"""
-    # Create a temporary directory for the download
-    temp_dir = tempfile.mkdtemp()
+    # Create a temporary directory for the download, unless the caller provides one
+    temp_dir = output_dir or tempfile.mkdtemp()
     output_path = os.path.join(temp_dir, "audio.wav")
     
     # Video information storage
@@ -34,7 +124,7 @@ async def download_youtube_audio(youtube_url: str):
     
     # Run the download process in a thread pool
     def download():
-        with YoutubeDL(ydl_opts) as ydl:
+        with StageTimer("download") as timer, YoutubeDL(ydl_opts) as ydl:
             # Download the video and extract info
             info = ydl.extract_info(youtube_url, download=True)
             
@@ -43,10 +133,8 @@ async def download_youtube_audio(youtube_url: str):
                 info = info['entries'][0]
             
             # Store relevant video metadata
-            video_info['title'] = info.get('title', 'Unknown')
-            video_info['duration'] = info.get('duration', 0)
-            video_info['url'] = youtube_url
-            video_info['uploader'] = info.get('uploader', 'Unknown')
+            video_info.update(_video_metadata(info, youtube_url))
+            timer.audio_seconds = video_info['duration']
             
             # Find the downloaded file
             audio_file = os.path.join(temp_dir, 'audio.wav')
@@ -58,10 +146,11 @@ async def download_youtube_audio(youtube_url: str):
     
     # Convert to mono 16kHz WAV for optimal model performance
     def convert_audio():
-        audio = AudioSegment.from_wav(audio_file)
-        audio = audio.set_channels(1)  # Convert to mono
-        audio = audio.set_frame_rate(16000)  # Convert to 16kHz
-        audio.export(output_path, format="wav")
+        with StageTimer("convert", video_info['duration']):
+            audio = AudioSegment.from_wav(audio_file)
+            audio = audio.set_channels(1)  # Convert to mono
+            audio = audio.set_frame_rate(SAMPLE_RATE)  # Convert to 16kHz
+            audio.export(output_path, format="wav")
         return output_path
     
     # Run audio conversion in a thread pool
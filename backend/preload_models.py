@@ -3,13 +3,119 @@
 import torch
 import os
 from dotenv import load_dotenv
-import whisper
-from pyannote.audio import Pipeline
 from huggingface_hub import login
+from modules.model_registry import release_model
+from modules.transcription import get_whisper_model
+from modules.transcription_engines import get_engine
+from modules.diarization import get_diarization_devices, get_diarization_pipeline, DIARIZATION_ENGINE, DIARIZATION_ENGINES
 
 # Load environment variables
 load_dotenv()
 
+def preload_whisper():
+    """Load the Whisper model into the model registry and run a test inference"""
+    print("\nPreloading Whisper model...")
+    try:
+        # Track memory before and after model loading
+        if torch.cuda.is_available():
+            torch.cuda.empty_cache()
+            mem_before = torch.cuda.memory_allocated() / 1024**2
+            print(f"GPU memory before Whisper: {mem_before:.2f} MB")
+            
+        # Load model directly to GPU when available (TF32 is enabled by the loader)
+        model, model_key = get_whisper_model()
+        device = model_key[2]
+        
+        try:
+            if torch.cuda.is_available():
+                mem_after = torch.cuda.memory_allocated() / 1024**2
+                print(f"GPU memory after Whisper: {mem_after:.2f} MB")
+                print(f"Whisper model size in GPU memory: {mem_after - mem_before:.2f} MB")
+                
+            print(f"Whisper model loaded successfully on {device}!")
+            
+            # Run a small test to ensure model works as expected
+            print(f"Running test inference with Whisper ({model_key[0]} engine)...")
+            if model_key[0] == "whisper":
+                import whisper
+                sample_audio = torch.randn(16000, device=device)  # 1 second of random noise
+                mel = whisper.log_mel_spectrogram(whisper.pad_or_trim(sample_audio), model.dims.n_mels)
+                with torch.inference_mode():
+                    # Just run the encoder to test
+                    encoded = model.encoder(mel.unsqueeze(0))
+                    print(f"Test inference successful! Output shape: {encoded.shape}")
+            else:
+                # Other engines don't expose the encoder; transcribe 1 second of noise instead
+                sample_audio = (torch.randn(16000) * 0.01).numpy()
+                get_engine(model_key[0]).transcribe(model, sample_audio)
+                print("Test inference successful!")
+        finally:
+            release_model(*model_key)
+            
+    except Exception as e:
+        print(f"Error loading Whisper model: {e}")
+
+def preload_diarization():
+    """Load the pyannote pipeline into the model registry on every pool device"""
+    print("\nPreloading pyannote diarization model...")
+    for device in get_diarization_devices():
+        try:
+            if device.startswith("cuda"):
+                torch.cuda.empty_cache()
+                mem_before = torch.cuda.memory_allocated(torch.device(device)) / 1024**2
+                print(f"GPU memory before diarization model: {mem_before:.2f} MB")
+            
+            # Load model on the pool device
+            pipeline, pipeline_key = get_diarization_pipeline(device)
+            
+            try:
+                if device.startswith("cuda"):
+                    mem_after = torch.cuda.memory_allocated(torch.device(device)) / 1024**2
+                    print(f"GPU memory after diarization model: {mem_after:.2f} MB")
+                    print(f"Diarization model size in GPU memory: {mem_after - mem_before:.2f} MB")
+                    
+                print(f"Pyannote diarization model loaded successfully on {device}!")
+                
+                # Run a quick test to verify it's working
+                if device.startswith("cuda"):
+                    try:
+                        # Note: We can't easily run a quick forward pass with the pipeline API
+                        # So we just check the device placement
+                        print("Testing diarization model pipeline on GPU...")
+                        device_location = next(pipeline.parameters()).device
+                        print(f"Model parameters are on: {device_location}")
+                        if device_location.type == "cuda":
+                            print("Diarization model is correctly loaded on GPU")
+                        else:
+                            print("WARNING: Diarization model is on CPU despite CUDA being available")
+                    except Exception as e:
+                        print(f"Diarization GPU test error: {e}")
+            finally:
+                release_model(*pipeline_key)
+                    
+        except Exception as e:
+            print(f"Error loading pyannote model on {device}: {e}")
+
+def warm_up_models():
+    """Warm up the models used by the API so the first job doesn't pay the load cost.
+
+    Called at server startup when MODEL_LOADING=eager.
+    """
+    preload_whisper()
+    if DIARIZATION_ENGINE == "lightweight":
+        print("\nPreloading speaker embedding model...")
+        try:
+            _, model_key = DIARIZATION_ENGINES["lightweight"]._get_model()
+            release_model(*model_key)
+        except Exception as e:
+            print(f"Error loading speaker embedding model: {e}")
+    elif DIARIZATION_ENGINE != "pyannote":
+        print(f"Skipping diarization warm-up: the {DIARIZATION_ENGINE} engine loads no model")
+    elif os.getenv("HUGGINGFACE_TOKEN"):
+        preload_diarization()
+    else:
+        print("Skipping diarization warm-up: HUGGINGFACE_TOKEN not set")
+
 def main():
     # Check if CUDA is available and provide detailed GPU information
     print(f"CUDA available: {torch.cuda.is_available()}")
@@ -53,87 +159,11 @@ def main():
         login(token=hf_token)
     
     # Preload and cache the Whisper model
-    print("\nPreloading Whisper model...")
-    try:
-        # Enable TensorFloat32 precision if available for faster inference
-        if torch.cuda.is_available() and torch.cuda.get_device_capability()[0] >= 8:
-            print("Enabling TensorFloat32 for faster inference")
-            torch.set_float32_matmul_precision('high')
-            
-        # Track memory before and after model loading
-        if torch.cuda.is_available():
-            torch.cuda.empty_cache()
-            mem_before = torch.cuda.memory_allocated() / 1024**2
-            print(f"GPU memory before Whisper: {mem_before:.2f} MB")
-            
-        # Load model directly to GPU when available
-        device = "cuda" if torch.cuda.is_available() else "cpu"
-        model = whisper.load_model("large", device=device)
-        
-        if torch.cuda.is_available():
-            mem_after = torch.cuda.memory_allocated() / 1024**2
-            print(f"GPU memory after Whisper: {mem_after:.2f} MB")
-            print(f"Whisper model size in GPU memory: {mem_after - mem_before:.2f} MB")
-            
-        print(f"Whisper model loaded successfully on {device}!")
-        
-        # Run a small test to ensure model works as expected
-        print("Running test inference with Whisper...")
-        sample_audio = torch.randn(16000, device=device)  # 1 second of random noise
-        with torch.inference_mode():
-            # Just run the encoder to test
-            encoded = model.encoder(sample_audio.unsqueeze(0))
-            print(f"Test inference successful! Output shape: {encoded.shape}")
-            
-    except Exception as e:
-        print(f"Error loading Whisper model: {e}")
+    preload_whisper()
     
     # Preload and cache pyannote model (requires HF token)
     if hf_token:
-        print("\nPreloading pyannote diarization model...")
-        try:
-            # Set device for PyAnnote
-            device = "cuda" if torch.cuda.is_available() else "cpu"
-            
-            if torch.cuda.is_available():
-                torch.cuda.empty_cache()
-                mem_before = torch.cuda.memory_allocated() / 1024**2
-                print(f"GPU memory before diarization model: {mem_before:.2f} MB")
-            
-            # Load model
-            pipeline = Pipeline.from_pretrained(
-                "pyannote/speaker-diarization-3.1", 
-                use_auth_token=hf_token
-            )
-            
-            # Move model to GPU if available
-            if torch.cuda.is_available():
-                pipeline = pipeline.to(torch.device(device))
-                mem_after = torch.cuda.memory_allocated() / 1024**2
-                print(f"GPU memory after diarization model: {mem_after:.2f} MB")
-                print(f"Diarization model size in GPU memory: {mem_after - mem_before:.2f} MB")
-                
-            print(f"Pyannote diarization model loaded successfully on {device}!")
-            
-            # Run a quick test to verify it's working
-            if torch.cuda.is_available():
-                try:
-                    # Create a small test tensor and run a forward pass through part of the model
-                    # to verify CUDA execution
-                    print("Testing diarization model pipeline on GPU...")
-                    # Note: We can't easily run a quick forward pass with the pipeline API
-                    # So we just check the device placement
-                    device_location = next(pipeline.parameters()).device
-                    print(f"Model parameters are on: {device_location}")
-                    if device_location.type == "cuda":
-                        print("Diarization model is correctly loaded on GPU")
-                    else:
-                        print("WARNING: Diarization model is on CPU despite CUDA being available")
-                except Exception as e:
-                    print(f"Diarization GPU test error: {e}")
-                    
-        except Exception as e:
-            print(f"Error loading pyannote model: {e}")
+        preload_diarization()
     
     print("\nPreloading complete! Models are now cached.")
 
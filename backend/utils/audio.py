@@ -5,6 +5,7 @@ import torch
 import torchaudio
 import threading
 import time
+from modules.metrics import GPU_MEMORY, GPU_UTILIZATION
 
 def convert_to_mono_16khz(input_path: str, output_path: str = None):
     """Convert audio to mono 16kHz for optimal model performance"""
@@ -103,9 +104,11 @@ def start_gpu_monitoring(interval=5.0):
                 handle = pynvml.nvmlDeviceGetHandleByIndex(gpu_id)
                 util = pynvml.nvmlDeviceGetUtilizationRates(handle)
                 gpu_util = f"{util.gpu}%"
+                GPU_UTILIZATION.set(util.gpu / 100, device=f"cuda:{gpu_id}")
                 pynvml.nvmlShutdown()
             except:
                 pass
+            GPU_MEMORY.set(allocated * 1024**2, device=f"cuda:{gpu_id}")
 
             print(f"[{mins:02d}:{secs:02d}] GPU Memory: {allocated:.0f}/{reserved:.0f} MB | Utilization: {gpu_util}")
 
@@ -33,6 +33,13 @@ def get_youtube_url_type(url: str) -> str:
     else:
         return 'unknown'
 
+def extract_video_id(url: str) -> str:
+    """Extract the 11-character video ID from a YouTube video URL (None if not a video URL)"""
+    match = re.match(r'^(https?://)?(www\.)?(youtube\.com/watch\?v=|youtu\.be/)([a-zA-Z0-9_-]{11})(\S*)?$', url.strip())
+    if match:
+        return match.group(4)
+    return None
+
 def validate_timestamp_format(timestamp: str) -> bool:
     """Validate timestamp format (HH:MM:SS.mmm)"""
     pattern = r'^\d{2}:\d{2}:\d{2}\.\d{3}$'
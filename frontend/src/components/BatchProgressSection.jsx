@@ -1,12 +1,39 @@
-import React, { useState, useEffect } from 'react';
-import { getBatchStatus } from '../utils/api';
+import React, { useState, useEffect, useRef } from 'react';
+import { getBatchStatus, subscribeToBatch } from '../utils/api';
 
 const BatchProgressSection = ({ batchId, onBatchComplete }) => {
   const [batchStatus, setBatchStatus] = useState(null);
   const [isPolling, setIsPolling] = useState(true);
+  const [streamFailed, setStreamFailed] = useState(false);
+  // Latest callback, read through a ref so a new function from the parent
+  // doesn't reopen the event stream or restart polling
+  const onBatchCompleteRef = useRef(onBatchComplete);
+  onBatchCompleteRef.current = onBatchComplete;
 
+  // Follow the batch over one event stream; fall back to polling if it fails
   useEffect(() => {
-    if (!batchId || !isPolling) return;
+    if (!batchId || !isPolling || streamFailed) return;
+
+    const unsubscribe = subscribeToBatch(batchId, {
+      onBatch: (status) => {
+        setBatchStatus(status);
+        if (['completed', 'failed', 'partial'].includes(status.status)) {
+          unsubscribe();
+          setIsPolling(false);
+          onBatchCompleteRef.current(status);
+        }
+      },
+      onError: (error) => {
+        console.warn('Batch progress stream unavailable, falling back to polling:', error.message);
+        setStreamFailed(true);
+      }
+    });
+
+    return () => unsubscribe();
+  }, [batchId, isPolling, streamFailed]);
+
+  useEffect(() => {
+    if (!batchId || !isPolling || !streamFailed) return;
 
     const pollStatus = async () => {
       try {
@@ -16,7 +43,7 @@ const BatchProgressSection = ({ batchId, onBatchComplete }) => {
         // Stop polling if batch is completed, failed, or partial
         if (['completed', 'failed', 'partial'].includes(status.status)) {
           setIsPolling(false);
-          onBatchComplete(status);
+          onBatchCompleteRef.current(status);
         }
       } catch (error) {
         console.error('Error polling batch status:', error);
@@ -30,7 +57,7 @@ const BatchProgressSection = ({ batchId, onBatchComplete }) => {
     const interval = setInterval(pollStatus, 2000);
     
     return () => clearInterval(interval);
-  }, [batchId, isPolling, onBatchComplete]);
+  }, [batchId, isPolling, streamFailed]);
 
   if (!batchStatus) {
     return (
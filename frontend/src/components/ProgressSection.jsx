@@ -1,23 +1,70 @@
 import React, { useEffect, useRef } from 'react';
-import { getJobStatus, fetchTranscript } from '../utils/api';
+import { getJobStatus, fetchTranscript, subscribeToJob } from '../utils/api';
 
 const ProgressSection = ({ jobId, onProcessComplete, progress, setProgress }) => {
   const pollIntervalRef = useRef(null);
+  const unsubscribeRef = useRef(null);
   
   useEffect(() => {
-    // Start polling for status
+    // Follow the job's event stream, falling back to polling if it fails
     if (jobId) {
-      startPolling();
+      startStreaming();
     }
     
     return () => {
-      // Clean up interval on component unmount
+      // Close the stream and clean up interval on component unmount
+      stopStreaming();
       if (pollIntervalRef.current) {
         clearInterval(pollIntervalRef.current);
       }
     };
   }, [jobId]);
   
+  const stopStreaming = () => {
+    if (unsubscribeRef.current) {
+      unsubscribeRef.current();
+      unsubscribeRef.current = null;
+    }
+  };
+  
+  // Apply a status update from the stream or a poll
+  const handleStatus = async (status) => {
+    // Update progress
+    const progressPercent = Math.round(status.progress * 100);
+    setProgress({
+      percent: progressPercent,
+      message: status.message
+    });
+    
+    // Check if job is complete
+    if (status.status === 'completed') {
+      const transcript = await fetchTranscript(jobId);
+      onProcessComplete(transcript);
+    } else if (status.status === 'failed') {
+      setProgress(prev => ({
+        ...prev,
+        message: `Error: ${status.message}`
+      }));
+    }
+  };
+  
+  const startStreaming = () => {
+    stopStreaming();
+    unsubscribeRef.current = subscribeToJob(jobId, {
+      onStatus: (status) => {
+        if (['completed', 'failed'].includes(status.status)) {
+          stopStreaming();
+        }
+        handleStatus(status);
+      },
+      onError: (error) => {
+        console.warn('Progress stream unavailable, falling back to polling:', error.message);
+        stopStreaming();
+        startPolling();
+      }
+    });
+  };
+  
   const startPolling = () => {
     // Clear any existing interval
     if (pollIntervalRef.current) {
@@ -28,26 +75,10 @@ const ProgressSection = ({ jobId, onProcessComplete, progress, setProgress }) =>
     pollIntervalRef.current = setInterval(async () => {
       try {
         const status = await getJobStatus(jobId);
-        
-        // Update progress
-        const progressPercent = Math.round(status.progress * 100);
-        setProgress({
-          percent: progressPercent,
-          message: status.message
-        });
-        
-        // Check if job is complete
-        if (status.status === 'completed') {
-          clearInterval(pollIntervalRef.current);
-          const transcript = await fetchTranscript(jobId);
-          onProcessComplete(transcript);
-        } else if (status.status === 'failed') {
+        if (['completed', 'failed'].includes(status.status)) {
           clearInterval(pollIntervalRef.current);
-          setProgress(prev => ({
-            ...prev,
-            message: `Error: ${status.message}`
-          }));
         }
+        await handleStatus(status);
       } catch (error) {
         console.error('Error polling status:', error);
         setProgress(prev => ({
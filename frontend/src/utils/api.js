@@ -49,6 +49,53 @@ export async function getJobStatus(jobId) {
   }
 }
 
+// Subscribe to a server-sent event stream. Returns a function that closes it.
+function subscribe(path, handlers) {
+  if (typeof EventSource === 'undefined') {
+    handlers.onError?.(new Error('EventSource not supported'));
+    return () => {};
+  }
+
+  const source = new EventSource(`${API_BASE_URL}${path}`);
+  for (const [eventType, handler] of Object.entries(handlers.events)) {
+    source.addEventListener(eventType, (event) => handler(JSON.parse(event.data)));
+  }
+  source.onerror = () => {
+    // Don't let EventSource reconnect on its own; callers fall back to polling
+    source.close();
+    handlers.onError?.(new Error('Event stream disconnected'));
+  };
+  return () => source.close();
+}
+
+// Stream job progress ("status" events) and transcribed segments ("segment" events)
+export function subscribeToJob(jobId, { onStatus, onSegment, onError } = {}) {
+  return subscribe(`/api/events/${jobId}`, {
+    events: {
+      status: (status) => {
+        cache.cacheJob(jobId, status);
+        onStatus?.(status);
+      },
+      segment: (event) => onSegment?.(event)
+    },
+    onError
+  });
+}
+
+// Stream batch progress ("batch" events) and the status of each of its jobs
+export function subscribeToBatch(batchId, { onBatch, onJobStatus, onError } = {}) {
+  return subscribe(`/api/batch-events/${batchId}`, {
+    events: {
+      batch: (status) => {
+        cache.cacheBatch(batchId, status);
+        onBatch?.(status);
+      },
+      status: (status) => onJobStatus?.(status)
+    },
+    onError
+  });
+}
+
 // Fetch transcript
 export async function fetchTranscript(jobId) {
   try {
@@ -76,6 +123,29 @@ export async function fetchTranscript(jobId) {
   }
 }
 
+// Fetch the segments transcribed so far, starting at cursor `since`
+export async function fetchPartialTranscript(jobId, since = 0) {
+  try {
+    const response = await api.get(`/api/transcript/${jobId}`, { params: { since } });
+    return response.data;
+  } catch (error) {
+    console.error('API Error:', error);
+    throw new Error(error.response?.data?.detail || error.message || 'Failed to fetch partial transcript');
+  }
+}
+
+// Fetch a job's trace: per-stage timings, queue waits and the slowest chunks and segments.
+// format 'chrome' returns a Chrome trace-event file instead
+export async function fetchJobTrace(jobId, format = 'json') {
+  try {
+    const response = await api.get(`/api/jobs/${jobId}/trace`, { params: { format } });
+    return response.data;
+  } catch (error) {
+    console.error('API Error:', error);
+    throw new Error(error.response?.data?.detail || error.message || 'Failed to fetch job trace');
+  }
+}
+
 // Rename speakers
 export async function renameSpeakers(jobId, speakerMapping) {
   try {
@@ -128,6 +198,29 @@ export async function mergeSpeakers(jobId, speakersToMerge, newName) {
   }
 }
 
+// Re-cluster speakers from the job's cached speaker embeddings
+export async function reclusterSpeakers(jobId, { numSpeakers = null, threshold = null } = {}) {
+  try {
+    const response = await api.post(`/api/recluster/${jobId}`, {
+      ...(numSpeakers !== null && { num_speakers: numSpeakers }),
+      ...(threshold !== null && { threshold })
+    });
+    
+    // Replace the cached transcript, whose speakers are stale now
+    const transcript = (await api.get(`/api/transcript/${jobId}`)).data;
+    await cache.cacheTranscript(jobId, transcript, {
+      title: transcript.metadata?.title,
+      url: transcript.metadata?.url,
+      duration: transcript.metadata?.duration
+    });
+    
+    return { ...response.data, transcript };
+  } catch (error) {
+    console.error('API Error:', error);
+    throw new Error(error.response?.data?.detail || error.message || 'Failed to re-cluster speakers');
+  }
+}
+
 // Export transcript
 export async function exportTranscript(jobId, format, options = null) {
   try {